@@ -0,0 +1,96 @@
+"""Materialized grade aggregates (table enrollment_averages).
+
+The triggers of migration 4 keep one row per (enrollment, semester) up to date
+on every results insert/update/delete and on subject coefficient changes.
+
+    python aggregates.py check
+    python aggregates.py rebuild
+"""
+import argparse
+import os
+import sqlite3
+
+TOLERANCE = 1e-6
+
+EXPECTED_SQL = """
+    SELECT r.enrollment_id, r.semester,
+           SUM(r.score * sub.coefficient) AS weighted_sum,
+           SUM(sub.coefficient) AS coeff_sum,
+           COUNT(*) AS result_count
+    FROM results r
+    JOIN subjects sub ON r.subject_id = sub.id
+    JOIN enrollments e ON r.enrollment_id = e.id
+    WHERE r.score IS NOT NULL
+    GROUP BY r.enrollment_id, r.semester
+"""
+
+
+def get_averages(conn, enrollment_id, table="enrollment_averages"):
+    """Totaux et moyennes d'une inscription : {semestre: row} + moyenne finale.
+
+    table : all_enrollment_averages pour une année archivée (voir archive.py).
+    """
+    rows = conn.execute(f"""
+        SELECT semester, weighted_sum, coeff_sum, average
+        FROM {table} WHERE enrollment_id = ?
+    """, (enrollment_id,)).fetchall()
+    semesters = {row["semester"]: row for row in rows}
+    weighted = sum(row["weighted_sum"] for row in rows)
+    coeffs = sum(row["coeff_sum"] for row in rows)
+    return semesters, (weighted / coeffs if coeffs else 0)
+
+
+def check(conn):
+    """Compare la table matérialisée à un recalcul complet depuis results."""
+    expected = {(r[0], r[1]): r[2:] for r in conn.execute(EXPECTED_SQL)}
+    actual = {
+        (r[0], r[1]): r[2:]
+        for r in conn.execute("""
+            SELECT enrollment_id, semester, weighted_sum, coeff_sum, result_count
+            FROM enrollment_averages
+        """)
+    }
+    problems = []
+    for key in sorted(set(expected) | set(actual)):
+        want, got = expected.get(key), actual.get(key)
+        if want is None or got is None:
+            problems.append((key, want, got))
+        elif (abs(want[0] - got[0]) > TOLERANCE or abs(want[1] - got[1]) > TOLERANCE
+              or want[2] != got[2]):
+            problems.append((key, want, got))
+    return problems
+
+
+def rebuild(conn):
+    with conn:
+        conn.execute("DELETE FROM enrollment_averages")
+        conn.execute(f"""
+            INSERT INTO enrollment_averages (enrollment_id, semester, weighted_sum, coeff_sum, result_count)
+            {EXPECTED_SQL}
+        """)
+    return conn.execute("SELECT COUNT(*) FROM enrollment_averages").fetchone()[0]
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Grade aggregates maintenance")
+    parser.add_argument("command", choices=["check", "rebuild"])
+    parser.add_argument("--db", default=os.path.join(base_dir, "database.db"))
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.command == "rebuild":
+            print(f"Rebuilt {rebuild(conn)} aggregate rows")
+            return 0
+        problems = check(conn)
+        for (enrollment_id, semester), want, got in problems:
+            print(f"enrollment {enrollment_id} semester {semester}: expected {want}, stored {got}")
+        print(f"{len(problems)} inconsistent rows")
+        return 1 if problems else 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
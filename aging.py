@@ -0,0 +1,258 @@
+"""Fee arrears aging report.
+
+Outstanding balances (fee_balances.balance > 0) are attributed to the most recent
+charges of each student/class account — payments settle the oldest charges
+first — and aged from the charge date into 0-30, 31-60, 61-90 and 90+ day
+buckets, per class and per payment method.
+
+Accounts and charges are pulled in bulk, one column at a time, into columnar
+arrays; the join, allocation, bucketing and grouped sums are vectorized with
+NumPy when it is installed, or done in a single pure-Python pass otherwise.
+The fee ledger is append-only, so MAX(fee_transactions.id) is a cheap
+data-version stamp for caching.
+
+    python aging.py --format csv > aging.csv
+    python aging.py --as-of 2025-06-30 --format json
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import time
+from array import array
+from datetime import date
+
+from columnar import column
+
+try:
+    import numpy as np
+except ImportError:  # NumPy optionnel : repli sur une boucle Python
+    np = None
+
+BUCKETS = ("0-30", "31-60", "61-90", "90+")
+BUCKET_EDGES = (31, 61, 91)  # âge en jours à partir duquel on passe au bucket suivant
+NO_PAYMENT = "(no payment)"
+EPSILON = 0.005  # en dessous d'un demi-centime, une facturation est considérée soldée
+
+# Lecture en bloc : une chaîne par colonne (group_concat), convertie en tableau (columnar.column).
+# Deux parcours séquentiels plutôt qu'une jointure, qui coûterait une recherche d'index par compte.
+ACCOUNTS_SQL = """
+    SELECT group_concat(student_id), group_concat(class_id), group_concat(balance),
+           group_concat(COALESCE(last_payment_mode, ?), char(31))
+    FROM fee_balances NOT INDEXED
+    WHERE balance > 0
+"""
+
+# Facturations (et ajustements positifs), par ordre d'écriture
+CHARGES_SQL = """
+    SELECT group_concat(student_id), group_concat(class_id), group_concat(amount),
+           group_concat(CAST(julianday(?) - julianday(created_at) AS INTEGER))
+    FROM (
+        SELECT student_id, class_id, amount, created_at FROM fee_transactions
+        WHERE kind = 'charge' OR (kind = 'adjustment' AND amount > 0)
+        ORDER BY id
+    )
+"""
+
+
+def data_version(conn):
+    """Le grand livre est en ajout seul : son plus grand id change à chaque écriture."""
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM fee_transactions").fetchone()[0]
+
+
+def bucket_of(age):
+    for i, edge in enumerate(BUCKET_EDGES):
+        if age < edge:
+            return i
+    return len(BUCKET_EDGES)
+
+
+def load_columns(conn, as_of, vectorized):
+    """Comptes débiteurs et facturations, colonne par colonne."""
+    students, classes, balances, modes = conn.execute(ACCOUNTS_SQL, (NO_PAYMENT,)).fetchone()
+    mode_codes = {}
+    cols = {
+        "acc_student": column(students, int, vectorized),
+        "acc_class": column(classes, int, vectorized),
+        "acc_balance": column(balances, float, vectorized),
+        "acc_mode": array("q", (mode_codes.setdefault(m, len(mode_codes))
+                                for m in (modes.split(chr(31)) if modes else ()))),
+    }
+    cols["mode_names"] = sorted(mode_codes, key=mode_codes.get)
+    students, classes, amounts, ages = conn.execute(CHARGES_SQL, (as_of,)).fetchone()
+    cols.update({
+        "chg_student": column(students, int, vectorized),
+        "chg_class": column(classes, int, vectorized),
+        "chg_amount": column(amounts, float, vectorized),
+        "chg_age": column(ages, int, vectorized),
+    })
+    return cols
+
+
+def _aggregate_numpy(cols):
+    n_buckets = len(BUCKETS)
+    acc_class = cols["acc_class"]
+    acc_mode = np.frombuffer(cols["acc_mode"], dtype=np.int64)
+    acc_balance = cols["acc_balance"]
+
+    # Jointure facturation -> compte débiteur sur la clé (élève, classe)
+    width = int(max(acc_class.max(), cols["chg_class"].max())) + 1
+    acc_keys = cols["acc_student"] * width + acc_class
+    order = np.argsort(acc_keys)
+    sorted_keys = acc_keys[order]
+    chg_keys = cols["chg_student"] * width + cols["chg_class"]
+    pos = np.minimum(np.searchsorted(sorted_keys, chg_keys), len(sorted_keys) - 1)
+    matched = sorted_keys[pos] == chg_keys
+    account = order[pos[matched]]
+    # Tri stable : les facturations d'un compte restent dans l'ordre d'écriture
+    by_account = np.argsort(account, kind="stable")
+    account = account[by_account]
+    amount = cols["chg_amount"][matched][by_account]
+    bucket = np.digitize(cols["chg_age"][matched][by_account], BUCKET_EDGES)
+    n = len(account)
+    if not n:
+        return {}, {}
+
+    # Début de chaque compte, total facturé par compte et montant facturé après chaque ligne
+    starts = np.flatnonzero(np.r_[True, account[1:] != account[:-1]])
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, n]))
+    cumulative = np.cumsum(amount)
+    totals = np.add.reduceat(amount, starts)
+    before_group = (cumulative[starts] - amount[starts])[group]
+    later = totals[group] - (cumulative - before_group)
+    # Le reste dû couvre d'abord les facturations les plus récentes
+    unpaid = np.clip(acc_balance[account] - later, 0, amount)
+
+    # Compte classé dans le bucket de sa plus vieille facturation impayée
+    oldest = np.maximum.reduceat(np.where(unpaid > EPSILON, bucket, -1), starts)
+    open_accounts = oldest >= 0
+    group_accounts = account[starts]
+
+    def grouped(account_keys):
+        keys = account_keys[account]
+        codes, key_index = np.unique(keys, return_inverse=True)
+        amounts = np.bincount(key_index * n_buckets + bucket, weights=unpaid,
+                              minlength=len(codes) * n_buckets).reshape(-1, n_buckets)
+        account_index = np.searchsorted(codes, account_keys[group_accounts[open_accounts]])
+        students = np.bincount(account_index * n_buckets + oldest[open_accounts],
+                               minlength=len(codes) * n_buckets).reshape(-1, n_buckets)
+        return {int(code): (amounts[i].tolist(), students[i].tolist()) for i, code in enumerate(codes)}
+
+    return grouped(acc_class), grouped(acc_mode)
+
+
+def _aggregate_python(cols):
+    n_buckets = len(BUCKETS)
+    by_class, by_mode = {}, {}
+    accounts = {(student, class_id): i for i, (student, class_id)
+                in enumerate(zip(cols["acc_student"], cols["acc_class"]))}
+    charges = {}  # compte -> [(montant, âge)] dans l'ordre d'écriture
+    for student, class_id, amount, age in zip(cols["chg_student"], cols["chg_class"],
+                                              cols["chg_amount"], cols["chg_age"]):
+        account = accounts.get((student, class_id))
+        if account is not None:
+            charges.setdefault(account, []).append((amount, age))
+
+    def add(groups, key, bucket, unpaid):
+        entry = groups.setdefault(key, ([0.0] * n_buckets, [0] * n_buckets))
+        entry[0][bucket] += unpaid
+        return entry
+
+    for account, rows in charges.items():
+        class_id, mode = cols["acc_class"][account], cols["acc_mode"][account]
+        remaining = cols["acc_balance"][account]
+        oldest = -1
+        # On remonte des facturations les plus récentes vers les plus anciennes
+        for amount, age in reversed(rows):
+            if remaining <= EPSILON:
+                break
+            unpaid = min(amount, remaining)
+            remaining -= unpaid
+            bucket = bucket_of(age)
+            oldest = max(oldest, bucket)
+            add(by_class, class_id, bucket, unpaid)
+            add(by_mode, mode, bucket, unpaid)
+        if oldest >= 0:
+            add(by_class, class_id, oldest, 0)[1][oldest] += 1
+            add(by_mode, mode, oldest, 0)[1][oldest] += 1
+    return by_class, by_mode
+
+
+def compute(conn, as_of=None, engine=None):
+    """Rapport complet ; engine force 'numpy' ou 'python' (par défaut NumPy s'il est là)."""
+    started = time.perf_counter()
+    as_of = as_of or date.today().isoformat()
+    engine = engine or ("numpy" if np is not None else "python")
+    version = data_version(conn)
+    cols = load_columns(conn, as_of, vectorized=engine == "numpy")
+    loaded = time.perf_counter()
+
+    if not len(cols["acc_student"]) or not len(cols["chg_student"]):
+        by_class, by_mode = {}, {}
+    elif engine == "numpy":
+        by_class, by_mode = _aggregate_numpy(cols)
+    else:
+        by_class, by_mode = _aggregate_python(cols)
+
+    class_names = dict(conn.execute("SELECT id, name FROM classes"))
+
+    def rows(groups, label, name_of):
+        result = []
+        for key, (amounts, students) in groups.items():
+            result.append({label: name_of(key), "amounts": [round(a, 2) for a in amounts],
+                           "students": students, "total": round(sum(amounts), 2)})
+        return sorted(result, key=lambda r: r["total"], reverse=True)
+
+    by_class_rows = rows(by_class, "class", lambda key: class_names.get(key, f"#{key}"))
+    totals_amounts = [round(sum(r["amounts"][i] for r in by_class_rows), 2) for i in range(len(BUCKETS))]
+    totals_students = [sum(r["students"][i] for r in by_class_rows) for i in range(len(BUCKETS))]
+    return {
+        "as_of": as_of,
+        "version": version,
+        "engine": engine,
+        "buckets": list(BUCKETS),
+        "by_class": by_class_rows,
+        "by_payment_mode": rows(by_mode, "payment_mode", lambda key: cols["mode_names"][key]),
+        "totals": {"amounts": totals_amounts, "students": totals_students,
+                   "total": round(sum(totals_amounts), 2)},
+        "charges": len(cols["chg_student"]),
+        "load_seconds": round(loaded - started, 3),
+        "elapsed": round(time.perf_counter() - started, 3),
+    }
+
+
+def to_csv(report):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["group", "name"] + [f"amount {b}" for b in BUCKETS]
+                    + [f"students {b}" for b in BUCKETS] + ["total"])
+    for group, label in (("class", "by_class"), ("payment_mode", "by_payment_mode")):
+        for row in report[label]:
+            writer.writerow([group, row[group]] + row["amounts"] + row["students"] + [row["total"]])
+    totals = report["totals"]
+    writer.writerow(["total", ""] + totals["amounts"] + totals["students"] + [totals["total"]])
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Fee arrears aging report")
+    parser.add_argument("--db", default=os.path.join(base_dir, "database.db"))
+    parser.add_argument("--as-of", help="YYYY-MM-DD (default: today)")
+    parser.add_argument("--format", choices=["csv", "json"], default="csv")
+    parser.add_argument("--engine", choices=["numpy", "python"])
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        report = compute(conn, args.as_of, args.engine)
+    finally:
+        conn.close()
+    print(to_csv(report) if args.format == "csv" else json.dumps(report, indent=2), end="")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,421 @@
+"""Versioned JSON API (/api/v1) over the main tables.
+
+    GET    /api/v1/<resource>?fields=id,name&class_id=3&limit=100&after=<cursor>
+    GET    /api/v1/<resource>/<id>?fields=...
+    POST   /api/v1/<resource>            one object or a list: created in one transaction
+    PATCH  /api/v1/<resource>[/<id>]     {"id": ..., fields...} or a list of them
+    DELETE /api/v1/<resource>[/<id>]     {"ids": [...]}
+    POST   /api/v1/<resource>/batch      {"delete": [...], "update": [...], "create": [...]}
+
+Lists are paginated by id (keyset cursor, as in the HTML lists) and `fields`
+selects the columns returned. A batch is all-or-nothing: the first invalid item
+rolls the whole transaction back and is reported with its index. Responses are
+serialized with orjson when it is installed, compact json otherwise.
+
+Authentication: the admin session, or `Authorization: Bearer $API_TOKEN`.
+"""
+import hmac
+import json
+import sqlite3
+from collections import namedtuple
+
+from flask import Blueprint, Response, current_app, request, session
+
+import conflicts
+import ledger
+from cache import invalidate_tables
+from db import get_db, write_transaction
+from pagination import keyset_paginate, page_args
+
+try:
+    import orjson
+except ImportError:  # orjson optionnel : pip install orjson
+    orjson = None
+
+bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+OPS = ("create", "update", "delete")
+
+# fields : colonne -> type ; required : obligatoires à la création ; read_only : jamais écrites
+# ops : écritures permises ; tables : versions de cache à invalider après écriture
+Resource = namedtuple("Resource", "table fields required filters read_only ops check tables",
+                      defaults=((), OPS, None, ()))
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+# --- Vérifications métier (mêmes règles que les formulaires) ---
+def check_class(c, state, op, row, entry_id):
+    if op != "delete" and c.execute("SELECT 1 FROM classes WHERE name = ? AND level = ? AND id IS NOT ?",
+                                    (row["name"], row["level"], entry_id)).fetchone():
+        raise ApiError("A class with this name and level already exists", 409)
+
+
+def check_result(c, state, op, row, entry_id):
+    if op == "delete":
+        return
+    if row["semester"] not in (1, 2):
+        raise ApiError("semester must be 1 or 2")
+    if c.execute("""
+        SELECT 1 FROM results WHERE enrollment_id = ? AND subject_id = ? AND semester = ? AND id IS NOT ?
+    """, (row["enrollment_id"], row["subject_id"], row["semester"], entry_id)).fetchone():
+        raise ApiError("Result for this student/subject/semester already exists", 409)
+
+
+def clock_time(value):
+    """'8:00' -> '08:00' : les heures sont triées comme du texte (ORDER BY start_time)."""
+    hours, minutes = (int(part) for part in value.split(":"))
+    if not (0 <= hours <= 23 and 0 <= minutes <= 59):
+        raise ValueError(value)
+    return conflicts.format_minutes(conflicts.to_minutes(value))
+
+
+def check_timetable(c, state, op, row, entry_id):
+    # Index des créneaux chargé une fois par lot, tenu à jour au fil des écritures du lot
+    if "schedule" not in state:
+        state["schedule"] = conflicts.load(c)
+    schedule = state["schedule"]
+    if op == "delete":
+        schedule.remove(entry_id)
+        return
+    if row["day"] not in DAYS:
+        raise ApiError(f"Unknown day '{row['day']}'")
+    try:
+        if conflicts.to_minutes(row["end_time"]) <= conflicts.to_minutes(row["start_time"]):
+            raise ApiError("end_time must be after start_time")
+    except ValueError:
+        raise ApiError("start_time and end_time must be HH:MM")
+    found = schedule.conflicts(row, entry_id)
+    if found:
+        raise ApiError("; ".join(conflicts.describe(conflict) for conflict in found), 409)
+    state["pending_slot"] = row
+
+
+def check_fee_transaction(c, state, op, row, entry_id):
+    if row["kind"] not in ledger.KINDS:
+        raise ApiError(f"kind must be one of {', '.join(ledger.KINDS)}")
+    if row["kind"] != "adjustment" and row["amount"] <= 0:
+        raise ApiError("amount must be positive")
+
+
+RESOURCES = {
+    "students": Resource(
+        "students", {"id": int, "name": str, "matricule": str, "date_of_birth": str, "gender": str},
+        ("name", "matricule"), ("matricule", "gender")),
+    "teachers": Resource(
+        "teachers", {"id": int, "first_name": str, "last_name": str, "phone": str, "profession": str,
+                     "diploma": str, "country": str, "photo": str},
+        ("first_name", "last_name"), ("profession", "country")),
+    "classes": Resource(
+        "classes", {"id": int, "name": str, "level": str},
+        ("name", "level"), ("name", "level"), check=check_class),
+    "subjects": Resource(
+        "subjects", {"id": int, "name": str, "coefficient": int, "class_id": int, "teacher_id": int},
+        ("name", "coefficient"), ("class_id", "teacher_id")),
+    "enrollments": Resource(
+        "enrollments", {"id": int, "student_id": int, "class_id": int, "academic_year": str},
+        ("student_id", "class_id", "academic_year"), ("student_id", "class_id", "academic_year")),
+    "results": Resource(
+        "results", {"id": int, "enrollment_id": int, "subject_id": int, "score": float, "semester": int},
+        ("enrollment_id", "subject_id", "score"), ("enrollment_id", "subject_id", "semester"),
+        check=check_result),
+    "rooms": Resource(
+        "rooms", {"id": int, "name": str, "capacity": int, "location": str},
+        ("name",), ("location",)),
+    "timetable": Resource(
+        "timetable", {"id": int, "class_id": int, "subject_id": int, "teacher_id": int, "room_id": int,
+                      "day": str, "start_time": clock_time, "end_time": clock_time},
+        ("class_id", "subject_id", "teacher_id", "room_id", "day", "start_time", "end_time"),
+        ("class_id", "teacher_id", "room_id", "day"), check=check_timetable),
+    # Soldes calculés par la base : lecture seule, on écrit dans le grand livre
+    "fees": Resource(
+        "fee_balances", {"id": int, "student_id": int, "class_id": int, "total_due": float,
+                         "total_paid": float, "balance": float, "status": str,
+                         "last_payment_mode": str, "transaction_count": int},
+        (), ("student_id", "class_id", "status"), ops=()),
+    # Grand livre en ajout seul : une correction est une écriture d'ajustement
+    "fee_transactions": Resource(
+        "fee_transactions", {"id": int, "student_id": int, "class_id": int, "kind": str, "amount": float,
+                             "payment_mode": str, "note": str, "created_at": str},
+        ("student_id", "class_id", "kind", "amount"), ("student_id", "class_id", "kind"),
+        read_only=("created_at",), ops=("create",), check=check_fee_transaction,
+        tables=("fee_balances",)),
+}
+
+_write_hooks = []
+
+
+def on_write(func):
+    """func(tables) est appelé après chaque lot validé, avec les tables modifiées."""
+    _write_hooks.append(func)
+    return func
+
+
+# --- Réponses ---
+def json_response(data, status=200):
+    if orjson is not None:
+        body = orjson.dumps(data)
+    else:
+        body = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+    return Response(body, status=status, mimetype="application/json")
+
+
+def error(message, status=400, **extra):
+    return json_response({"error": message, **extra}, status)
+
+
+def get_resource(name):
+    resource = RESOURCES.get(name)
+    if resource is None:
+        raise ApiError(f"Unknown resource '{name}'", 404)
+    return resource
+
+
+def selected_fields(resource):
+    fields = request.args.get("fields")
+    if not fields:
+        return list(resource.fields)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in resource.fields]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+KIND_NAMES = {float: "a number", int: "an integer", str: "a string",
+              clock_time: "a time between 00:00 and 23:59 (HH:MM)"}
+
+
+def convert(resource, name, value):
+    kind = resource.fields[name]
+    if value is None:
+        return None
+    if kind is float and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if kind is int and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if kind is str and isinstance(value, str):
+        return value
+    # Valeurs de filtre (query string) ou nombres envoyés en texte
+    if isinstance(value, str) and kind is not str:
+        try:
+            return kind(value)
+        except ValueError:
+            pass
+    raise ApiError(f"{name} must be {KIND_NAMES[kind]}")
+
+
+def parse_item(resource, item, op):
+    if not isinstance(item, dict):
+        raise ApiError("Each item must be a JSON object")
+    writable = [name for name in resource.fields if name != "id" and name not in resource.read_only]
+    unknown = [name for name in item if name not in writable and not (op == "update" and name == "id")]
+    if unknown:
+        raise ApiError(f"Unknown or read-only fields: {', '.join(unknown)}")
+    values = {name: convert(resource, name, value) for name, value in item.items() if name != "id"}
+    if op == "create":
+        missing = [name for name in resource.required if values.get(name) is None]
+        if missing:
+            raise ApiError(f"Missing required fields: {', '.join(missing)}")
+    elif not values:
+        raise ApiError("Nothing to update")
+    else:
+        nulls = [name for name in resource.required if name in values and values[name] is None]
+        if nulls:
+            raise ApiError(f"Required fields cannot be null: {', '.join(nulls)}")
+    return values
+
+
+# --- Lecture ---
+@bp.before_request
+def authenticate():
+    if session.get("admin_logged_in"):
+        return None
+    token = current_app.config.get("API_TOKEN")
+    if token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return None
+    return error("Authentication required", 401)
+
+
+@bp.errorhandler(ApiError)
+def handle_api_error(e):
+    return error(e.message, e.status)
+
+
+@bp.route("/")
+def index():
+    return json_response({name: {"fields": list(r.fields), "required": list(r.required),
+                                 "filters": list(r.filters), "ops": list(r.ops)}
+                          for name, r in RESOURCES.items()})
+
+
+@bp.route("/<name>", methods=["GET"])
+def list_items(name):
+    resource = get_resource(name)
+    fields = selected_fields(resource)
+    where, params = [], []
+    for column in resource.filters:
+        values = request.args.getlist(column)
+        if values:
+            where.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params += [convert(resource, column, value) for value in values]
+    # L'id sert de curseur : toujours lu, renvoyé seulement s'il est demandé
+    columns = fields if "id" in fields else ["id"] + fields
+    page = keyset_paginate(get_db(), f"SELECT {', '.join(columns)} FROM {resource.table}",
+                           where, params, **page_args())
+    start = 0 if "id" in fields else 1
+    return json_response({
+        "data": [dict(zip(columns[start:], tuple(row)[start:])) for row in page.rows],
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
+        "limit": page.limit,
+    })
+
+
+@bp.route("/<name>/<int:item_id>", methods=["GET"])
+def get_item(name, item_id):
+    resource = get_resource(name)
+    fields = selected_fields(resource)
+    row = get_db().execute(f"SELECT {', '.join(fields)} FROM {resource.table} WHERE id = ?",
+                           (item_id,)).fetchone()
+    if row is None:
+        raise ApiError(f"{name} {item_id} not found", 404)
+    return json_response({"data": dict(zip(fields, tuple(row)))})
+
+
+# --- Écriture par lots ---
+def apply_batch(conn, resource, create=(), update=(), delete=()):
+    """Supprime, modifie puis crée dans une seule transaction ; tout ou rien.
+
+    Les suppressions passent en premier : un lot peut libérer un créneau ou un matricule
+    et le réutiliser aussitôt.
+    """
+    limit = current_app.config.get("API_BATCH_LIMIT", 1000)
+    if len(create) + len(update) + len(delete) > limit:
+        raise ApiError(f"At most {limit} items per batch", 413)
+    for op, items in zip(OPS, (create, update, delete)):
+        if items and op not in resource.ops:
+            raise ApiError(f"{op} is not allowed on this resource", 405)
+    position = {}
+
+    def work(c):
+        state = {}
+        created, updated, deleted = [], 0, 0
+        for index, item_id in enumerate(delete):
+            position.update(op="delete", index=index)
+            if not isinstance(item_id, int) or isinstance(item_id, bool):
+                raise ApiError("ids must be integers")
+            if resource.check:
+                resource.check(c, state, "delete", None, item_id)
+            if not c.execute(f"DELETE FROM {resource.table} WHERE id = ?", (item_id,)).rowcount:
+                raise ApiError(f"id {item_id} not found", 404)
+            deleted += 1
+
+        for index, item in enumerate(update):
+            position.update(op="update", index=index)
+            item_id = item.get("id") if isinstance(item, dict) else None
+            if not isinstance(item_id, int) or isinstance(item_id, bool):
+                raise ApiError("Each update needs an integer id")
+            values = parse_item(resource, item, "update")
+            if resource.check:
+                # Les règles portent sur la ligne complète : ancienne ligne + champs modifiés
+                current = c.execute(f"SELECT {', '.join(resource.fields)} FROM {resource.table} WHERE id = ?",
+                                    (item_id,)).fetchone()
+                if current is None:
+                    raise ApiError(f"id {item_id} not found", 404)
+                resource.check(c, state, "update", {**dict(zip(resource.fields, tuple(current))), **values},
+                               item_id)
+            cursor = c.execute(f"UPDATE {resource.table} SET {', '.join(f'{n} = ?' for n in values)} "
+                               f"WHERE id = ?", list(values.values()) + [item_id])
+            if not cursor.rowcount:
+                raise ApiError(f"id {item_id} not found", 404)
+            if "pending_slot" in state:
+                state["schedule"].remove(item_id)
+                state["schedule"].add(item_id, state.pop("pending_slot"))
+            updated += 1
+
+        for index, item in enumerate(create):
+            position.update(op="create", index=index)
+            values = parse_item(resource, item, "create")
+            if resource.check:
+                resource.check(c, state, "create", {**dict.fromkeys(resource.fields), **values}, None)
+            names = list(values)
+            cursor = c.execute(f"INSERT INTO {resource.table} ({', '.join(names)}) "
+                               f"VALUES ({', '.join('?' * len(names))})", [values[n] for n in names])
+            created.append(cursor.lastrowid)
+            if "pending_slot" in state:
+                state["schedule"].add(cursor.lastrowid, state.pop("pending_slot"))
+        return {"created": created, "updated": updated, "deleted": deleted}
+
+    try:
+        result = write_transaction(conn, work)
+    except ApiError as e:
+        e.message = f"{position.get('op')}[{position.get('index')}]: {e.message}" if position else e.message
+        raise
+    except sqlite3.IntegrityError as e:
+        raise ApiError(f"{position.get('op')}[{position.get('index')}]: {e}", 409)
+    tables = (resource.table,) + resource.tables
+    invalidate_tables(*tables)
+    for hook in _write_hooks:
+        hook(set(tables))
+    return result
+
+
+def request_items():
+    data = request.get_json(silent=True)
+    if data is None:
+        raise ApiError("Expected a JSON body")
+    return data
+
+
+@bp.route("/<name>", methods=["POST"])
+def create_items(name):
+    resource = get_resource(name)
+    data = request_items()
+    items = data if isinstance(data, list) else [data]
+    return json_response(apply_batch(get_db(), resource, create=items), 201)
+
+
+@bp.route("/<name>", methods=["PATCH"])
+@bp.route("/<name>/<int:item_id>", methods=["PATCH"])
+def update_items(name, item_id=None):
+    resource = get_resource(name)
+    data = request_items()
+    if item_id is not None:
+        if not isinstance(data, dict):
+            raise ApiError("Expected a JSON object")
+        data = [{**data, "id": item_id}]
+    items = data if isinstance(data, list) else [data]
+    return json_response(apply_batch(get_db(), resource, update=items))
+
+
+@bp.route("/<name>", methods=["DELETE"])
+@bp.route("/<name>/<int:item_id>", methods=["DELETE"])
+def delete_items(name, item_id=None):
+    resource = get_resource(name)
+    if item_id is not None:
+        ids = [item_id]
+    else:
+        data = request_items()
+        ids = data.get("ids") if isinstance(data, dict) else data
+        if not isinstance(ids, list):
+            raise ApiError('Expected {"ids": [...]}')
+    return json_response(apply_batch(get_db(), resource, delete=ids))
+
+
+@bp.route("/<name>/batch", methods=["POST"])
+def batch(name):
+    resource = get_resource(name)
+    data = request_items()
+    if not isinstance(data, dict) or set(data) - set(OPS):
+        raise ApiError('Expected {"create": [...], "update": [...], "delete": [...]}')
+    parts = {op: data.get(op) or [] for op in OPS}
+    if not all(isinstance(items, list) for items in parts.values()):
+        raise ApiError("create, update and delete must be lists")
+    return json_response(apply_batch(get_db(), resource, **parts))
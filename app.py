@@ -1,19 +1,103 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, stream_template, Response, abort, make_response, send_from_directory, g
+from markupsafe import Markup
 import os
+import hashlib
+import hmac
+import json
+import shutil
+import uuid
 import sqlite3
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename
+from werkzeug.datastructures import MultiDict
 from functools import wraps
 from datetime import datetime
+import db
+from db import get_db, write_transaction
+from migrations import migrate
+from pagination import keyset_paginate, page_args, page_url
+import search
+from cache import TTLCache, LRUCache, all_caches, invalidate_tables, table_versions
+import bulletins
+import aggregates
+import ledger
+import importer
+import exports
+import conflicts
+import scheduler
+import occupancy
+import aging
+import grade_stats
+import rollover
+import archive
+import gradebook
+from refdata import ReferenceData
+import profiling
+import jobs
+import api
 
 app = Flask(__name__)
 app.secret_key = "your_password"
 
 # --- Database ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "database.db")
-
+DB_PATH = os.environ.get("DB_PATH", os.path.join(BASE_DIR, "database.db"))
+
+app.config["DB_PATH"] = DB_PATH
+app.config["APP_ENV"] = os.environ.get("APP_ENV", "development")
+app.config["DB_POOL_SIZE"] = int(os.environ.get("DB_POOL_SIZE", 5))
+app.config["DB_POOL_TIMEOUT"] = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+app.config["DB_POOL_HEALTH_CHECK_INTERVAL"] = float(os.environ.get("DB_POOL_HEALTH_CHECK_INTERVAL", 30))
+app.config["DASHBOARD_CACHE_TTL"] = float(os.environ.get("DASHBOARD_CACHE_TTL", 60))
+app.config["TIMETABLE_CACHE_TTL"] = float(os.environ.get("TIMETABLE_CACHE_TTL", 30))
+app.config["ROOM_OCCUPANCY_TTL"] = float(os.environ.get("ROOM_OCCUPANCY_TTL", 300))
+app.config["AGING_CACHE_TTL"] = float(os.environ.get("AGING_CACHE_TTL", 300))
+app.config["STATISTICS_CACHE_TTL"] = float(os.environ.get("STATISTICS_CACHE_TTL", 300))
+app.config["REFERENCE_DATA_TTL"] = float(os.environ.get("REFERENCE_DATA_TTL", 300))
+app.config["STUDENT_LIST_LIMIT"] = int(os.environ.get("STUDENT_LIST_LIMIT", 500))
+app.config["PAGE_CACHE_ENABLED"] = os.environ.get("PAGE_CACHE_ENABLED", "1") not in ("0", "false", "no")
+app.config["PAGE_CACHE_TTL"] = float(os.environ.get("PAGE_CACHE_TTL", 300))
+app.config["PAGE_CACHE_MAX_ENTRIES"] = int(os.environ.get("PAGE_CACHE_MAX_ENTRIES", 512))
+app.config["PAGE_CACHE_MAX_BYTES"] = int(os.environ.get("PAGE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+app.config["PROFILE_ENABLED"] = os.environ.get("PROFILE_ENABLED", "1") not in ("0", "false", "no")
+app.config["PROFILE_SAMPLE_RATE"] = float(os.environ.get("PROFILE_SAMPLE_RATE", 0.1))
+app.config["PROFILE_WINDOW"] = int(os.environ.get("PROFILE_WINDOW", 1024))
+app.config["PROFILE_MAX_QUERIES"] = int(os.environ.get("PROFILE_MAX_QUERIES", 500))
+app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+# Journal des requêtes lentes désactivé par défaut : il instrumente toutes les requêtes, pas l'échantillon
+app.config["SLOW_QUERY_MS"] = float(os.environ.get("SLOW_QUERY_MS", 0))
+app.config["SLOW_QUERY_LOG"] = os.environ.get("SLOW_QUERY_LOG", os.path.join(BASE_DIR, "logs", "slow_queries.log"))
+app.config["SLOW_QUERY_LOG_MAX_BYTES"] = int(os.environ.get("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024))
+app.config["SLOW_QUERY_LOG_BACKUPS"] = int(os.environ.get("SLOW_QUERY_LOG_BACKUPS", 5))
+app.config["JOB_WORKERS"] = int(os.environ.get("JOB_WORKERS", 2))
+app.config["JOB_POLL_INTERVAL"] = float(os.environ.get("JOB_POLL_INTERVAL", 2))
+app.config["JOB_RETENTION_DAYS"] = float(os.environ.get("JOB_RETENTION_DAYS", 7))
+app.config["JOB_FILES_DIR"] = os.environ.get("JOB_FILES_DIR", os.path.join(BASE_DIR, "job_files"))
+app.config["ARCHIVE_DIR"] = os.environ.get("ARCHIVE_DIR", os.path.join(BASE_DIR, "archive"))
+app.config["API_TOKEN"] = os.environ.get("API_TOKEN")
+app.config["API_BATCH_LIMIT"] = int(os.environ.get("API_BATCH_LIMIT", 1000))
+if app.config["PROFILE_ENABLED"]:
+    app.config["DB_CONNECTION_FACTORY"] = profiling.ProfiledConnection
+
+# Applique les migrations en attente avant d'ouvrir le pool
+migrate(DB_PATH)
+db.init_app(app)
+if app.config["PROFILE_ENABLED"]:
+    profiling.init_app(app)
+
+# Connexions dédiées aux jobs : un traitement long n'occupe pas le pool des requêtes.
+# Une par thread worker (gardée pendant tout le job) + une pour le superviseur,
+# sinon les heartbeats s'arrêtent quand tous les workers sont occupés
+def job_db_pool(threads):
+    pool = db.get_pool()
+    return db.ConnectionPool(app.config["DB_PATH"], size=max(threads, 0) + 1, timeout=app.config["DB_POOL_TIMEOUT"],
+                             settings=pool.settings, factory=pool.factory)
+
+jobs.init_app(app, job_db_pool(app.config["JOB_WORKERS"]))
+
+# Connexion hors requête (scripts, CLI) - les routes utilisent get_db()
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, factory=app.config.get("DB_CONNECTION_FACTORY", sqlite3.Connection))
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -21,19 +105,44 @@ def get_cursor():
     conn = get_db_connection()
     return conn, conn.cursor()
 
+# Années archivées (archive.py) : avec l'historique, les listes lisent les vues all_*.
+# Les archives ne sont attachées que le temps de la requête (voir detach_history)
+def history_tables(with_history):
+    """Noms à utiliser pour enrollments / results / enrollment_averages dans les requêtes."""
+    if with_history and archive.archived_years(app.config["ARCHIVE_DIR"]):
+        g.history_attached = True
+        try:
+            archive.attach_history(get_db(), app.config["ARCHIVE_DIR"])
+            return dict(archive.HISTORY_VIEWS)
+        except archive.ArchiveError as e:
+            # Trop d'archives pour ATTACH (ou fichier illisible) : on reste sur les années en ligne
+            flash(str(e), "error")
+            archive.detach_history(get_db())
+    return {name: name for name in archive.TABLES}
+
+# Enregistré après db.init_app : s'exécute avant close_db, qui rend la connexion au pool
+@app.teardown_appcontext
+def detach_history(exc=None):
+    conn = g.get("db")
+    if g.pop("history_attached", False) and conn is not None:
+        if conn.in_transaction:
+            conn.rollback()
+        archive.detach_history(conn)
+
 # --- Create Admin ---
 def create_admin():
-    conn = get_db_connection()
+    conn = get_db()
     hashed = generate_password_hash("password123")
     try:
         conn.execute("INSERT OR IGNORE INTO admins (username, password) VALUES (?, ?)", ("admin", hashed))
         conn.commit()
     except sqlite3.Error as e:
         print(f"Error creating admin: {e}")
-    finally:
-        conn.close()
 
-create_admin()
+with app.app_context():
+    create_admin()
+
+app.jinja_env.globals["page_url"] = page_url
 
 # --- Login Required Decorator ---
 def login_required(f):
@@ -49,6 +158,58 @@ def login_required(f):
 def inject_date():
     return {"current_date": datetime.now().strftime("%d %b %Y")}
 
+# --- Page and fragment cache ---
+# Pages rendues gardées par (route, paramètres, utilisateur, jour, versions des tables) :
+# invalidate_tables() et les triggers de table_versions (écritures des autres processus)
+# changent la clé des pages concernées
+page_cache = LRUCache("pages", max_entries=app.config["PAGE_CACHE_MAX_ENTRIES"],
+                      max_bytes=app.config["PAGE_CACHE_MAX_BYTES"], ttl=app.config["PAGE_CACHE_TTL"])
+fragment_cache = LRUCache("fragments", max_entries=app.config["PAGE_CACHE_MAX_ENTRIES"],
+                          max_bytes=app.config["PAGE_CACHE_MAX_BYTES"] // 4, ttl=app.config["PAGE_CACHE_TTL"])
+
+def cached_page(*tables):
+    """Met en cache la réponse GET d'une vue qui ne dépend que de `tables` ; ETag et 304."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not app.config["PAGE_CACHE_ENABLED"] or request.method != "GET":
+                return view(*args, **kwargs)
+            key = (request.endpoint, tuple(sorted(kwargs.items())),
+                   tuple(sorted(request.args.items(multi=True))),
+                   session.get("user_name"), session.get("user_role"),
+                   datetime.now().strftime("%Y-%m-%d"), table_versions(tables, get_db()))
+            entry = page_cache.get(key)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                entry = (body, response.content_type, hashlib.blake2b(body, digest_size=16).hexdigest())
+                page_cache.set(key, entry, len(body))
+            body, content_type, etag = entry
+            response = Response(body, content_type=content_type)
+            response.set_etag(etag)
+            # Le navigateur garde la page mais revalide à chaque fois (304 si inchangée)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+# Listes des menus déroulants (classes, enseignants, matières, salles, élèves), gardées en mémoire
+reference = ReferenceData(ttl=app.config["REFERENCE_DATA_TTL"], student_limit=app.config["STUDENT_LIST_LIMIT"])
+
+@app.template_global()
+def cached_fragment(name, *key, tables=(), caller=None):
+    """{% call cached_fragment("nom", clé..., tables=("t",)) %}...{% endcall %}"""
+    if not app.config["PAGE_CACHE_ENABLED"]:
+        return caller()
+    cache_key = (name, key, table_versions(tables, get_db()))
+    html = fragment_cache.get(cache_key)
+    if html is None:
+        html = caller()
+        fragment_cache.set(cache_key, html, len(html))
+    return Markup(html)
+
 # --- Helper Functions ---
 def get_fee_status(total, paid):
     if paid >= total:
@@ -80,12 +241,11 @@ def login():
             return render_template("login.html")
         
         # Vérifier les identifiants
-        conn = get_db_connection()
+        conn = get_db()
         admin = conn.execute(
             "SELECT * FROM admins WHERE username = ?", 
             (username,)
         ).fetchone()
-        conn.close()
         
         if admin and check_password_hash(admin["password"], password):
             # Connexion réussie
@@ -110,40 +270,49 @@ def logout():
     return redirect(url_for("login"))
 
 # ===== DASHBOARD =====
-@app.route("/")
-@app.route("/dashboard")
-@login_required
-def dashboard():
-    conn = get_db_connection()
+# Statistiques du dashboard : recalculées au plus une fois par TTL,
+# ou dès qu'une route d'écriture invalide une des tables concernées
+dashboard_cache = TTLCache("dashboard", ttl=app.config["DASHBOARD_CACHE_TTL"],
+                           tables=("students", "teachers", "classes", "fee_balances", "enrollments"))
+
+def compute_dashboard_stats():
+    conn = get_db()
     
     # Get statistics
     students_count = conn.execute("SELECT COUNT(*) as count FROM students").fetchone()["count"]
     teachers_count = conn.execute("SELECT COUNT(*) as count FROM teachers").fetchone()["count"]
     classes_count = conn.execute("SELECT COUNT(*) as count FROM classes").fetchone()["count"]
     
-    # Get pending fees
+    # Soldes restant dus : lecture de l'index sur fee_balances(balance)
     fees = conn.execute("""
-        SELECT COUNT(*) as count FROM fees 
-        WHERE (total_fee - amount_paid) > 0
+        SELECT COUNT(*) as count FROM fee_balances
+        WHERE balance > 0
     """).fetchone()["count"]
     
-    # Recent enrollments
-    recent_enrollments = conn.execute("""
+    # Recent enrollments (des dicts plutôt que des sqlite3.Row, gardés en cache)
+    recent_enrollments = [dict(row) for row in conn.execute("""
         SELECT e.id, s.name as student_name, c.name as class_name, e.academic_year
         FROM enrollments e
         JOIN students s ON e.student_id = s.id
         JOIN classes c ON e.class_id = c.id
         ORDER BY e.id DESC LIMIT 5
-    """).fetchall()
-    
-    conn.close()
+    """)]
     
+    return {
+        "students_count": students_count,
+        "teachers_count": teachers_count,
+        "classes_count": classes_count,
+        "pending_fees": fees,
+        "recent_enrollments": recent_enrollments,
+    }
+
+@app.route("/")
+@app.route("/dashboard")
+@login_required
+def dashboard():
+    stats = dashboard_cache.get_or_set("stats", compute_dashboard_stats)
     return render_template("dashboard.html",
-                         students_count=students_count,
-                         teachers_count=teachers_count,
-                         classes_count=classes_count,
-                         pending_fees=fees,
-                         recent_enrollments=recent_enrollments,
+                         **stats,
                          page_title="Dashboard",
                          page_heading="Dashboard")
 
@@ -151,11 +320,17 @@ def dashboard():
 @app.route("/students")
 @login_required
 def students():
-    conn = get_db_connection()
-    students = conn.execute("SELECT * FROM students").fetchall()
-    conn.close()
+    conn = get_db()
+    q = request.args.get("q", "").strip()
+    where, params = [], []
+    if q:
+        subquery, params = search.matching_ids(q, "student")
+        where.append(f"id IN ({subquery})")
+    page = keyset_paginate(conn, "SELECT * FROM students", where, params, **page_args())
     return render_template("students.html", 
-                         students=students,
+                         students=page.rows,
+                         page=page,
+                         q=q,
                          page_title="Students",
                          page_heading="Students")
 
@@ -169,7 +344,7 @@ def add_student():
         date_of_birth = request.form.get("date_of_birth") or None
         gender = request.form.get("gender") or None
         
-        conn = get_db_connection()
+        conn = get_db()
         
         # Vérifier si le matricule existe déjà
         existing = conn.execute(
@@ -178,7 +353,6 @@ def add_student():
         ).fetchone()
         
         if existing:
-            conn.close()
             flash("Matricule number already exists!", "error")
             return redirect(url_for("add_student"))
         
@@ -188,7 +362,7 @@ def add_student():
         """, (name, matricule, date_of_birth, gender))
         
         conn.commit()
-        conn.close()
+        invalidate_tables("students")
         flash("Student added successfully!", "success")
         return redirect(url_for("students"))
     
@@ -198,7 +372,7 @@ def add_student():
 @app.route("/students/edit/<int:id>", methods=["GET", "POST"])
 @login_required
 def edit_student(id):
-    conn = get_db_connection()
+    conn = get_db()
     
     if request.method == "POST":
         name = request.form["name"]
@@ -212,12 +386,11 @@ def edit_student(id):
             WHERE id = ?
         """, (name, matricule, dob, gender, id))
         conn.commit()
-        conn.close()
+        invalidate_tables("students")
         flash("Student updated successfully!", "success")
         return redirect(url_for("students"))
     
     student = conn.execute("SELECT * FROM students WHERE id = ?", (id,)).fetchone()
-    conn.close()
     
     if not student:
         flash("Student not found", "error")
@@ -231,10 +404,10 @@ def edit_student(id):
 @app.route("/students/delete/<int:id>")
 @login_required
 def delete_student(id):
-    conn = get_db_connection()
+    conn = get_db()
     conn.execute("DELETE FROM students WHERE id = ?", (id,))
     conn.commit()
-    conn.close()
+    invalidate_tables("students")
     flash("Student deleted successfully!", "success")
     return redirect(url_for("students"))
 
@@ -242,11 +415,17 @@ def delete_student(id):
 @app.route("/teachers")
 @login_required
 def teachers():
-    conn = get_db_connection()
-    teachers = conn.execute("SELECT * FROM teachers").fetchall()
-    conn.close()
+    conn = get_db()
+    q = request.args.get("q", "").strip()
+    where, params = [], []
+    if q:
+        where.append("first_name LIKE ? OR last_name LIKE ?")
+        params += [f"%{q}%", f"%{q}%"]
+    page = keyset_paginate(conn, "SELECT * FROM teachers", where, params, **page_args())
     return render_template("teachers.html",
-                         teachers=teachers,
+                         teachers=page.rows,
+                         page=page,
+                         q=q,
                          page_title="Teachers",
                          page_heading="Teachers")
 
@@ -263,7 +442,7 @@ def add_teacher():
         country = request.form.get("country", "")
         # photo = request.files.get("photo")  # Si vous gérez les uploads
         
-        conn = get_db_connection()
+        conn = get_db()
         conn.execute("""
             INSERT INTO teachers 
             (first_name, last_name, phone, profession, diploma, country) 
@@ -271,7 +450,7 @@ def add_teacher():
         """, (first_name, last_name, phone, profession, diploma, country))
         
         conn.commit()
-        conn.close()
+        invalidate_tables("teachers")
         flash("Teacher added successfully!", "success")
         return redirect(url_for("teachers"))
     
@@ -281,7 +460,7 @@ def add_teacher():
 @app.route("/teachers/edit/<int:id>", methods=["GET", "POST"])
 @login_required
 def edit_teacher(id):
-    conn = get_db_connection()
+    conn = get_db()
 
     if request.method == "POST":
         first_name = request.form["first_name"]
@@ -298,12 +477,11 @@ def edit_teacher(id):
             WHERE id = ?
         """, (first_name, last_name, phone, profession, diploma, country, id))
         conn.commit()
-        conn.close()
+        invalidate_tables("teachers")
         flash("Teacher updated successfully!", "success")
         return redirect(url_for("teachers"))
 
     teacher = conn.execute("SELECT * FROM teachers WHERE id = ?", (id,)).fetchone()
-    conn.close()
     
     if not teacher:
         flash("Teacher not found", "error")
@@ -317,10 +495,10 @@ def edit_teacher(id):
 @app.route("/teachers/delete/<int:id>")
 @login_required
 def delete_teacher(id):
-    conn = get_db_connection()
+    conn = get_db()
     conn.execute("DELETE FROM teachers WHERE id = ?", (id,))
     conn.commit()
-    conn.close()
+    invalidate_tables("teachers")
     flash("Teacher deleted successfully!", "success")
     return redirect(url_for("teachers"))
 
@@ -328,7 +506,7 @@ def delete_teacher(id):
 @app.route("/debug/tables")
 @login_required
 def debug_tables():
-    conn = get_db_connection()
+    conn = get_db()
     
     # Voir la structure de la table teachers
     teachers_info = conn.execute("PRAGMA table_info(teachers)").fetchall()
@@ -336,8 +514,6 @@ def debug_tables():
     # Voir la structure de la table timetable
     timetable_info = conn.execute("PRAGMA table_info(timetable)").fetchall()
     
-    conn.close()
-    
     output = "<h2>Teachers Table Structure:</h2><pre>"
     for col in teachers_info:
         output += f"{col['name']} - {col['type']}\n"
@@ -349,15 +525,61 @@ def debug_tables():
     output += "</pre>"
     return output
 
+# ----- cache statistics -----
+@app.route("/debug/cache")
+@login_required
+def debug_cache():
+    return jsonify([c.stats() for c in all_caches()])
+
+# ----- connection pool metrics -----
+@app.route("/debug/pool")
+@login_required
+def debug_pool():
+    if request.args.get("format") == "json":
+        return jsonify(db.get_pool().snapshot())
+    return db.pool_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+# ----- request and SQL profiling -----
+@app.route("/debug/perf")
+@login_required
+def debug_perf():
+    profiler = profiling.get_profiler()
+    if profiler is None:
+        abort(404)
+    report = profiler.snapshot(top=request.args.get("top", 50, type=int))
+    if request.args.get("format") == "json":
+        return jsonify(report)
+    return render_template("perf.html", report=report)
+
+@app.route("/metrics")
+def metrics():
+    # Jeton pour les scrapers Prometheus, sinon session admin comme les autres pages de debug
+    token = app.config["METRICS_TOKEN"]
+    authorized = session.get("admin_logged_in") or (
+        token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"))
+    if not authorized:
+        abort(401)
+    profiler = profiling.get_profiler()
+    body = (profiler.metrics() if profiler else "") + db.pool_metrics()
+    return body, 200, {"Content-Type": "text/plain; version=0.0.4"}
+
 # ===== CLASSES ROUTES =====
 @app.route("/classes")
 @login_required
+@cached_page("classes")
 def classes():
-    conn = get_db_connection()
-    classes = conn.execute("SELECT * FROM classes").fetchall()
-    conn.close()
+    conn = get_db()
+    q = request.args.get("q", "").strip()
+    if q:
+        classes = conn.execute(
+            "SELECT * FROM classes WHERE name LIKE ? OR level LIKE ? ORDER BY id",
+            (f"%{q}%", f"%{q}%")
+        ).fetchall()
+    else:
+        classes = conn.execute("SELECT * FROM classes").fetchall()
     return render_template("classes.html",
                          classes=classes,
+                         q=q,
                          page_title="Classes",
                          page_heading="Classes")
 
@@ -369,7 +591,7 @@ def add_class():
         name = request.form.get("name")
         level = request.form.get("level")
         
-        conn = get_db_connection()
+        conn = get_db()
         
         # Vérifier si la classe existe déjà
         existing = conn.execute(
@@ -378,7 +600,6 @@ def add_class():
         ).fetchone()
         
         if existing:
-            conn.close()
             flash("A class with this name and level already exists!", "error")
             return redirect(url_for("add_class"))
         
@@ -388,7 +609,7 @@ def add_class():
         """, (name, level))
         
         conn.commit()
-        conn.close()
+        invalidate_tables("classes")
         flash(f"Class '{name}' created successfully!", "success")
         return redirect(url_for("classes"))
     
@@ -402,7 +623,7 @@ def add_class():
 @app.route("/classes/edit/<int:id>", methods=["GET", "POST"])
 @login_required
 def edit_class(id):
-    conn = get_db_connection()
+    conn = get_db()
     
     if request.method == "POST":
         name = request.form["name"]
@@ -414,12 +635,11 @@ def edit_class(id):
             WHERE id = ?
         """, (name, level, id))
         conn.commit()
-        conn.close()
+        invalidate_tables("classes")
         flash("Class updated successfully!", "success")
         return redirect(url_for("classes"))
     
     class_data = conn.execute("SELECT * FROM classes WHERE id = ?", (id,)).fetchone()
-    conn.close()
     
     if not class_data:
         flash("Class not found", "error")
@@ -433,26 +653,26 @@ def edit_class(id):
 @app.route("/classes/delete/<int:id>")
 @login_required
 def delete_class(id):
-    conn = get_db_connection()
+    conn = get_db()
     conn.execute("DELETE FROM classes WHERE id = ?", (id,))
     conn.commit()
-    conn.close()
+    invalidate_tables("classes")
     flash("Class deleted successfully!", "success")
     return redirect(url_for("classes"))
 
 # ===== SUBJECTS ROUTES =====
 @app.route("/subjects")
 @login_required
+@cached_page("subjects", "classes")
 def subjects():
-    conn = get_db_connection()
+    conn = get_db()
     subjects = conn.execute("""
         SELECT sub.id, sub.name, sub.coefficient, c.name AS class_name
         FROM subjects sub
         LEFT JOIN classes c ON sub.class_id = c.id
     """).fetchall()
     
-    classes_list = conn.execute("SELECT id, name FROM classes").fetchall()
-    conn.close()
+    classes_list = reference.get(conn, "classes")
     
     return render_template("subjects.html",
                          subjects=subjects,
@@ -460,17 +680,30 @@ def subjects():
                          page_title="Subjects",
                          page_heading="Subjects")
 
+def parse_coefficient(value):
+    """Coefficient saisi -> nombre entre 1 et 10 (entier si possible), None s'il est invalide."""
+    try:
+        coefficient = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= coefficient <= 10:
+        return None
+    return int(coefficient) if coefficient.is_integer() else coefficient
+
 # ---- add subject -----
 @app.route("/subjects/add", methods=["GET", "POST"])
 @login_required
 def add_subject():
-    conn = get_db_connection()
+    conn = get_db()
     
     if request.method == "POST":
         name = request.form.get("name")
-        coefficient = request.form.get("coefficient")
+        coefficient = parse_coefficient(request.form.get("coefficient"))
         class_id = request.form.get("class_id") or None
         teacher_id = request.form.get("teacher_id") or None
+        if coefficient is None:
+            flash("Coefficient must be a number between 1 and 10", "error")
+            return redirect(url_for("add_subject"))
         
         conn.execute("""
             INSERT INTO subjects (name, coefficient, class_id, teacher_id)
@@ -478,14 +711,13 @@ def add_subject():
         """, (name, coefficient, class_id, teacher_id))
         
         conn.commit()
-        conn.close()
+        invalidate_tables("subjects")
         flash(f"Subject '{name}' created successfully!", "success")
         return redirect(url_for("subjects"))
     
     # Récupérer les données pour les dropdowns
-    classes = conn.execute("SELECT id, name, level FROM classes ORDER BY name").fetchall()
-    teachers = conn.execute("SELECT id, first_name, last_name FROM teachers ORDER BY first_name").fetchall()
-    conn.close()
+    classes = reference.get(conn, "classes")
+    teachers = reference.get(conn, "teachers")
     
     return render_template("add_subject.html", 
                          page_title="Add Subject",
@@ -496,13 +728,16 @@ def add_subject():
 @app.route("/subjects/edit/<int:id>", methods=["GET", "POST"])
 @login_required
 def edit_subject(id):
-    conn = get_db_connection()
+    conn = get_db()
     
     if request.method == "POST":
         # Récupérer les données du formulaire
         name = request.form.get("name")
-        coefficient = request.form.get("coefficient")
+        coefficient = parse_coefficient(request.form.get("coefficient"))
         class_id = request.form.get("class_id") or None
+        if coefficient is None:
+            flash("Coefficient must be a number between 1 and 10", "error")
+            return redirect(url_for("subjects"))
         
         # Mettre à jour la matière
         conn.execute("""
@@ -512,7 +747,7 @@ def edit_subject(id):
         """, (name, coefficient, class_id, id))
         
         conn.commit()
-        conn.close()
+        invalidate_tables("subjects")
         flash("Subject updated successfully!", "success")
         return redirect(url_for("subjects"))
     
@@ -524,8 +759,7 @@ def edit_subject(id):
         WHERE s.id = ?
     """, (id,)).fetchone()
     
-    classes = conn.execute("SELECT id, name FROM classes").fetchall()
-    conn.close()
+    classes = reference.get(conn, "classes")
     
     if not subject:
         flash("Subject not found", "error")
@@ -540,20 +774,19 @@ def edit_subject(id):
 @app.route("/subjects/delete/<int:id>")
 @login_required
 def delete_subject(id):
-    conn = get_db_connection()
+    conn = get_db()
     
     # Vérifie d'abord si la matière existe
     subject = conn.execute("SELECT * FROM subjects WHERE id = ?", (id,)).fetchone()
     
     if not subject:
-        conn.close()
         flash("Subject not found", "error")
         return redirect(url_for("subjects"))
     
     # Supprimer la matière
     conn.execute("DELETE FROM subjects WHERE id = ?", (id,))
     conn.commit()
-    conn.close()
+    invalidate_tables("subjects")
     
     flash("Subject deleted successfully!", "success")
     return redirect(url_for("subjects"))
@@ -562,19 +795,42 @@ def delete_subject(id):
 @app.route("/enrollments")
 @login_required
 def enrollments():
-    conn = get_db_connection()
-    enrollments = conn.execute("""
-        SELECT e.id, s.name AS student_name, c.name AS class_name, e.academic_year
-        FROM enrollments e
+    conn = get_db()
+    q = request.args.get("q", "").strip()
+    class_id = request.args.get("class_id", type=int)
+    academic_year = request.args.get("academic_year", "").strip()
+    archived = archive.archived_years(app.config["ARCHIVE_DIR"])
+    history = bool(request.args.get("history")) or academic_year in archived
+    tables = history_tables(history)
+    
+    where, params = [], []
+    if q:
+        where.append("s.name LIKE ?")
+        params.append(f"%{q}%")
+    if class_id:
+        where.append("e.class_id = ?")
+        params.append(class_id)
+    if academic_year:
+        where.append("e.academic_year = ?")
+        params.append(academic_year)
+    
+    page = keyset_paginate(conn, f"""
+        SELECT e.id, e.student_id, s.name AS student_name, c.name AS class_name, e.academic_year
+        FROM {tables["enrollments"]} e
         JOIN students s ON e.student_id = s.id
         JOIN classes c ON e.class_id = c.id
-    """).fetchall()
+    """, where, params, key="e.id", **page_args())
     
-    classes_list = conn.execute("SELECT id, name FROM classes").fetchall()
-    conn.close()
+    classes_list = reference.get(conn, "classes")
     
     return render_template("enrollments.html",
-                         enrollments=enrollments,
+                         enrollments=page.rows,
+                         page=page,
+                         q=q,
+                         class_id=class_id,
+                         academic_year=academic_year,
+                         history=history,
+                         archived=archived,
                          classes=classes_list,
                          page_title="Enrollments",
                          page_heading="Enrollments")
@@ -583,38 +839,81 @@ def enrollments():
 @app.route("/enrollments/add", methods=["GET", "POST"])
 @login_required
 def add_enrollment():
-    conn = get_db_connection()
-    students = conn.execute("SELECT id, name FROM students").fetchall()
-    classes = conn.execute("SELECT id, name FROM classes").fetchall()
+    conn = get_db()
 
     if request.method == "POST":
         student_id = request.form["student_id"]
         class_id = request.form["class_id"]
         academic_year = request.form["academic_year"]
 
-        conn.execute(
+        write_transaction(conn, lambda c: c.execute(
             "INSERT INTO enrollments (student_id, class_id, academic_year) VALUES (?, ?, ?)",
             (student_id, class_id, academic_year)
-        )
-        conn.commit()
-        conn.close()
+        ))
+        invalidate_tables("enrollments")
         flash("Enrollment added successfully!", "success")
         return redirect(url_for("enrollments"))
 
-    conn.close()
+    # Au-delà de STUDENT_LIST_LIMIT élèves, la liste est remplie par la recherche
     return render_template("add_enrollment.html", 
-                         students=students, 
-                         classes=classes,
+                         students=reference.students(conn), 
+                         classes=reference.get(conn, "classes"),
                          page_title="Add Enrollment")
 
+# ---- roll-over -----
+# Passage à l'année suivante : toutes les inscriptions d'une année en une transaction
+@app.route("/enrollments/rollover", methods=["GET", "POST"])
+@login_required
+def rollover_enrollments():
+    conn = get_db()
+    years = rollover.years(conn)
+    source_year = request.values.get("source_year") or (years[0] if years else None)
+    target_year = request.values.get("target_year") or rollover.next_year(source_year)
+    report = None
+    if request.method == "POST":
+        # Champs map_<classe source> = classe cible ; vide = classe non reconduite
+        mapping = {int(key[4:]): request.form.get(key, type=int) for key in request.form
+                   if key.startswith("map_") and key[4:].isdigit()}
+        dry_run = request.form.get("action") != "run"
+        try:
+            report = rollover.rollover(conn, source_year, target_year, mapping,
+                                       carry_fees=bool(request.form.get("carry_fees")), dry_run=dry_run)
+        except rollover.RolloverError as e:
+            flash(str(e), "error")
+        else:
+            if not dry_run:
+                invalidate_tables("enrollments", "fee_transactions", "fee_balances")
+            verb = "would be enrolled" if dry_run else "enrolled"
+            flash(f"{report.enrolled} students {verb} in {target_year}, {report.conflict_count} skipped",
+                  "success" if not report.conflict_count else "info")
+
+    # Classes de l'année source avec leurs effectifs : une ligne par classe à mapper
+    sources = conn.execute("""
+        SELECT c.id, c.name, c.level, COUNT(*) AS students
+        FROM enrollments e JOIN classes c ON c.id = e.class_id
+        WHERE e.academic_year = ?
+        GROUP BY c.id
+        ORDER BY c.level, c.name
+    """, (source_year,)).fetchall()
+    return render_template("rollover.html",
+                         years=years,
+                         source_year=source_year,
+                         target_year=target_year,
+                         sources=sources,
+                         classes=reference.get(conn, "classes"),
+                         form=request.form,
+                         report=report,
+                         page_title="Year Roll-over",
+                         page_heading="Year Roll-over")
+
 # ---- delete enrollment -----
 @app.route("/enrollments/delete/<int:id>")
 @login_required
 def delete_enrollment(id):
-    conn = get_db_connection()
+    conn = get_db()
     conn.execute("DELETE FROM enrollments WHERE id = ?", (id,))
     conn.commit()
-    conn.close()
+    invalidate_tables("enrollments")
     flash("Enrollment deleted successfully!", "success")
     return redirect(url_for("enrollments"))
 
@@ -631,21 +930,30 @@ def edit_enrollment(id):
 @app.route("/results")
 @login_required
 def results():
-    conn = get_db_connection()
-    results = conn.execute("""
+    conn = get_db()
+    q = request.args.get("q", "").strip()
+    semester = request.args.get("semester", type=int)
+    history = bool(request.args.get("history"))
+    tables = history_tables(history)
+    where, params = exports.results_filters(request.args)
+    
+    page = keyset_paginate(conn, f"""
         SELECT r.id, s.name AS student_name, sub.name AS subject_name,
                r.score, r.semester, sub.coefficient
-        FROM results r
-        JOIN enrollments e ON r.enrollment_id = e.id
+        FROM {tables["results"]} r
+        JOIN {tables["enrollments"]} e ON r.enrollment_id = e.id
         JOIN students s ON e.student_id = s.id
         JOIN subjects sub ON r.subject_id = sub.id
-    """).fetchall()
+    """, where, params, key="r.id", **page_args())
     
-    subjects_list = conn.execute("SELECT id, name FROM subjects").fetchall()
-    conn.close()
+    subjects_list = reference.get(conn, "subjects")
     
     return render_template("results.html",
-                         results=results,
+                         results=page.rows,
+                         page=page,
+                         q=q,
+                         semester=semester,
+                         history=history,
                          subjects=subjects_list,
                          page_title="Results",
                          page_heading="Results")
@@ -654,7 +962,7 @@ def results():
 @app.route("/results/add", methods=["GET", "POST"])
 @login_required
 def add_result():
-    conn = get_db_connection()
+    conn = get_db()
     
     if request.method == "POST":
         enrollment_id = request.form.get("enrollment_id")
@@ -662,24 +970,25 @@ def add_result():
         score = float(request.form.get("score"))
         semester = int(request.form.get("semester", 1))
         
-        # Vérifier si le résultat existe déjà
-        existing = conn.execute("""
-            SELECT id FROM results 
-            WHERE enrollment_id = ? AND subject_id = ? AND semester = ?
-        """, (enrollment_id, subject_id, semester)).fetchone()
+        def insert_result(c):
+            # Vérifier si le résultat existe déjà
+            existing = c.execute("""
+                SELECT id FROM results 
+                WHERE enrollment_id = ? AND subject_id = ? AND semester = ?
+            """, (enrollment_id, subject_id, semester)).fetchone()
+            if existing:
+                return False
+            c.execute("""
+                INSERT INTO results (enrollment_id, subject_id, score, semester)
+                VALUES (?, ?, ?, ?)
+            """, (enrollment_id, subject_id, score, semester))
+            return True
         
-        if existing:
-            conn.close()
+        if not write_transaction(conn, insert_result):
             flash("Result for this student/subject/semester already exists!", "error")
             return redirect(url_for("add_result"))
+        invalidate_tables("results")
         
-        conn.execute("""
-            INSERT INTO results (enrollment_id, subject_id, score, semester)
-            VALUES (?, ?, ?, ?)
-        """, (enrollment_id, subject_id, score, semester))
-        
-        conn.commit()
-        conn.close()
         flash("Result added successfully!", "success")
         return redirect(url_for("results"))
     
@@ -692,17 +1001,63 @@ def add_result():
         ORDER BY s.name
     """).fetchall()
     
-    subjects = conn.execute("""
-        SELECT id, name, coefficient FROM subjects ORDER BY name
-    """).fetchall()
-    
-    conn.close()
+    subjects = reference.get(conn, "subjects")
     
     return render_template("add_result.html", 
                          page_title="Add Result",
                          enrollments=enrollments,
                          subjects=subjects)
 
+# ---- grade grid -----
+# Toute une classe pour une matière et un semestre : une lecture, une transaction
+@app.route("/results/grid", methods=["GET", "POST"])
+@login_required
+def results_grid():
+    conn = get_db()
+    args = request.values
+    class_id = args.get("class_id", type=int)
+    subject_id = args.get("subject_id", type=int)
+    semester = args.get("semester", 1, type=int)
+    years = [row[0] for row in conn.execute(
+        "SELECT DISTINCT academic_year FROM enrollments WHERE class_id = ? ORDER BY academic_year DESC",
+        (class_id,))] if class_id else []
+    academic_year = args.get("academic_year") or (years[0] if years else None)
+    subjects_list = reference.subjects_of(conn, class_id) if class_id else ()
+    ready = class_id and academic_year and semester in (1, 2) and any(s.id == subject_id for s in subjects_list)
+
+    entries = gradebook.roster(conn, class_id, subject_id, semester, academic_year) if ready else []
+    values, errors = {}, {}
+    if request.method == "POST" and ready:
+        changes, errors = gradebook.validate(entries, request.form)
+        if errors:
+            # Rien n'est écrit : la grille est réaffichée avec les saisies et les erreurs
+            values = {entry.enrollment_id: request.form.get(f"score_{entry.enrollment_id}", "")
+                      for entry in entries}
+            flash(f"{len(errors)} score(s) are invalid, nothing was saved", "error")
+        else:
+            written, cleared = gradebook.save(conn, subject_id, semester, changes)
+            if changes:
+                invalidate_tables("results")
+            flash(f"{written} score(s) saved, {cleared} cleared", "success")
+            return redirect(url_for("results_grid", class_id=class_id, subject_id=subject_id,
+                                    semester=semester, academic_year=academic_year))
+
+    return render_template("results_grid.html",
+                         entries=entries,
+                         values=values,
+                         errors=errors,
+                         class_id=class_id,
+                         subject_id=subject_id,
+                         semester=semester,
+                         academic_year=academic_year,
+                         years=years,
+                         classes=reference.get(conn, "classes"),
+                         subjects=subjects_list,
+                         ready=ready,
+                         max_score=gradebook.MAX_SCORE,
+                         page_title="Grade Entry",
+                         page_heading="Grade Entry")
+
 # ---- edit result -----
 @app.route("/results/edit/<int:id>")
 @login_required
@@ -714,39 +1069,86 @@ def edit_result(id):
 @app.route("/results/delete/<int:id>")
 @login_required
 def delete_result(id):
-    conn = get_db_connection()
+    conn = get_db()
     conn.execute("DELETE FROM results WHERE id = ?", (id,))
     conn.commit()
-    conn.close()
+    invalidate_tables("results")
     flash("Result deleted successfully!", "success")
     return redirect(url_for("results"))
 
+# ---- statistics -----
+# Classements et distributions : invalidés par add_result / delete_result (table results)
+# et par les écritures sur les inscriptions, élèves, matières et classes
+statistics_cache = TTLCache("statistics", ttl=app.config["STATISTICS_CACHE_TTL"],
+                            tables=("results", "enrollments", "students", "subjects", "classes"))
+
+def statistics_filters():
+    args = request.args
+    return (args.get("class_id", type=int), args.get("year") or None,
+            args.get("semester", type=int), args.get("subject_id", type=int))
+
+def get_statistics(conn, filters):
+    return statistics_cache.get_or_set(filters, lambda: grade_stats.compute(conn, *filters))
+
+@app.route("/statistics")
+@login_required
+def statistics():
+    conn = get_db()
+    filters = statistics_filters()
+    class_id, academic_year, semester, subject_id = filters
+    
+    classes_list = reference.get(conn, "classes")
+    years = [row[0] for row in conn.execute(
+        "SELECT DISTINCT academic_year FROM enrollments ORDER BY academic_year DESC")]
+    subjects_list = reference.subjects_of(conn, class_id)
+    
+    return render_template("statistics.html",
+                         report=get_statistics(conn, filters),
+                         class_id=class_id,
+                         academic_year=academic_year,
+                         semester=semester,
+                         subject_id=subject_id,
+                         classes=classes_list,
+                         years=years,
+                         subjects=subjects_list,
+                         page_title="Statistics",
+                         page_heading="Statistics")
+
+@app.route("/api/statistics")
+@login_required
+def api_statistics():
+    return jsonify(get_statistics(get_db(), statistics_filters()))
+
 
 # ===== FEES ROUTES =====
 @app.route("/fees")
 @login_required
 def fees():
-    conn = get_db_connection()
-    fees_data = conn.execute("""
+    conn = get_db()
+    class_id = request.args.get("class_id", type=int)
+    where, params = exports.fees_filters(request.args)
+    
+    page = keyset_paginate(conn, """
         SELECT f.id,
                s.name AS student_name,
                s.id as student_id,
                c.name AS class_name,
-               f.total_fee,
-               f.amount_paid,
-               (f.total_fee - f.amount_paid) AS remaining,
-               f.payment_mode,
+               f.total_due AS total_fee,
+               f.total_paid AS amount_paid,
+               f.balance AS remaining,
+               f.last_payment_mode AS payment_mode,
                f.status
-        FROM fees f
+        FROM fee_balances f
         JOIN students s ON f.student_id = s.id
         JOIN classes c ON f.class_id = c.id
-    """).fetchall()
+    """, where, params, key="f.id", **page_args())
     
-    classes_list = conn.execute("SELECT id, name FROM classes").fetchall()
-    conn.close()
+    classes_list = reference.get(conn, "classes")
     
     return render_template("fees.html",
-                         fees=fees_data,
+                         fees=page.rows,
+                         page=page,
+                         class_id=class_id,
                          classes=classes_list,
                          page_title="Fees",
                          page_heading="Fees")
@@ -755,53 +1157,38 @@ def fees():
 @app.route("/fees/add", methods=["GET", "POST"])
 @login_required
 def add_fee():
-    conn = get_db_connection()
+    conn = get_db()
     
     if request.method == "POST":
-        student_id = request.form.get("student_id")
-        class_id = request.form.get("class_id")
-        total_fee = float(request.form.get("total_fee"))
+        student_id = int(request.form.get("student_id"))
+        class_id = int(request.form.get("class_id"))
+        total_fee = float(request.form.get("total_fee") or 0)
         payment_method = request.form.get("payment_method")
-        amount_paid = float(request.form.get("amount_paid"))
-        remaining_amount = float(request.form.get("remaining_amount"))
-        status = request.form.get("status")
+        amount_paid = float(request.form.get("amount_paid") or 0)
+        if total_fee <= 0 and amount_paid <= 0:
+            flash("Enter a fee amount or a payment", "error")
+            return redirect(url_for("add_fee"))
         
-        conn.execute("""
-            INSERT INTO school_fees 
-            (student_id, class_id, total_fee, payment_method, amount_paid, remaining_amount, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (student_id, class_id, total_fee, payment_method, amount_paid, remaining_amount, status))
+        # Une facturation et/ou un paiement dans le grand livre ; le solde et le statut
+        # sont calculés par la base, plus repris du formulaire
+        def post(c):
+            if total_fee > 0:
+                ledger.record(c, student_id, class_id, "charge", total_fee)
+            if amount_paid > 0:
+                ledger.record(c, student_id, class_id, "payment", amount_paid, payment_method)
+            return ledger.get_balance(c, student_id, class_id)
         
-        conn.commit()
-        conn.close()
-        flash(f"Fee record added successfully! Status: {status}", "success")
+        balance = write_transaction(conn, post)
+        invalidate_tables("fee_transactions", "fee_balances")
+        
+        flash(f"Fee record added successfully! Status: {balance['status']}", "success")
         return redirect(url_for("fees"))
     
-    # Récupérer les données pour les dropdowns
-    students = conn.execute("""
-        SELECT s.id, s.name, s.matricule, e.class_id 
-        FROM students s
-        LEFT JOIN enrollments e ON s.id = e.student_id
-        ORDER BY s.name
-    """).fetchall()
-    
-    classes = conn.execute("""
-        SELECT c.id, c.name, c.level, f.fee_amount as fee
-        FROM classes c
-        LEFT JOIN (
-            SELECT class_id, AVG(total_fee) as fee_amount 
-            FROM school_fees 
-            GROUP BY class_id
-        ) f ON c.id = f.class_id
-        ORDER BY c.name
-    """).fetchall()
-    
-    conn.close()
-    
+    # Listes des dropdowns depuis le cache ; None au-delà de STUDENT_LIST_LIMIT élèves
     return render_template("add_fee.html", 
                          page_title="Add Fee",
-                         students=students,
-                         classes=classes)
+                         students=reference.students(conn),
+                         classes=reference.get(conn, "class_fees"))
 
 # ---- edit fee -----
 @app.route("/fees/edit/<int:id>")
@@ -814,23 +1201,78 @@ def edit_fee(id):
 @app.route("/fees/delete/<int:id>")
 @login_required
 def delete_fee(id):
-    conn = get_db_connection()
-    conn.execute("DELETE FROM fees WHERE id = ?", (id,))
-    conn.commit()
-    conn.close()
-    flash("Fee record deleted successfully!", "success")
+    conn = get_db()
+    # Le grand livre est en ajout seul : on annule le reste dû par une écriture d'ajustement
+    def write_off(c):
+        balance = c.execute("SELECT * FROM fee_balances WHERE id = ?", (id,)).fetchone()
+        if balance and balance["balance"] > 0:
+            ledger.record(c, balance["student_id"], balance["class_id"], "adjustment",
+                          -balance["balance"], note="write-off")
+        return balance
+    
+    balance = write_transaction(conn, write_off)
+    if not balance:
+        flash("Fee record not found", "error")
+        return redirect(url_for("fees"))
+    if balance["balance"] <= 0:
+        # Rien n'a été écrit : pas de reste dû à annuler
+        flash("Nothing to write off: this fee has no outstanding balance", "info")
+        return redirect(url_for("fees"))
+    invalidate_tables("fee_transactions", "fee_balances")
+    flash("Outstanding balance written off", "success")
     return redirect(url_for("fees"))
 
+# ---- arrears aging -----
+# Rapport gardé par (version du grand livre, date) : toute écriture change MAX(id)
+aging_cache = TTLCache("aging", ttl=app.config["AGING_CACHE_TTL"], tables=("fee_transactions",))
+
+@app.route("/fees/aging")
+@login_required
+def fees_aging():
+    conn = get_db()
+    as_of = request.args.get("as_of") or datetime.now().strftime("%Y-%m-%d")
+    try:
+        datetime.strptime(as_of, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "as_of must be YYYY-MM-DD"}), 400
+    report = aging_cache.get_or_set((aging.data_version(conn), as_of),
+                                    lambda: aging.compute(conn, as_of))
+    
+    fmt = request.args.get("format")
+    if fmt == "json":
+        return jsonify(report)
+    if fmt == "csv":
+        return Response(
+            aging.to_csv(report),
+            mimetype="text/csv",
+            headers={"Content-Disposition": f"attachment; filename=aging_{as_of}.csv"},
+        )
+    return render_template("aging.html",
+                         report=report,
+                         page_title="Arrears Aging",
+                         page_heading="Arrears Aging")
+
 
 # ===== ROOMS ROUTES =====
+# Bitmaps d'occupation des salles : mis à jour à chaque ajout/suppression de créneau,
+# rechargés entièrement après ROOM_OCCUPANCY_TTL (écritures d'autres processus)
+room_occupancy = occupancy.RoomOccupancy()
+
+def get_occupancy(conn):
+    if room_occupancy.is_stale(app.config["ROOM_OCCUPANCY_TTL"]):
+        room_occupancy.load(conn)
+    return room_occupancy
+
 @app.route("/rooms")
 @login_required
+@cached_page("rooms", "timetable")
 def rooms():
-    conn = get_db_connection()
+    conn = get_db()
     rooms = conn.execute("SELECT * FROM rooms ORDER BY name").fetchall()
-    conn.close()
+    usage = {room["id"]: room["week"] for room in get_occupancy(conn).utilization()}
     return render_template("rooms.html",
                          rooms=rooms,
+                         usage=usage,
                          page_title="Rooms",
                          page_heading="Rooms")
 
@@ -843,13 +1285,14 @@ def add_room():
         capacity = request.form["capacity"]
         location = request.form["location"]
 
-        conn = get_db_connection()
+        conn = get_db()
         conn.execute("""
             INSERT INTO rooms (name, capacity, location)
             VALUES (?, ?, ?)
         """, (name, capacity, location))
         conn.commit()
-        conn.close()
+        invalidate_tables("rooms")
+        room_occupancy.invalidate()
         flash("Room added successfully!", "success")
         return redirect(url_for("rooms"))
 
@@ -859,10 +1302,11 @@ def add_room():
 @app.route("/rooms/delete/<int:id>")
 @login_required
 def delete_room(id):
-    conn = get_db_connection()
+    conn = get_db()
     conn.execute("DELETE FROM rooms WHERE id = ?", (id,))
     conn.commit()
-    conn.close()
+    invalidate_tables("rooms")
+    room_occupancy.invalidate()
     flash("Room deleted successfully!", "success")
     return redirect(url_for("rooms"))
 
@@ -874,12 +1318,46 @@ def edit_room(id):
     return redirect(url_for("rooms"))
 
 
+# ---- free rooms / utilization (JSON) -----
+@app.route("/api/rooms/free")
+@login_required
+def api_free_rooms():
+    day = request.args.get("day", "")
+    start = request.args.get("start", "")
+    end = request.args.get("end", "")
+    min_capacity = request.args.get("min_capacity", 0, type=int)
+    if day not in occupancy.DAYS:
+        return jsonify({"error": f"Unknown day '{day}'"}), 400
+    try:
+        if occupancy.to_minutes(end) <= occupancy.to_minutes(start):
+            return jsonify({"error": "end must be after start"}), 400
+    except ValueError:
+        return jsonify({"error": "start and end must be HH:MM"}), 400
+    return jsonify(get_occupancy(get_db()).free_rooms(day, start, end, min_capacity))
+
+@app.route("/api/rooms/utilization")
+@login_required
+def api_room_utilization():
+    return jsonify(get_occupancy(get_db()).utilization())
+
 # ===== TIMETABLE ROUTES =====
+# Conflits affichés par la liste, recalculés après chaque écriture ; lecture seule :
+# les écritures vérifient les chevauchements en base (conflicts.find)
+timetable_cache = TTLCache("timetable", ttl=app.config["TIMETABLE_CACHE_TTL"], tables=("timetable",))
+
 @app.route("/timetable")
 @login_required
+@cached_page("timetable", "classes", "subjects", "teachers", "rooms")
 def timetable():
-    conn = get_db_connection()
-    timetable_data = conn.execute("""
+    conn = get_db()
+    day = request.args.get("day", "").strip()
+    class_id = request.args.get("class_id", type=int)
+    where, params = exports.timetable_filters(request.args)
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    conflict_ids = timetable_cache.get_or_set(
+        "conflict_ids", lambda: conflicts.conflicting_ids(conflicts.validate(conn)))
+    
+    timetable_data = conn.execute(f"""
         SELECT t.id,
                c.name AS class_name,
                sub.name AS subject_name,
@@ -893,6 +1371,7 @@ def timetable():
         JOIN subjects sub ON t.subject_id = sub.id
         JOIN teachers te ON t.teacher_id = te.id  -- CHANGÉ ICI
         JOIN rooms r ON t.room_id = r.id
+        {where_sql}
         ORDER BY 
             CASE t.day 
                 WHEN 'Monday' THEN 1
@@ -904,15 +1383,16 @@ def timetable():
                 WHEN 'Sunday' THEN 7
             END,
             t.start_time
-    """).fetchall()
-    
-    classes_list = conn.execute("SELECT id, name FROM classes").fetchall()
-    teachers_list = conn.execute("SELECT id, first_name, last_name FROM teachers").fetchall()
+    """, params).fetchall()
     
-    conn.close()
+    classes_list = reference.get(conn, "classes")
+    teachers_list = reference.get(conn, "teachers")
     
     return render_template("timetable.html",
                          timetable=timetable_data,
+                         conflict_ids=conflict_ids,
+                         day=day,
+                         class_id=class_id,
                          classes=classes_list,
                          teachers=teachers_list,
                          page_title="Timetable",
@@ -922,42 +1402,93 @@ def timetable():
 @app.route("/timetable/add", methods=["GET", "POST"])
 @login_required
 def add_timetable():
-    conn = get_db_connection()
-
-    classes = conn.execute("SELECT id, name FROM classes").fetchall()
-    subjects = conn.execute("SELECT id, name FROM subjects").fetchall()
-    teachers = conn.execute("SELECT id, first_name, last_name FROM teachers").fetchall()
-    rooms = conn.execute("SELECT id, name FROM rooms").fetchall()
+    conn = get_db()
 
     if request.method == "POST":
-        conn.execute("""
-            INSERT INTO timetable
-            (class_id, subject_id, teacher_id, room_id, day, start_time, end_time)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            request.form["class_id"],
-            request.form["subject_id"],
-            request.form["teacher_id"],
-            request.form["room_id"],
-            request.form["day"],
-            request.form["start_time"],
-            request.form["end_time"],
-        ))
-        conn.commit()
-        conn.close()
+        slot = {
+            "class_id": int(request.form["class_id"]),
+            "teacher_id": int(request.form["teacher_id"]),
+            "room_id": int(request.form["room_id"]),
+            "day": request.form["day"],
+            "start_time": request.form["start_time"],
+            "end_time": request.form["end_time"],
+        }
+        if conflicts.to_minutes(slot["end_time"]) <= conflicts.to_minutes(slot["start_time"]):
+            flash("End time must be after start time", "error")
+            return redirect(url_for("add_timetable"))
+
+        def insert_slot(c):
+            found = conflicts.find(c, slot)
+            if found:
+                return found, None
+            cursor = c.execute("""
+                INSERT INTO timetable
+                (class_id, subject_id, teacher_id, room_id, day, start_time, end_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                slot["class_id"],
+                request.form["subject_id"],
+                slot["teacher_id"],
+                slot["room_id"],
+                slot["day"],
+                slot["start_time"],
+                slot["end_time"],
+            ))
+            return [], cursor.lastrowid
+
+        found, entry_id = write_transaction(conn, insert_slot)
+        if found:
+            for conflict in found:
+                flash(f"Conflict: {conflicts.describe(conflict)}", "error")
+            return redirect(url_for("add_timetable"))
+        invalidate_tables("timetable")
+        room_occupancy.add(entry_id, slot["room_id"], slot["day"], slot["start_time"], slot["end_time"])
         flash("Timetable entry added successfully!", "success")
         return redirect(url_for("timetable"))
 
-    conn.close()
     return render_template(
         "add_timetable.html",
-        classes=classes,
-        subjects=subjects,
-        teachers=teachers,
-        rooms=rooms,
+        classes=reference.get(conn, "classes"),
+        subjects=reference.get(conn, "subjects"),
+        teachers=reference.get(conn, "teachers"),
+        rooms=reference.get(conn, "rooms"),
         page_title="Add Timetable"
     )
 
+# ---- generate the whole timetable -----
+@app.route("/timetable/generate", methods=["GET", "POST"])
+@login_required
+def generate_timetable():
+    conn = get_db()
+    report = None
+    years = [row[0] for row in conn.execute(
+        "SELECT DISTINCT academic_year FROM enrollments WHERE academic_year IS NOT NULL ORDER BY 1 DESC")]
+
+    if request.method == "POST":
+        # Toujours en job : le solveur tourne jusqu'à 60 s, hors du thread de la requête
+        job_id = jobs.submit(conn, "timetable_generate", {
+            "academic_year": request.form.get("academic_year") or None,
+            "budget": max(1, min(request.form.get("budget", 10, type=int), 60)),
+            "hours_per_coefficient": request.form.get("hours_per_coefficient", 1, type=int),
+            "saturday": bool(request.form.get("saturday")), "apply": bool(request.form.get("apply"))},
+            created_by=session.get("user_name"))
+        return redirect(url_for("generate_timetable", job=job_id))
+
+    # ?job=<id> : la page suit le job (rechargée à la fin) puis affiche son rapport
+    job = jobs.get(conn, request.args.get("job", 0, type=int))
+    if job is not None and job["kind"] != "timetable_generate":
+        job = None
+    if job is not None and job["status"] == "succeeded":
+        report = job["result"]
+
+    return render_template(
+        "generate_timetable.html",
+        years=years,
+        report=report,
+        job=job,
+        page_title="Generate Timetable"
+    )
+
 # ---- edit timetable entry -----
 @app.route("/timetable/edit/<int:id>")
 @login_required
@@ -969,10 +1500,11 @@ def edit_timetable(id):
 @app.route("/timetable/delete/<int:id>")
 @login_required
 def delete_timetable(id):
-    conn = get_db_connection()
+    conn = get_db()
     conn.execute("DELETE FROM timetable WHERE id = ?", (id,))
     conn.commit()
-    conn.close()
+    invalidate_tables("timetable")
+    room_occupancy.remove(id)
     flash("Timetable entry deleted successfully!", "success")
     return redirect(url_for("timetable"))
 
@@ -981,46 +1513,47 @@ def delete_timetable(id):
 @app.route("/bulletin/<int:enrollment_id>")
 @login_required
 def bulletin(enrollment_id):
-    conn = get_db_connection()
-
-    enrollment = conn.execute("""
+    conn = get_db()
+    enrollment_sql = """
         SELECT e.id, s.name AS student_name, c.name AS class_name, e.academic_year
-        FROM enrollments e
+        FROM {enrollments} e
         JOIN students s ON e.student_id = s.id
         JOIN classes c ON e.class_id = c.id
         WHERE e.id = ?
-    """, (enrollment_id,)).fetchone()
+    """
+    tables = history_tables(False)
+    enrollment = conn.execute(enrollment_sql.format(**tables), (enrollment_id,)).fetchone()
+    if not enrollment:
+        # Inscription d'une année archivée : même bulletin, lu dans les vues d'historique
+        tables = history_tables(True)
+        enrollment = conn.execute(enrollment_sql.format(**tables), (enrollment_id,)).fetchone()
 
     if not enrollment:
-        conn.close()
         flash("Enrollment not found", "error")
         return redirect(url_for("enrollments"))
 
-    sem1_results = conn.execute("""
+    sem1_results = conn.execute(f"""
         SELECT sub.name AS subject_name, r.score, sub.coefficient
-        FROM results r
+        FROM {tables["results"]} r
         JOIN subjects sub ON r.subject_id = sub.id
         WHERE r.enrollment_id = ? AND r.semester = 1
     """, (enrollment_id,)).fetchall()
 
-    sem2_results = conn.execute("""
+    sem2_results = conn.execute(f"""
         SELECT sub.name AS subject_name, r.score, sub.coefficient
-        FROM results r
+        FROM {tables["results"]} r
         JOIN subjects sub ON r.subject_id = sub.id
         WHERE r.enrollment_id = ? AND r.semester = 2
     """, (enrollment_id,)).fetchall()
 
-    conn.close()
-
-    def calculate_total_and_average(results):
-        total_score = sum(r["score"] * r["coefficient"] for r in results)
-        total_coeff = sum(r["coefficient"] for r in results)
-        average = total_score / total_coeff if total_coeff else 0
-        return total_score, total_coeff, average
-
-    total1, coeff1, avg1 = calculate_total_and_average(sem1_results)
-    total2, coeff2, avg2 = calculate_total_and_average(sem2_results)
-    final_average = (total1 + total2) / (coeff1 + coeff2) if (coeff1 + coeff2) else 0
+    # Totaux et moyennes lus dans la table matérialisée (tenue à jour par triggers)
+    semesters, final_average = aggregates.get_averages(conn, enrollment_id, tables["enrollment_averages"])
+    sem1 = semesters.get(1)
+    sem2 = semesters.get(2)
+    total1 = sem1["weighted_sum"] if sem1 else 0
+    total2 = sem2["weighted_sum"] if sem2 else 0
+    avg1 = (sem1["average"] or 0) if sem1 else 0
+    avg2 = (sem2["average"] or 0) if sem2 else 0
 
     return render_template(
         "bulletin.html",
@@ -1033,6 +1566,317 @@ def bulletin(enrollment_id):
         page_title="Bulletin"
     )
 
+# ===== SEARCH =====
+@app.route("/api/search")
+@login_required
+def api_search():
+    q = request.args.get("q", "").strip()
+    kind = request.args.get("type")
+    limit = max(1, min(request.args.get("limit", 10, type=int), 50))
+    if kind and kind not in search.KINDS:
+        return jsonify({"error": f"Unknown type '{kind}'"}), 400
+    if not q:
+        return jsonify([])
+    return jsonify(search.search(get_db(), q, kind, limit))
+
+# ---- bulletins of a whole class (streamed) -----
+@app.route("/bulletins/class/<int:class_id>")
+@login_required
+def class_bulletins(class_id):
+    conn = get_db()
+    class_data = conn.execute("SELECT * FROM classes WHERE id = ?", (class_id,)).fetchone()
+    if not class_data:
+        flash("Class not found", "error")
+        return redirect(url_for("classes"))
+    
+    academic_year = request.args.get("year") or None
+    if request.args.get("background"):
+        # Archive zip d'un fichier par élève, préparée par un worker
+        return queue_job("bulletins", {"class_id": class_id, "academic_year": academic_year})
+    # Le HTML part vers le navigateur au fur et à mesure, élève par élève
+    return stream_template(
+        "bulletins.html",
+        bulletins=bulletins.iter_bulletins(conn, class_id, academic_year),
+        class_name=class_data["name"],
+        academic_year=academic_year,
+        page_title="Bulletins"
+    )
+
+# ===== IMPORT =====
+@app.route("/import", methods=["GET", "POST"])
+@login_required
+def import_data():
+    report = None
+    dry_run = False
+    if request.method == "POST":
+        dataset = request.form.get("dataset")
+        upload = request.files.get("file")
+        dry_run = bool(request.form.get("dry_run"))
+        if not upload or not upload.filename:
+            flash("Please choose a file to import", "error")
+            return redirect(url_for("import_data"))
+        if request.form.get("background"):
+            # Le fichier est gardé sur disque jusqu'à l'exécution du job, qui le supprime
+            filename = secure_filename(upload.filename)
+            path = os.path.join(app.config["JOB_FILES_DIR"], "uploads", f"{uuid.uuid4().hex}_{filename}")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            upload.save(path)
+            return queue_job("import", {"dataset": dataset, "path": path, "filename": filename,
+                                        "dry_run": dry_run})
+        try:
+            report = importer.import_rows(
+                get_db(), dataset, importer.open_rows(upload.filename, upload.stream), dry_run=dry_run)
+        except importer.ImportFileError as e:
+            flash(str(e), "error")
+            return redirect(url_for("import_data"))
+        if not dry_run and report.inserted:
+            invalidate_tables(importer.DATASETS[dataset].table)
+        verb = "validated" if dry_run else "imported"
+        flash(f"{report.inserted} rows {verb}, {report.error_count} errors",
+              "success" if not report.error_count else "info")
+
+    return render_template(
+        "import.html",
+        datasets=sorted(importer.DATASETS),
+        report=report,
+        dry_run=dry_run,
+        page_title="Import"
+    )
+
+# ===== EXPORT =====
+@app.route("/export/<name>")
+@login_required
+def export_data(name):
+    if name not in exports.EXPORTS:
+        abort(404)
+    fmt = request.args.get("format", "csv")
+    if fmt not in exports.FORMATS:
+        return jsonify({"error": f"Unknown format '{fmt}'"}), 400
+    compress = request.args.get("gzip") in ("1", "true", "yes")
+    if request.args.get("background"):
+        filters = [(key, value) for key, value in request.args.items(multi=True)
+                   if key not in ("format", "gzip", "background")]
+        return queue_job("export", {"name": name, "format": fmt, "gzip": compress, "filters": filters})
+    args = request.args.copy()
+    pool = db.get_pool()
+
+    # Connexion propre au générateur : la réponse est envoyée après la fin de la requête
+    def generate():
+        conn = pool.acquire()
+        try:
+            yield from exports.iter_export(conn, name, args, fmt, compress)
+        finally:
+            pool.release(conn)
+
+    filename = exports.filename(name, fmt, compress)
+    return Response(
+        generate(),
+        mimetype="application/gzip" if compress else exports.FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+# ===== BACKGROUND JOBS =====
+# Traitements exécutés par les workers de jobs.py ; ctx.conn est une connexion du pool des jobs
+@jobs.handler("bulletins")
+def bulletins_job(ctx, params):
+    out_dir = ctx.path("bulletins")
+    total = bulletins.export_bulletins(
+        ctx.conn, out_dir, params.get("class_id"), params.get("academic_year"), workers=0,
+        progress=lambda done, total: ctx.progress(done, total, f"{done}/{total} bulletins"))
+    archive = shutil.make_archive(out_dir, "zip", out_dir)
+    shutil.rmtree(out_dir)
+    return {"bulletins": total, "file": os.path.basename(archive)}
+
+# Pas de nouvel essai : un import partiel ne doit pas être rejoué
+@jobs.handler("import", max_attempts=1)
+def import_job(ctx, params):
+    dataset, dry_run = params["dataset"], bool(params.get("dry_run"))
+    verb = "valid" if dry_run else "inserted"
+    try:
+        with open(params["path"], "rb") as stream:
+            report = importer.import_rows(
+                ctx.conn, dataset, importer.open_rows(params["filename"], stream), dry_run=dry_run,
+                progress=lambda r: ctx.progress(r.rows_read, None, f"{r.rows_read} rows read, {r.inserted} {verb}"))
+    except importer.ImportFileError as e:
+        raise jobs.JobError(str(e))
+    finally:
+        if os.path.exists(params["path"]):
+            os.remove(params["path"])
+    if not dry_run and report.inserted:
+        invalidate_tables(importer.DATASETS[dataset].table)
+    return report.as_dict()
+
+@jobs.handler("export")
+def export_job(ctx, params):
+    name, fmt, compress = params.get("name"), params.get("format", "csv"), bool(params.get("gzip"))
+    if name not in exports.EXPORTS or fmt not in exports.FORMATS:
+        raise jobs.JobError(f"Unknown export '{name}' ({fmt})")
+    filename = exports.filename(name, fmt, compress)
+    written = 0
+    with open(ctx.path(filename), "wb") as out:
+        for chunk in exports.iter_export(ctx.conn, name, MultiDict(params.get("filters", [])), fmt, compress):
+            out.write(chunk)
+            written += len(chunk)
+            ctx.progress(written, None, f"{written // 1024} KB written")
+    return {"file": filename, "bytes": written}
+
+@jobs.handler("statistics", priority=-1)
+def statistics_job(ctx, params):
+    filters = (params.get("class_id"), params.get("year") or None,
+               params.get("semester"), params.get("subject_id"))
+    report = grade_stats.compute(ctx.conn, *filters)
+    # Le résultat alimente aussi le cache de la page /statistics de ce processus
+    statistics_cache.get_or_set(filters, lambda: report)
+    with open(ctx.path("statistics.json"), "w", encoding="utf-8") as out:
+        json.dump(report, out)
+    return {"file": "statistics.json", "students": len(report["rankings"]),
+            "classes": len(report["classes"]), "elapsed": report["elapsed"]}
+
+@jobs.handler("timetable_check")
+def timetable_check_job(ctx, params):
+    found = conflicts.validate(ctx.conn)
+    return {"conflicts": len(found), "details": [conflicts.describe(c) for c in found[:200]]}
+
+@jobs.handler("timetable_generate", max_attempts=1, priority=1)
+def timetable_generate_job(ctx, params):
+    days = scheduler.DEFAULT_DAYS + (("Saturday",) if params.get("saturday") else ())
+    write = bool(params.get("apply"))
+    try:
+        report = scheduler.generate(
+            ctx.conn, params.get("academic_year") or None, budget=params.get("budget", 10), workers=0,
+            hours_per_coefficient=params.get("hours_per_coefficient", 1), days=days, write=write)
+    except scheduler.SchedulerError as e:
+        raise jobs.JobError(str(e))
+    if write:
+        invalidate_tables("timetable")
+        room_occupancy.invalidate()
+    return report
+
+def queue_job(kind, params):
+    """Met un job en file depuis un formulaire et renvoie vers la page des jobs."""
+    job_id = jobs.submit(get_db(), kind, params, created_by=session.get("user_name"))
+    flash(f"Job #{job_id} ({kind}) queued - this page updates as it runs", "success")
+    return redirect(url_for("jobs_page"))
+
+def form_params(form):
+    # Champs du formulaire -> paramètres du job ; les nombres entiers sont convertis
+    return {key: int(value) if value.lstrip("-").isdigit() else value
+            for key, value in form.items() if key not in ("kind", "priority") and value != ""}
+
+@app.route("/jobs", methods=["GET", "POST"])
+@login_required
+def jobs_page():
+    conn = get_db()
+    if request.method == "POST":
+        payload = request.get_json(silent=True) if request.is_json else None
+        kind = payload.get("kind") if payload else request.form.get("kind")
+        params = (payload.get("params") or {}) if payload else form_params(request.form)
+        priority = payload.get("priority") if payload else request.form.get("priority", type=int)
+        try:
+            job_id = jobs.submit(conn, kind, params, priority=priority, created_by=session.get("user_name"))
+        except jobs.JobError as e:
+            if payload is not None:
+                return jsonify({"error": str(e)}), 400
+            flash(str(e), "error")
+            return redirect(url_for("jobs_page"))
+        if payload is not None:
+            return jsonify({"id": job_id, "status_url": url_for("api_job", job_id=job_id)}), 202
+        flash(f"Job #{job_id} ({kind}) queued", "success")
+        return redirect(url_for("jobs_page"))
+
+    return render_template("jobs.html",
+                         jobs=jobs.list_jobs(conn, request.args.get("status"), limit=100),
+                         kinds=jobs.kinds(),
+                         exports=sorted(exports.EXPORTS),
+                         classes=reference.get(conn, "classes"),
+                         workers=jobs.get_pool().threads,
+                         page_title="Background Jobs",
+                         page_heading="Background Jobs")
+
+@app.route("/api/jobs")
+@login_required
+def api_jobs():
+    limit = max(1, min(request.args.get("limit", 50, type=int), 500))
+    return jsonify(jobs.list_jobs(get_db(), request.args.get("status"), request.args.get("kind"), limit))
+
+@app.route("/api/jobs/<int:job_id>")
+@login_required
+def api_job(job_id):
+    job = jobs.get(get_db(), job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route("/jobs/<int:job_id>/cancel", methods=["POST"])
+@login_required
+def cancel_job(job_id):
+    cancelled = jobs.cancel(get_db(), job_id)
+    if request.is_json or request.accept_mimetypes.best == "application/json":
+        return jsonify({"cancelled": cancelled})
+    flash(f"Job #{job_id} cancelled" if cancelled else f"Job #{job_id} has already finished",
+          "success" if cancelled else "info")
+    return redirect(url_for("jobs_page"))
+
+@app.route("/jobs/<int:job_id>/download")
+@login_required
+def download_job(job_id):
+    job = jobs.get(get_db(), job_id)
+    if job is None or job["status"] != "succeeded" or not (job["result"] or {}).get("file"):
+        abort(404)
+    directory = os.path.join(app.config["JOB_FILES_DIR"], str(job_id))
+    return send_from_directory(directory, job["result"]["file"], as_attachment=True)
+
+# ===== ARCHIVE =====
+# Années closes déplacées vers ARCHIVE_DIR/<année>.db ; déplacement et restauration en job
+@jobs.handler("archive", max_attempts=1)
+def archive_job(ctx, params):
+    ctx.progress(0, None, f"Archiving {params['year']}")
+    try:
+        moved = archive.archive_year(ctx.conn, params["year"], app.config["ARCHIVE_DIR"])
+    except archive.ArchiveError as e:
+        raise jobs.JobError(str(e))
+    invalidate_tables(*archive.TABLES)
+    return {"year": params["year"], "moved": moved}
+
+@jobs.handler("restore", max_attempts=1)
+def restore_job(ctx, params):
+    ctx.progress(0, None, f"Restoring {params['year']}")
+    try:
+        restored = archive.restore_year(ctx.conn, params["year"], app.config["ARCHIVE_DIR"])
+    except archive.ArchiveError as e:
+        raise jobs.JobError(str(e))
+    invalidate_tables(*archive.TABLES)
+    return {"year": params["year"], "restored": restored}
+
+@app.route("/archive", methods=["GET", "POST"])
+@login_required
+def archive_page():
+    if request.method == "POST":
+        kind, year = request.form.get("kind"), request.form.get("year")
+        if kind not in ("archive", "restore") or not year:
+            abort(400)
+        return queue_job(kind, {"year": year})
+    conn = get_db()
+    # Le rapport chronomètre les requêtes types : calculé à la demande seulement
+    report = archive.report(conn, app.config["ARCHIVE_DIR"], repeat=5) if request.args.get("measure") else None
+    return render_template("archive.html",
+                         hot=archive.hot_years(conn),
+                         archives=archive.archived_years(app.config["ARCHIVE_DIR"]),
+                         report=report,
+                         page_title="Archive",
+                         page_heading="Archive")
+
+
+# ===== JSON API =====
+# Ressources, lots et pagination : voir api.py
+@api.on_write
+def api_written(tables):
+    if tables & {"rooms", "timetable"}:
+        room_occupancy.invalidate()
+
+app.register_blueprint(api.bp)
+
+
 # ===== SIMPLE ACCOUNT ROUTES (optional) =====
 @app.route('/profile')
 @login_required
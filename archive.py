@@ -0,0 +1,344 @@
+"""Archival of closed academic years into per-year SQLite files.
+
+A closed year's enrollments, results and materialized averages are moved to
+ARCHIVE_DIR/<year>.db, so the hot database only holds the open years and every
+list, count and dashboard query reads less. Row ids are kept, so archived rows
+never collide with new ones (AUTOINCREMENT does not reuse ids).
+
+History stays queryable: attach_history() ATTACHes every archive to a
+connection and creates the TEMP views all_enrollments, all_results and
+all_enrollment_averages (hot tables UNION ALL each archive); detach_history()
+undoes it before a pooled connection is handed back.
+
+Moving a year is done in two transactions, a copy committed to the archive and
+then a delete from the hot database: SQLite does not make a transaction atomic
+across attached WAL databases. Both steps are idempotent, so an interrupted run
+is finished by running it again. Restoring re-inserts the rows (the triggers
+rebuild the averages) and removes the archive file.
+
+    python archive.py status
+    python archive.py archive 2022-2023 --vacuum
+    python archive.py restore 2022-2023
+"""
+import argparse
+import os
+import re
+import sqlite3
+import statistics
+import time
+
+from db import write_transaction
+
+# Tables archivées : colonnes copiées telles quelles (les colonnes générées sont recalculées)
+TABLES = {
+    "enrollments": ("id", "student_id", "class_id", "academic_year"),
+    "results": ("id", "enrollment_id", "subject_id", "score", "semester"),
+    "enrollment_averages": ("enrollment_id", "semester", "weighted_sum", "coeff_sum", "result_count"),
+}
+
+ARCHIVE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS {schema}.enrollments (
+        id INTEGER PRIMARY KEY, student_id INTEGER, class_id INTEGER, academic_year TEXT)""",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_enrollments_student ON enrollments(student_id)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_enrollments_class_year ON enrollments(class_id, academic_year)",
+    """CREATE TABLE IF NOT EXISTS {schema}.results (
+        id INTEGER PRIMARY KEY, enrollment_id INTEGER, subject_id INTEGER, score REAL, semester INTEGER)""",
+    """CREATE UNIQUE INDEX IF NOT EXISTS {schema}.idx_results_enrollment_subject_semester
+        ON results(enrollment_id, subject_id, semester)""",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_results_subject ON results(subject_id)",
+    """CREATE TABLE IF NOT EXISTS {schema}.enrollment_averages (
+        enrollment_id INTEGER NOT NULL, semester INTEGER NOT NULL,
+        weighted_sum REAL NOT NULL DEFAULT 0, coeff_sum REAL NOT NULL DEFAULT 0,
+        result_count INTEGER NOT NULL DEFAULT 0,
+        average REAL GENERATED ALWAYS AS (weighted_sum / NULLIF(coeff_sum, 0)) VIRTUAL,
+        PRIMARY KEY (enrollment_id, semester)) WITHOUT ROWID""",
+]
+
+# Lignes d'une année, dans une base donnée ({schema}) : les résultats et moyennes suivent l'inscription
+YEAR_ROWS = {
+    "enrollments": "SELECT {columns} FROM {schema}.enrollments WHERE academic_year = ?",
+    "results": """SELECT {columns} FROM {schema}.results WHERE enrollment_id IN
+                  (SELECT id FROM {schema}.enrollments WHERE academic_year = ?)""",
+    "enrollment_averages": """SELECT {columns} FROM {schema}.enrollment_averages WHERE enrollment_id IN
+                              (SELECT id FROM {schema}.enrollments WHERE academic_year = ?)""",
+}
+
+# Moyennes d'abord : le trigger de suppression des résultats n'a alors plus rien à recalculer
+DELETE_SQL = [
+    "DELETE FROM main.enrollment_averages WHERE enrollment_id IN "
+    "(SELECT id FROM main.enrollments WHERE academic_year = ?)",
+    "DELETE FROM main.results WHERE enrollment_id IN (SELECT id FROM main.enrollments WHERE academic_year = ?)",
+    "DELETE FROM main.enrollments WHERE academic_year = ?",
+]
+
+WORK_SCHEMA = "archive_work"
+HISTORY_VIEWS = {name: f"all_{name}" for name in TABLES}
+# Colonnes générées exposées par les vues en plus des colonnes copiées
+GENERATED = {"enrollment_averages": ("average",)}
+
+# Requêtes représentatives des pages (liste, filtres, tableau de bord) pour le rapport de latence
+LATENCY_QUERIES = {
+    "count enrollments": "SELECT COUNT(*) FROM enrollments",
+    "dashboard recent": """
+        SELECT e.id, s.name, c.name, e.academic_year FROM enrollments e
+        JOIN students s ON e.student_id = s.id JOIN classes c ON e.class_id = c.id
+        ORDER BY e.id DESC LIMIT 5""",
+    "enrollments page": """
+        SELECT e.id, s.name, c.name, e.academic_year FROM enrollments e
+        JOIN students s ON e.student_id = s.id JOIN classes c ON e.class_id = c.id
+        ORDER BY e.id LIMIT 51""",
+    "results search": """
+        SELECT r.id, s.name, sub.name, r.score FROM results r
+        JOIN enrollments e ON r.enrollment_id = e.id JOIN students s ON e.student_id = s.id
+        JOIN subjects sub ON r.subject_id = sub.id
+        WHERE s.name LIKE '%9%' ORDER BY r.id LIMIT 51""",
+    "count results": "SELECT COUNT(*) FROM results",
+}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def check_year(year):
+    if not year or not re.fullmatch(r"[\w-]+", year):
+        raise ArchiveError(f"Invalid academic year '{year}'")
+    return year
+
+
+def archive_path(archive_dir, year):
+    return os.path.join(archive_dir, f"{check_year(year)}.db")
+
+
+def schema_name(year):
+    return "archive_" + re.sub(r"\W", "_", year)
+
+
+def archived_years(archive_dir):
+    """Années archivées, de la plus récente à la plus ancienne (une par fichier <année>.db)."""
+    if not os.path.isdir(archive_dir):
+        return []
+    return sorted((name[:-3] for name in os.listdir(archive_dir)
+                   if name.endswith(".db") and re.fullmatch(r"[\w-]+", name[:-3])), reverse=True)
+
+
+def hot_years(conn):
+    return [tuple(row) for row in conn.execute("""
+        SELECT academic_year, COUNT(*) FROM enrollments
+        WHERE academic_year IS NOT NULL GROUP BY academic_year ORDER BY academic_year DESC
+    """)]
+
+
+def _attach(conn, path, schema):
+    # Jamais de commit implicite : la transaction ouverte appartient à l'appelant
+    if conn.in_transaction:
+        raise ArchiveError(f"Cannot attach {schema} inside an open transaction")
+    conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+
+
+def _detach(conn, schema):
+    if conn.in_transaction:
+        raise ArchiveError(f"Cannot detach {schema} inside an open transaction")
+    conn.execute("DETACH DATABASE " + schema)
+
+
+def _count(conn, schema, year):
+    return {name: conn.execute(f"SELECT COUNT(*) FROM ({sql.format(columns='1', schema=schema)})",
+                               (year,)).fetchone()[0]
+            for name, sql in YEAR_ROWS.items()}
+
+
+def _copy(conn, source, target, year):
+    for name, columns in TABLES.items():
+        conn.execute(f"INSERT OR REPLACE INTO {target}.{name} ({', '.join(columns)}) "
+                     + YEAR_ROWS[name].format(columns=", ".join(columns), schema=source), (year,))
+
+
+def archive_year(conn, year, archive_dir):
+    """Déplace une année close vers archive_dir/<year>.db ; retourne les lignes déplacées par table."""
+    path = archive_path(archive_dir, year)
+    years = [y for y, _ in hot_years(conn)]
+    if year not in years:
+        raise ArchiveError(f"No enrollments for {year} in the database")
+    if year == years[0]:
+        raise ArchiveError(f"{year} is the current academic year and cannot be archived")
+    os.makedirs(archive_dir, exist_ok=True)
+    _attach(conn, path, WORK_SCHEMA)
+    try:
+        for statement in ARCHIVE_SCHEMA:
+            conn.execute(statement.format(schema=WORK_SCHEMA))
+        conn.commit()
+        write_transaction(conn, lambda c: _copy(c, "main", WORK_SCHEMA, year))
+        moved = _count(conn, "main", year)
+        copied = _count(conn, WORK_SCHEMA, year)
+        if any(copied[name] < count for name, count in moved.items()):
+            raise ArchiveError(f"Archive copy incomplete for {year}: {copied} < {moved}")
+
+        def delete(c):
+            for sql in DELETE_SQL:
+                c.execute(sql, (year,))
+
+        write_transaction(conn, delete)
+        return moved
+    finally:
+        _detach(conn, WORK_SCHEMA)
+
+
+def restore_year(conn, year, archive_dir):
+    """Réintègre une année archivée dans la base principale et supprime le fichier d'archive."""
+    path = archive_path(archive_dir, year)
+    if not os.path.exists(path):
+        raise ArchiveError(f"No archive for {year}")
+    _attach(conn, path, WORK_SCHEMA)
+    try:
+        restored = _count(conn, WORK_SCHEMA, year)
+
+        def copy_back(c):
+            # Les moyennes ne sont pas recopiées : les triggers d'insertion des résultats les recalculent
+            for name in ("enrollments", "results"):
+                columns = ", ".join(TABLES[name])
+                c.execute(f"INSERT OR IGNORE INTO main.{name} ({columns}) "
+                          + YEAR_ROWS[name].format(columns=columns, schema=WORK_SCHEMA), (year,))
+
+        write_transaction(conn, copy_back)
+    finally:
+        _detach(conn, WORK_SCHEMA)
+    os.remove(path)
+    return restored
+
+
+def attach_history(conn, archive_dir):
+    """Attache toutes les archives et (re)crée les vues TEMP all_* ; retourne les années attachées.
+
+    Sans effet si rien n'a changé depuis l'appel précédent sur cette connexion. À défaire
+    avec detach_history avant de rendre la connexion à un pool.
+    """
+    wanted = {schema_name(year): archive_path(archive_dir, year) for year in archived_years(archive_dir)}
+    attached = {row[1] for row in conn.execute("PRAGMA database_list") if row[1].startswith("archive_")}
+    attached.discard(WORK_SCHEMA)
+    views = {row[0] for row in conn.execute("SELECT name FROM sqlite_temp_master WHERE type = 'view'")}
+    if attached == wanted.keys() and views >= set(HISTORY_VIEWS.values()):
+        return sorted(wanted)
+    for schema in attached - wanted.keys():
+        _detach(conn, schema)
+    try:
+        for schema in sorted(wanted.keys() - attached):
+            _attach(conn, wanted[schema], schema)
+    except sqlite3.OperationalError as e:
+        raise ArchiveError(f"Cannot attach the archives ({e}): restore or merge old years") from e
+    for name, view in HISTORY_VIEWS.items():
+        columns = ", ".join(TABLES[name] + GENERATED.get(name, ()))
+        parts = [f"SELECT {columns} FROM main.{name}"] + [f"SELECT {columns} FROM {schema}.{name}"
+                                                         for schema in sorted(wanted)]
+        conn.execute(f"DROP VIEW IF EXISTS temp.{view}")
+        conn.execute(f"CREATE TEMP VIEW {view} AS " + " UNION ALL ".join(parts))
+    return sorted(wanted)
+
+
+def detach_history(conn):
+    """Défait attach_history : une connexion rendue au pool ne doit garder aucune archive,
+    sinon chacune de ses transactions d'écriture verrouillerait aussi les fichiers d'archive."""
+    for view in HISTORY_VIEWS.values():
+        conn.execute(f"DROP VIEW IF EXISTS temp.{view}")
+    for row in conn.execute("PRAGMA database_list").fetchall():
+        if row[1].startswith("archive_") and row[1] != WORK_SCHEMA:
+            _detach(conn, row[1])
+
+
+# --- Rapports ---
+def database_size(conn, schema="main"):
+    page_size = conn.execute(f"PRAGMA {schema}.page_size").fetchone()[0]
+    pages = conn.execute(f"PRAGMA {schema}.page_count").fetchone()[0]
+    free = conn.execute(f"PRAGMA {schema}.freelist_count").fetchone()[0]
+    return {"bytes": page_size * pages, "free_bytes": page_size * free}
+
+
+def latency(conn, repeat=20):
+    """Médiane (en secondes) de chaque requête de LATENCY_QUERIES sur la base principale."""
+    timings = {}
+    for name, sql in LATENCY_QUERIES.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql).fetchall()
+            samples.append(time.perf_counter() - start)
+        timings[name] = statistics.median(samples)
+    return timings
+
+
+def report(conn, archive_dir, repeat=20):
+    archives = []
+    for year in archived_years(archive_dir):
+        path = archive_path(archive_dir, year)
+        archive = sqlite3.connect(path)
+        try:
+            rows = {name: archive.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0] for name in TABLES}
+        finally:
+            archive.close()
+        archives.append({"year": year, "bytes": os.path.getsize(path), "rows": rows})
+    return {
+        "hot": {
+            **database_size(conn),
+            "years": [{"year": year, "enrollments": count} for year, count in hot_years(conn)],
+            "rows": {name: conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0] for name in TABLES},
+        },
+        "archives": archives,
+        "latency": latency(conn, repeat),
+    }
+
+
+def print_report(data):
+    hot = data["hot"]
+    rows = ", ".join(f"{name} {count}" for name, count in hot["rows"].items())
+    print(f"hot database: {hot['bytes'] / 1e6:.1f} MB ({hot['free_bytes'] / 1e6:.1f} MB free)  {rows}")
+    for year in hot["years"]:
+        print(f"  {year['year']}: {year['enrollments']} enrollments")
+    for archive in data["archives"]:
+        rows = ", ".join(f"{name} {count}" for name, count in archive["rows"].items())
+        print(f"archive {archive['year']}: {archive['bytes'] / 1e6:.1f} MB  {rows}")
+    print("latency: " + "  ".join(f"{name} {value * 1000:.2f} ms" for name, value in data["latency"].items()))
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Archive closed academic years")
+    parser.add_argument("command", choices=["status", "archive", "restore"])
+    parser.add_argument("year", nargs="?")
+    parser.add_argument("--db", default=os.environ.get("DB_PATH", os.path.join(base_dir, "database.db")))
+    parser.add_argument("--dir", default=os.environ.get("ARCHIVE_DIR", os.path.join(base_dir, "archive")))
+    parser.add_argument("--vacuum", action="store_true", help="reclaim the freed space (rewrites the database)")
+    args = parser.parse_args(argv)
+    if args.command != "status" and not args.year:
+        parser.error(f"{args.command} needs an academic year")
+
+    conn = sqlite3.connect(args.db)
+    try:
+        before = report(conn, args.dir)
+        print_report(before)
+        if args.command == "status":
+            return 0
+        start = time.perf_counter()
+        if args.command == "archive":
+            rows = archive_year(conn, args.year, args.dir)
+        else:
+            rows = restore_year(conn, args.year, args.dir)
+        print(f"\n{args.command}d {args.year} in {time.perf_counter() - start:.2f}s: "
+              + ", ".join(f"{name} {count}" for name, count in rows.items()))
+        if args.vacuum:
+            conn.execute("VACUUM")
+        print()
+        after = report(conn, args.dir)
+        print_report(after)
+        print(f"\nhot database {before['hot']['bytes'] / 1e6:.1f} -> {after['hot']['bytes'] / 1e6:.1f} MB")
+        for name, value in after["latency"].items():
+            print(f"  {name:20s} {before['latency'][name] * 1000:8.2f} -> {value * 1000:8.2f} ms")
+        return 0
+    except ArchiveError as e:
+        print(e)
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
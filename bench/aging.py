@@ -0,0 +1,73 @@
+"""Benchmark the arrears aging report on a large fee ledger.
+
+    python bench/aging.py --records 500000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aging
+from migrations import migrate
+
+MODES = ["Cash", "Bank Transfer", "Check", "Mobile Money"]
+
+
+def seed(conn, records, rng):
+    # ~2 facturations et ~1,5 paiement par compte (élève, classe)
+    accounts = records // 4
+    with conn:
+        conn.executemany("INSERT INTO classes (name, level) VALUES (?, ?)",
+                         ((f"C{i}", str(6 + i % 7)) for i in range(60)))
+        conn.executemany("INSERT INTO students (name, matricule) VALUES (?, ?)",
+                         ((f"S{i}", f"MAT{i:07d}") for i in range(accounts)))
+        rows = []
+        for student in range(1, accounts + 1):
+            class_id = student % 60 + 1
+            for _ in range(2):
+                rows.append((student, class_id, "charge", rng.choice((100.0, 250.0, 400.0)), None,
+                             f"-{rng.randrange(0, 200)} days"))
+            for _ in range(rng.choice((0, 1, 2, 3))):
+                rows.append((student, class_id, "payment", rng.choice((50.0, 100.0, 250.0)),
+                             rng.choice(MODES), f"-{rng.randrange(0, 30)} days"))
+        conn.executemany("""
+            INSERT INTO fee_transactions (student_id, class_id, kind, amount, payment_mode, created_at)
+            VALUES (?, ?, ?, ?, ?, datetime('now', ?))
+        """, rows)
+    return len(rows)
+
+
+def run(args):
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        migrate(path)
+        conn = sqlite3.connect(path)
+        started = time.perf_counter()
+        total = seed(conn, args.records, rng)
+        print(f"seed {total} ledger records: {time.perf_counter() - started:.2f}s")
+
+        engines = ["python"] + (["numpy"] if aging.np is not None else [])
+        reports = {}
+        for engine in engines:
+            aging.compute(conn, engine=engine)  # cache de pages chaud
+            report = reports[engine] = aging.compute(conn, engine=engine)
+            print(f"{engine:7s} {report['charges']} charges, load {report['load_seconds']:.3f}s, "
+                  f"total {report['elapsed']:.3f}s, arrears {report['totals']['total']:.2f}")
+        if len(reports) == 2:
+            assert reports["python"]["totals"] == reports["numpy"]["totals"], "engines disagree"
+        started = time.perf_counter()
+        aging.data_version(conn)
+        print(f"data_version: {(time.perf_counter() - started) * 1e6:.0f} us")
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=500000)
+    run(parser.parse_args())
@@ -0,0 +1,65 @@
+"""Benchmark the JSON API: batched writes against one form post per row, and list payload sizes.
+
+    python bench/api.py --rows 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import migrate
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        migrate(path)
+        os.environ["DB_PATH"] = path
+        os.environ.setdefault("JOB_WORKERS", "0")
+        import api
+        from app import app
+
+        client = app.test_client()
+        client.post("/login", data={"username": "admin", "password": "password123"})
+        rows = args.rows
+
+        def forms():
+            for i in range(rows):
+                client.post("/students/add", data={"name": f"Form {i}", "matricule": f"F{i:06d}"})
+
+        def batch():
+            response = client.post("/api/v1/students", json=[{"name": f"Api {i}", "matricule": f"A{i:06d}"}
+                                                             for i in range(rows)])
+            assert response.status_code == 201, response.json
+
+        print(f"{'create ' + str(rows) + ' students':28s} {'requests':>9s} {'seconds':>9s}")
+        print(f"{'  form posts':28s} {rows:9d} {timed(forms):9.3f}")
+        print(f"{'  one API batch':28s} {1:9d} {timed(batch):9.3f}")
+
+        print(f"\n{'list ' + str(args.page) + ' students':28s} {'bytes':>9s} {'ms':>9s}")
+        for label, url in [
+            ("  HTML /students", f"/students?limit={args.page}"),
+            ("  API, all fields", f"/api/v1/students?limit={args.page}"),
+            ("  API, fields=id,name", f"/api/v1/students?limit={args.page}&fields=id,name"),
+        ]:
+            size = len(client.get(url).data)
+            elapsed = timed(lambda: [client.get(url) for _ in range(args.repeat)]) / args.repeat
+            print(f"{label:28s} {size:9d} {elapsed * 1000:9.2f}")
+        print(f"(serializer: {'orjson' if api.orjson else 'json'})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--page", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=50)
+    run(parser.parse_args())
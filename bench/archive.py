@@ -0,0 +1,83 @@
+"""Benchmark archival: hot database size and page query latency before and after archiving closed years.
+
+    python bench/archive.py --years 6 --students 2000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import migrate
+import archive
+
+
+def seed(path, years, students, classes, subjects):
+    migrate(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany("INSERT INTO classes (name, level) VALUES (?, ?)",
+                         ((f"C{i}", str(6 + i % 7)) for i in range(classes)))
+        conn.executemany("INSERT INTO subjects (name, coefficient, class_id) VALUES (?, ?, ?)",
+                         ((f"Subject {s}", 1 + s % 4, c + 1) for c in range(classes) for s in range(subjects)))
+        conn.executemany("INSERT INTO students (name, matricule) VALUES (?, ?)",
+                         ((f"Student {i:06d}", f"M{i:06d}") for i in range(students)))
+        for y in range(years):
+            year = f"{2020 + y}-{2021 + y}"
+            conn.executemany("INSERT INTO enrollments (student_id, class_id, academic_year) VALUES (?, ?, ?)",
+                             ((i + 1, (i + y) % classes + 1, year) for i in range(students)))
+        # Une note par matière et par semestre pour chaque inscription
+        conn.execute("""
+            INSERT INTO results (enrollment_id, subject_id, score, semester)
+            SELECT e.id, sub.id, ABS(RANDOM() % 21), sem.value
+            FROM enrollments e
+            JOIN subjects sub ON sub.class_id = e.class_id
+            JOIN (SELECT 1 AS value UNION ALL SELECT 2) sem
+        """)
+    conn.close()
+    return [f"{2020 + y}-{2021 + y}" for y in range(years)]
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        archive_dir = os.path.join(tmp, "archive")
+        start = time.perf_counter()
+        years = seed(path, args.years, args.students, args.classes, args.subjects)
+        print(f"seeded {len(years)} years in {time.perf_counter() - start:.1f} s")
+
+        conn = sqlite3.connect(path)
+        before = archive.report(conn, archive_dir, args.repeat)
+        start = time.perf_counter()
+        for year in years[:-1]:
+            archive.archive_year(conn, year, archive_dir)
+        elapsed = time.perf_counter() - start
+        conn.execute("VACUUM")
+        after = archive.report(conn, archive_dir, args.repeat)
+
+        # Historique : une lecture sur les vues all_* couvre toutes les années
+        archive.attach_history(conn, archive_dir)
+        start = time.perf_counter()
+        total = conn.execute("SELECT COUNT(*) FROM all_results").fetchone()[0]
+        history = time.perf_counter() - start
+        conn.close()
+
+        print(f"archived {len(years) - 1} years in {elapsed:.2f} s")
+        print(f"hot database {before['hot']['bytes'] / 1e6:.1f} -> {after['hot']['bytes'] / 1e6:.1f} MB, "
+              f"results {before['hot']['rows']['results']} -> {after['hot']['rows']['results']}")
+        for name, value in before["latency"].items():
+            print(f"  {name:22s} {value * 1000:8.2f} -> {after['latency'][name] * 1000:8.2f} ms")
+        print(f"all_results count over {len(years)} years: {total} rows in {history * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, default=6)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--classes", type=int, default=40)
+    parser.add_argument("--subjects", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=20)
+    run(parser.parse_args())
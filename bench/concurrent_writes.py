@@ -0,0 +1,106 @@
+"""Load test: read throughput of dashboard-style queries during concurrent fee writes.
+
+    python bench/concurrent_writes.py --journal-mode DELETE
+    python bench/concurrent_writes.py --journal-mode WAL
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import SQLITE_SETTINGS, ConnectionPool, configure_database, is_lock_error, write_transaction
+
+
+def create_schema(path, students):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE students (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL,
+                               matricule TEXT UNIQUE NOT NULL);
+        CREATE TABLE fees (id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER NOT NULL,
+                           class_id INTEGER NOT NULL, total_fee REAL NOT NULL,
+                           amount_paid REAL DEFAULT 0, payment_mode TEXT,
+                           status TEXT DEFAULT 'Unpaid');
+    """)
+    conn.executemany("INSERT INTO students (name, matricule) VALUES (?, ?)",
+                     ((f"Student {i}", f"M{i:06d}") for i in range(students)))
+    conn.commit()
+    conn.close()
+
+
+def run(args):
+    settings = dict(SQLITE_SETTINGS["production"])
+    settings["journal_mode"] = args.journal_mode
+    settings["busy_timeout"] = args.busy_timeout
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        create_schema(path, args.students)
+        mode = configure_database(path, settings)
+        pool = ConnectionPool(path, size=args.readers + args.writers, settings=settings)
+
+        stop = threading.Event()
+        counters = {"reads": 0, "read_errors": 0, "writes": 0, "write_errors": 0}
+        lock = threading.Lock()
+
+        def reader():
+            conn = pool.acquire()
+            while not stop.is_set():
+                try:
+                    conn.execute("SELECT COUNT(*) FROM students").fetchone()
+                    conn.execute("SELECT COUNT(*) FROM fees WHERE (total_fee - amount_paid) > 0").fetchone()
+                    key = "reads"
+                except sqlite3.OperationalError as e:
+                    if not is_lock_error(e):
+                        raise
+                    key = "read_errors"
+                with lock:
+                    counters[key] += 1
+            pool.release(conn)
+
+        def writer(n):
+            conn = pool.acquire()
+            i = 0
+            while not stop.is_set():
+                i += 1
+                try:
+                    write_transaction(conn, lambda c: c.execute(
+                        "INSERT INTO fees (student_id, class_id, total_fee, amount_paid) VALUES (?, 1, 500, ?)",
+                        (i % args.students + 1, (i * n) % 500)))
+                    key = "writes"
+                except sqlite3.OperationalError as e:
+                    if not is_lock_error(e):
+                        raise
+                    key = "write_errors"
+                with lock:
+                    counters[key] += 1
+            pool.release(conn)
+
+        threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+        threads += [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+        for t in threads:
+            t.start()
+        time.sleep(args.duration)
+        stop.set()
+        for t in threads:
+            t.join()
+
+    print(f"journal_mode={mode} readers={args.readers} writers={args.writers} duration={args.duration}s")
+    print(f"  reads/s   {counters['reads'] / args.duration:10.1f}   lock errors {counters['read_errors']}")
+    print(f"  writes/s  {counters['writes'] / args.duration:10.1f}   lock errors {counters['write_errors']}")
+    print(f"  pool wait max {pool.snapshot()['wait_time_max'] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--journal-mode", default="WAL")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--busy-timeout", type=int, default=50)
+    run(parser.parse_args())
@@ -0,0 +1,96 @@
+"""Benchmark timetable conflict detection on large schools.
+
+    python bench/conflicts.py --slots 5000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import conflicts
+from migrations import migrate
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+
+# Ancienne requête de find() : tous les créneaux du jour via idx_timetable_day_start
+DAY_SQL = conflicts.SLOTS_SQL + " WHERE day = ? AND (teacher_id = ? OR room_id = ? OR class_id = ?)"
+
+
+def timed(samples, work):
+    t0 = time.perf_counter()
+    result = work()
+    samples.append((time.perf_counter() - t0) * 1e6)
+    return result
+
+
+def random_slot(rng, classes, teachers, rooms):
+    start = rng.randrange(7 * 60, 17 * 60, 30)
+    end = start + rng.choice((60, 90, 120))
+    return {
+        "class_id": rng.randrange(1, classes + 1),
+        "teacher_id": rng.randrange(1, teachers + 1),
+        "room_id": rng.randrange(1, rooms + 1),
+        "day": rng.choice(DAYS),
+        "start_time": conflicts.format_minutes(start),
+        "end_time": conflicts.format_minutes(end),
+    }
+
+
+def run(args):
+    rng = random.Random(42)
+    classes, teachers, rooms = args.slots // 30, args.slots // 20, args.slots // 30
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        migrate(path)
+        conn = sqlite3.connect(path)
+
+        # Remplissage comme le fait add_timetable : conflicts.find() en base, créneau rejeté en cas de conflit
+        samples, placed, attempts = [], 0, 0
+        started = time.perf_counter()
+        with conn:
+            while placed < args.slots and attempts < args.slots * 20:
+                attempts += 1
+                slot = random_slot(rng, classes, teachers, rooms)
+                if timed(samples, lambda: conflicts.find(conn, slot)):
+                    continue
+                conn.execute("""
+                    INSERT INTO timetable (class_id, subject_id, teacher_id, room_id, day, start_time, end_time)
+                    VALUES (:class_id, 1, :teacher_id, :room_id, :day, :start_time, :end_time)
+                """, slot)
+                placed += 1
+        print(f"{placed} slots placed out of {attempts} attempts "
+              f"({classes} classes, {teachers} teachers, {rooms} rooms): {time.perf_counter() - started:.2f}s")
+        print(f"find() while filling  median {statistics.median(samples):7.1f} us  max {max(samples):8.1f} us")
+
+        # Timetable plein : find() (index par ressource), l'index en mémoire et la requête par jour
+        schedule = conflicts.load(conn)
+        find_samples, memory_samples, day_samples = [], [], []
+        for _ in range(1000):
+            slot = random_slot(rng, classes, teachers, rooms)
+            timed(find_samples, lambda: conflicts.find(conn, slot))
+            timed(memory_samples, lambda: schedule.conflicts(slot))
+            timed(day_samples, lambda: conn.execute(DAY_SQL, (slot["day"], slot["teacher_id"], slot["room_id"],
+                                                              slot["class_id"])).fetchall())
+        for name, values in (("find()", find_samples), ("in-memory index", memory_samples),
+                             ("day-only SQL", day_samples)):
+            print(f"{name:21s} median {statistics.median(values):7.1f} us  max {max(values):8.1f} us")
+
+        started = time.perf_counter()
+        schedule = conflicts.load(conn)
+        print(f"load index:      {(time.perf_counter() - started) * 1000:7.1f} ms")
+        started = time.perf_counter()
+        found = conflicts.validate(conn)
+        print(f"bulk validation: {(time.perf_counter() - started) * 1000:7.1f} ms  ({len(found)} conflicts)")
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--slots", type=int, default=5000)
+    run(parser.parse_args())
@@ -0,0 +1,67 @@
+"""Benchmark the streaming export: throughput and memory on a large results table.
+
+    python bench/export.py --results 1000000
+"""
+import argparse
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import exports
+from migrations import migrate
+from werkzeug.datastructures import MultiDict
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        migrate(path)
+        conn = sqlite3.connect(path)
+
+        subjects = 4
+        enrollments = args.results // (subjects * 2)
+        started = time.perf_counter()
+        with conn:
+            conn.execute("INSERT INTO classes (name, level) VALUES ('6A', '6')")
+            conn.executemany("INSERT INTO subjects (name, coefficient, class_id) VALUES (?, 2, 1)",
+                             ((f"Subject {i}",) for i in range(subjects)))
+            conn.executemany("INSERT INTO students (name, matricule) VALUES (?, ?)",
+                             ((f"Student {i}", f"MAT{i:07d}") for i in range(enrollments)))
+            conn.execute("""
+                INSERT INTO enrollments (student_id, class_id, academic_year)
+                SELECT id, 1, '2024-2025' FROM students
+            """)
+            conn.execute("""
+                INSERT INTO results (enrollment_id, subject_id, score, semester)
+                SELECT e.id, sub.id, (e.id * 7 + sub.id) % 21, sem.value
+                FROM enrollments e, subjects sub, (SELECT 1 AS value UNION ALL SELECT 2) sem
+            """)
+        total = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        print(f"seed {total} results: {time.perf_counter() - started:.2f}s")
+
+        for fmt, compress in [("csv", False), ("jsonl", False), ("csv", True)]:
+            before = max_rss_mb()
+            started = time.perf_counter()
+            size = 0
+            for chunk in exports.iter_export(conn, "results", MultiDict(), fmt, compress):
+                size += len(chunk)
+            elapsed = time.perf_counter() - started
+            label = fmt + (".gz" if compress else "")
+            print(f"{label:8s} {total / elapsed:10.0f} rows/s  {size / 1e6:8.1f} MB  "
+                  f"max RSS {before:.0f} -> {max_rss_mb():.0f} MB")
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, default=1000000)
+    run(parser.parse_args())
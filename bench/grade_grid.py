@@ -0,0 +1,74 @@
+"""Benchmark grade entry: one add_result post per score against one grid post for the class.
+
+    python bench/grade_grid.py --students 40
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import migrate
+
+YEAR = "2024-2025"
+
+
+def seed(path, classes, students):
+    migrate(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany("INSERT INTO classes (name, level) VALUES (?, ?)",
+                         ((f"C{i}", str(6 + i % 7)) for i in range(classes)))
+        conn.executemany("INSERT INTO subjects (name, coefficient, class_id) VALUES (?, ?, ?)",
+                         ((f"Subject {s}", 1 + s % 4, c + 1) for c in range(classes) for s in range(2)))
+        conn.executemany("INSERT INTO students (name, matricule) VALUES (?, ?)",
+                         ((f"Student {i:05d}", f"M{i:05d}") for i in range(classes * students)))
+        conn.executemany("INSERT INTO enrollments (student_id, class_id, academic_year) VALUES (?, ?, ?)",
+                         ((i + 1, i // students + 1, YEAR) for i in range(classes * students)))
+    conn.close()
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.classes, args.students)
+        os.environ["DB_PATH"] = path
+        os.environ.setdefault("JOB_WORKERS", "0")
+        from app import app
+
+        client = app.test_client()
+        client.post("/login", data={"username": "admin", "password": "password123"})
+        conn = sqlite3.connect(path)
+        enrollments = [row[0] for row in conn.execute("SELECT id FROM enrollments WHERE class_id = 1")]
+
+        # Saisie une par une : le post puis la redirection vers le formulaire, comme dans le navigateur
+        start = time.perf_counter()
+        for i, enrollment_id in enumerate(enrollments):
+            client.post("/results/add", data={"enrollment_id": enrollment_id, "subject_id": 1,
+                                              "score": 8 + i % 12, "semester": 1})
+            client.get("/results/add")
+        forms = time.perf_counter() - start
+
+        start = time.perf_counter()
+        client.get("/results/grid?class_id=1&subject_id=2&semester=1")
+        data = {"class_id": 1, "subject_id": 2, "semester": 1, "academic_year": YEAR}
+        data.update({f"score_{enrollment_id}": 8 + i % 12 for i, enrollment_id in enumerate(enrollments)})
+        response = client.post("/results/grid", data=data)
+        assert response.status_code == 302, response.status_code
+        grid = time.perf_counter() - start
+
+        counts = conn.execute("SELECT subject_id, COUNT(*) FROM results GROUP BY subject_id").fetchall()
+        assert counts == [(1, len(enrollments)), (2, len(enrollments))], counts
+        print(f"{len(enrollments)} scores, {args.classes * args.students} enrollments in the database")
+        print(f"{'add_result posts':20s} {2 * len(enrollments):5d} requests {forms * 1000:9.1f} ms")
+        print(f"{'grid':20s} {2:5d} requests {grid * 1000:9.1f} ms  x{forms / grid:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--classes", type=int, default=50)
+    parser.add_argument("--students", type=int, default=40)
+    run(parser.parse_args())
@@ -0,0 +1,113 @@
+"""Benchmark class statistics on a large results table.
+
+    python bench/grade_stats.py --results 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from itertools import groupby
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import grade_stats
+from cache import TTLCache
+from migrations import migrate
+
+SUBJECTS_PER_CLASS = 10
+YEAR = "2024-2025"
+
+
+def seed(conn, results, rng):
+    # results = élèves x matières x 2 semestres
+    students = results // (SUBJECTS_PER_CLASS * 2)
+    classes = max(1, students // 40)
+    with conn:
+        conn.executemany("INSERT INTO classes (name, level) VALUES (?, ?)",
+                         ((f"C{i}", str(6 + i % 7)) for i in range(classes)))
+        conn.executemany("INSERT INTO subjects (name, coefficient, class_id) VALUES (?, ?, ?)",
+                         ((f"Subject {s}", 1 + s % 4, c + 1)
+                          for c in range(classes) for s in range(SUBJECTS_PER_CLASS)))
+        conn.executemany("INSERT INTO students (name, matricule) VALUES (?, ?)",
+                         ((f"S{i}", f"MAT{i:07d}") for i in range(students)))
+        conn.execute("""
+            INSERT INTO enrollments (student_id, class_id, academic_year)
+            SELECT id, (id - 1) % ? + 1, ? FROM students
+        """, (classes, YEAR))
+        rows = ((enrollment_id, (class_id - 1) * SUBJECTS_PER_CLASS + s + 1,
+                 round(min(20, max(0, rng.gauss(11, 3.5))) * 2) / 2, semester)
+                for enrollment_id, class_id in conn.execute("SELECT id, class_id FROM enrollments").fetchall()
+                for s in range(SUBJECTS_PER_CLASS) for semester in (1, 2))
+        conn.executemany("INSERT INTO results (enrollment_id, subject_id, score, semester) VALUES (?, ?, ?, ?)",
+                         rows)
+    return classes
+
+
+def python_baseline(conn):
+    """Même distribution par matière : tri SQL puis statistics, groupe par groupe."""
+    rows = conn.execute("""
+        SELECT e.class_id, e.academic_year, r.semester, r.subject_id, r.score
+        FROM results r JOIN enrollments e ON r.enrollment_id = e.id
+        ORDER BY 1, 2, 3, 4
+    """)
+    report = {}
+    for key, group in groupby(rows, key=lambda r: r[:4]):
+        scores = sorted(r[4] for r in group)
+        report[key] = (statistics.fmean(scores), statistics.pstdev(scores),
+                       statistics.quantiles(scores, n=4, method="inclusive"))
+    return report
+
+
+def timed(label, fn):
+    started = time.perf_counter()
+    value = fn()
+    print(f"{label:42s} {time.perf_counter() - started:8.3f}s")
+    return value
+
+
+def run(args):
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, "bench.db")
+        fresh = not os.path.exists(path)
+        migrate(path)
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        if fresh:
+            started = time.perf_counter()
+            classes = seed(conn, args.results, rng)
+            print(f"seed {args.results} results, {classes} classes: {time.perf_counter() - started:.1f}s")
+        count = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        print(f"{count} results")
+
+        engines = ["python"] + (["numpy"] if grade_stats.np is not None else [])
+        for engine in engines:
+            report = timed(f"compute, whole school ({engine})", lambda: grade_stats.compute(conn, engine=engine))
+        timed("compute, whole school, semester 1", lambda: grade_stats.compute(conn, semester=1))
+        timed("rankings (window functions), whole school", lambda: grade_stats.student_rankings(conn))
+        timed("compute, one class", lambda: grade_stats.compute(conn, class_id=1))
+        timed("rankings on one subject, whole school", lambda: grade_stats.student_rankings(conn, subject_id=1))
+        baseline = timed("subject distributions, Python sort", lambda: python_baseline(conn))
+
+        # Les deux méthodes doivent donner les mêmes quartiles
+        for s in report["subjects"]:
+            mean, stdev, quartiles = baseline[(s["class_id"], s["academic_year"], s["semester"], s["subject_id"])]
+            assert abs(s["mean"] - round(mean, 2)) < 0.011 and abs(s["stdev"] - round(stdev, 2)) < 0.011
+            assert all(abs(s["quantiles"][p] - q) < 0.006 for p, q in zip(("p25", "p50", "p75"), quartiles))
+        print(f"{len(report['subjects'])} subject groups, {len(report['rankings'])} ranked students: quartiles match")
+
+        cache = TTLCache("bench", ttl=300)
+        cache.get_or_set(None, lambda: grade_stats.compute(conn))
+        timed("cache hit", lambda: cache.get_or_set(None, lambda: grade_stats.compute(conn)))
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, default=1000000)
+    parser.add_argument("--db", help="reuse (or create) this database instead of a temporary one")
+    run(parser.parse_args())
@@ -0,0 +1,85 @@
+"""Benchmark free-room queries: occupancy bitmaps vs an SQL anti-join.
+
+    python bench/occupancy.py --rooms 200 --slots 8000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import occupancy
+from migrations import migrate
+
+FREE_ROOMS_SQL = """
+    SELECT r.id, r.name, r.capacity, r.location FROM rooms r
+    WHERE r.capacity >= ?
+      AND NOT EXISTS (
+          SELECT 1 FROM timetable t
+          WHERE t.room_id = r.id AND t.day = ? AND t.start_time < ? AND t.end_time > ?
+      )
+    ORDER BY r.capacity
+"""
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(samples), max(samples)
+
+
+def run(args):
+    rng = random.Random(42)
+    days = occupancy.SCHOOL_DAYS
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        migrate(path)
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.executemany("INSERT INTO rooms (name, capacity) VALUES (?, ?)",
+                             ((f"R{i}", rng.choice((20, 30, 40, 50, 80))) for i in range(args.rooms)))
+            rows = []
+            for _ in range(args.slots):
+                start = rng.randrange(8 * 60, 16 * 60, 30)
+                rows.append((1, 1, 1, rng.randrange(1, args.rooms + 1), rng.choice(days),
+                             f"{start // 60:02d}:{start % 60:02d}",
+                             f"{(start + 60) // 60:02d}:{(start + 60) % 60:02d}"))
+            conn.executemany("""
+                INSERT INTO timetable (class_id, subject_id, teacher_id, room_id, day, start_time, end_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+
+        started = time.perf_counter()
+        rooms = occupancy.RoomOccupancy().load(conn)
+        print(f"load {args.rooms} rooms / {args.slots} slots: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        query = ("Tuesday", "10:00", "12:00", 40)
+        assert ([r["id"] for r in rooms.free_rooms(*query)]
+                == [r[0] for r in conn.execute(FREE_ROOMS_SQL, (40, "Tuesday", "12:00", "10:00"))])
+        print(f"{'query':28s} {'median us':>10s} {'max us':>10s}")
+        for label, fn in [
+            ("is_free (one room)", lambda: rooms.is_free(7, "Tuesday", "10:00", "12:00")),
+            ("free_rooms bitmap", lambda: rooms.free_rooms(*query)),
+            ("free_rooms SQL", lambda: conn.execute(FREE_ROOMS_SQL, (40, "Tuesday", "12:00", "10:00")).fetchall()),
+            ("add + remove slot", lambda: (rooms.add(-1, 7, "Tuesday", "10:00", "11:00"), rooms.remove(-1))),
+            ("utilization report", rooms.utilization),
+        ]:
+            median, worst = timed(fn, args.repeat)
+            print(f"{label:28s} {median:10.1f} {worst:10.1f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--slots", type=int, default=8000)
+    parser.add_argument("--repeat", type=int, default=200)
+    run(parser.parse_args())
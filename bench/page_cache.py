@@ -0,0 +1,75 @@
+"""Benchmark the page cache: requests per second on the read-heavy list views.
+
+    python bench/page_cache.py --seconds 3
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import migrate
+
+ROUTES = ["/classes", "/subjects", "/rooms", "/timetable", "/timetable?day=Tuesday"]
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday")
+
+
+def seed(path, classes, rng):
+    migrate(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany("INSERT INTO classes (name, level) VALUES (?, ?)",
+                         ((f"C{i}", str(6 + i % 7)) for i in range(classes)))
+        conn.executemany("INSERT INTO teachers (first_name, last_name) VALUES (?, ?)",
+                         ((f"T{i}", "Teacher") for i in range(classes)))
+        conn.executemany("INSERT INTO rooms (name, capacity) VALUES (?, ?)",
+                         ((f"R{i}", 40) for i in range(classes)))
+        conn.executemany("INSERT INTO subjects (name, coefficient, class_id, teacher_id) VALUES (?, ?, ?, ?)",
+                         ((f"Subject {s}", 1 + s % 4, c + 1, c + 1) for c in range(classes) for s in range(8)))
+        conn.executemany("""
+            INSERT INTO timetable (class_id, subject_id, teacher_id, room_id, day, start_time, end_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, ((c + 1, c * 8 + rng.randrange(8) + 1, c + 1, c + 1, day, f"{h:02d}:00", f"{h + 1:02d}:00")
+              for c in range(classes) for day in DAYS for h in range(8, 14)))
+    conn.close()
+
+
+def throughput(client, path, seconds, headers=None):
+    count, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        response = client.get(path, headers=headers or {})
+        assert response.status_code in (200, 304), response.status_code
+        count += 1
+    return count / seconds
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.classes, random.Random(42))
+        os.environ["DB_PATH"] = path
+        from app import app, page_cache
+
+        client = app.test_client()
+        client.post("/login", data={"username": "admin", "password": "password123"})
+        print(f"{'route':24s} {'no cache':>10s} {'cached':>10s} {'304':>10s}  req/s")
+        for route in ROUTES:
+            app.config["PAGE_CACHE_ENABLED"] = False
+            uncached = throughput(client, route, args.seconds)
+            app.config["PAGE_CACHE_ENABLED"] = True
+            etag = client.get(route).headers["ETag"]
+            cached = throughput(client, route, args.seconds)
+            not_modified = throughput(client, route, args.seconds, {"If-None-Match": etag})
+            print(f"{route:24s} {uncached:10.0f} {cached:10.0f} {not_modified:10.0f}  x{cached / uncached:.1f}")
+        print(page_cache.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--classes", type=int, default=60)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    run(parser.parse_args())
@@ -0,0 +1,52 @@
+"""Benchmark the profiling overhead: requests per second at several SQL sample rates.
+
+    python bench/profiling.py --seconds 3
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from page_cache import ROUTES, seed, throughput
+
+RATES = (0.0, 0.1, 1.0)
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.classes, random.Random(42))
+        os.environ["DB_PATH"] = path
+        os.environ["PROFILE_ENABLED"] = "1"
+        import profiling
+        from app import app
+
+        # Cache de pages coupé : on mesure le rendu et les requêtes SQL à chaque appel
+        app.config["PAGE_CACHE_ENABLED"] = False
+        profiler = profiling.get_profiler()
+        client = app.test_client()
+        client.post("/login", data={"username": "admin", "password": "password123"})
+        print(f"{'route':24s}" + "".join(f"{f'rate {rate:g}':>10s}" for rate in RATES) + "  req/s")
+        for route in ROUTES:
+            client.get(route)  # échauffement
+            results = []
+            for rate in RATES:
+                profiler.sample_rate = rate
+                results.append(throughput(client, route, args.seconds))
+            print(f"{route:24s}" + "".join(f"{value:10.0f}" for value in results)
+                  + f"  {100 * (results[0] / results[-1] - 1):+.1f}% time at 1.0")
+        profiler.sample_rate = 1.0
+        report = profiler.snapshot(top=3)
+        for query in report["queries"]:
+            print(f"{query['time']['total'] * 1000:8.1f} ms  {query['time']['count']:6d} calls  {query['sql'][:80]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--classes", type=int, default=60)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    run(parser.parse_args())
@@ -0,0 +1,75 @@
+"""Benchmark the year-end roll-over: set-based transaction against one add_enrollment post per student.
+
+    python bench/rollover.py --students 10000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import migrate
+import rollover
+
+SOURCE, TARGET = "2024-2025", "2025-2026"
+
+
+def seed(path, students, classes, rng):
+    migrate(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany("INSERT INTO classes (name, level) VALUES (?, ?)",
+                         ((f"C{i}", str(6 + i // 4)) for i in range(classes)))
+        conn.executemany("INSERT INTO students (name, matricule) VALUES (?, ?)",
+                         ((f"Student {i:06d}", f"M{i:06d}") for i in range(students)))
+        conn.executemany("INSERT INTO enrollments (student_id, class_id, academic_year) VALUES (?, ?, ?)",
+                         ((i + 1, i % classes + 1, SOURCE) for i in range(students)))
+        conn.executemany("INSERT INTO fee_transactions (student_id, class_id, kind, amount) VALUES (?, ?, ?, ?)",
+                         ((i + 1, i % classes + 1, "charge", 500) for i in range(students)))
+        conn.executemany("""
+            INSERT INTO fee_transactions (student_id, class_id, kind, amount, payment_mode)
+            VALUES (?, ?, 'payment', ?, 'cash')
+        """, ((i + 1, i % classes + 1, rng.choice([100, 250, 500])) for i in range(students)))
+    conn.close()
+
+
+def run(args):
+    # Chaque classe passe à la classe de même rang du niveau suivant ; le dernier niveau redouble
+    mapping = {c: min(c + 4, args.classes) for c in range(1, args.classes + 1)}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.students, args.classes, random.Random(42))
+        conn = sqlite3.connect(path)
+        for dry_run in (True, False):
+            report = rollover.rollover(conn, SOURCE, TARGET, mapping, dry_run=dry_run)
+            timings = "  ".join(f"{name} {value * 1000:.0f} ms" for name, value in report.timings.items())
+            print(f"{'preview' if dry_run else 'roll-over':10s} {report.enrolled:6d} students  "
+                  f"{report.balances_carried:6d} balances  {timings}")
+        conn.close()
+
+        # Référence : le formulaire add_enrollment, un élève par requête
+        os.environ["DB_PATH"] = path
+        os.environ.setdefault("JOB_WORKERS", "0")
+        from app import app
+
+        client = app.test_client()
+        client.post("/login", data={"username": "admin", "password": "password123"})
+        sample = min(args.sample, args.students)
+        start = time.perf_counter()
+        for i in range(sample):
+            client.post("/enrollments/add", data={"student_id": i + 1, "class_id": 1, "academic_year": "2026-2027"})
+        elapsed = time.perf_counter() - start
+        print(f"{'forms':10s} {sample:6d} students  {elapsed * 1000:.0f} ms "
+              f"(~{elapsed / sample * args.students:.1f} s for {args.students})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--classes", type=int, default=40)
+    parser.add_argument("--sample", type=int, default=300, help="form posts timed for the comparison")
+    run(parser.parse_args())
@@ -0,0 +1,70 @@
+"""Benchmark the timetable generator on a synthetic school.
+
+    python bench/scheduler.py --classes 60 --budget 10 --workers 4
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import conflicts
+import scheduler
+from migrations import migrate
+
+# matière -> coefficient (heures par semaine) ; 30 heures sur 40 créneaux
+CURRICULUM = {"Math": 5, "French": 5, "English": 3, "History": 3, "Physics": 3, "Biology": 3,
+              "Chemistry": 2, "Philosophy": 2, "Sport": 2, "Art": 1, "Music": 1}
+CLASSES_PER_TEACHER = 4
+
+
+def seed(conn, classes, rng):
+    with conn:
+        for c in range(classes):
+            conn.execute("INSERT INTO classes (name, level) VALUES (?, ?)", (f"C{c}", str(6 + c % 7)))
+        for r in range(classes + classes // 10):
+            conn.execute("INSERT INTO rooms (name, capacity) VALUES (?, ?)", (f"R{r}", rng.choice((35, 40, 50))))
+        teacher_id = 0
+        for name, coefficient in CURRICULUM.items():
+            for c in range(classes):
+                if c % CLASSES_PER_TEACHER == 0:
+                    teacher_id = conn.execute(
+                        "INSERT INTO teachers (first_name, last_name) VALUES (?, ?)",
+                        (name, f"T{c}")).lastrowid
+                conn.execute("INSERT INTO subjects (name, coefficient, class_id, teacher_id) VALUES (?, ?, ?, ?)",
+                             (name, coefficient, c + 1, teacher_id))
+        conn.executemany("INSERT INTO students (name, matricule) VALUES (?, ?)",
+                         ((f"S{i}", f"MAT{i:07d}") for i in range(classes * 32)))
+        conn.execute("""
+            INSERT INTO enrollments (student_id, class_id, academic_year)
+            SELECT id, (id - 1) % ? + 1, '2024-2025' FROM students
+        """, (classes,))
+
+
+def run(args):
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        migrate(path)
+        conn = sqlite3.connect(path)
+        seed(conn, args.classes, rng)
+
+        result = scheduler.generate(conn, budget=args.budget, workers=args.workers, write=True)
+        print(f"{result['lessons']} lessons, {result['classes']} classes, {result['teachers']} teachers, "
+              f"{result['rooms']} rooms")
+        print(f"hard conflicts {result['hard_conflicts']} {result['conflicts']}, "
+              f"spread penalty {result['spread_penalty']}")
+        print(f"restarts {result['restart_scores']}, elapsed {result['elapsed']}s")
+        print(f"conflicts.validate after writing: {len(conflicts.validate(conn))}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--classes", type=int, default=60)
+    parser.add_argument("--budget", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=4)
+    run(parser.parse_args())
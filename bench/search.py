@@ -0,0 +1,70 @@
+"""Benchmark the search index: rebuild time and autocomplete latency.
+
+    python bench/search.py --students 100000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search
+from migrations import migrate
+
+FIRST = ["Jean", "Marie", "Kofi", "Aminata", "Paul", "Fatou", "Ibrahim", "Grace", "Yao", "Esther",
+         "Moussa", "Awa", "Emmanuel", "Mariam", "Koffi", "Adjoa", "Seydou", "Nadia", "Komi", "Rose"]
+LAST = ["Dupont", "Gbandi", "Mensah", "Traore", "Diallo", "Kouassi", "Ouedraogo", "Agbeko",
+        "Sow", "Bamba", "Koné", "Adjovi", "Sanogo", "Houngbo", "Ndiaye", "Camara", "Tano", "Zinsou"]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def run(args):
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        migrate(path)
+        conn = sqlite3.connect(path)
+
+        started = time.perf_counter()
+        with conn:
+            conn.executemany(
+                "INSERT INTO students (name, matricule) VALUES (?, ?)",
+                ((f"{rng.choice(FIRST)} {rng.choice(LAST)} {rng.choice(LAST)}", f"MAT{i:07d}")
+                 for i in range(args.students)))
+        print(f"insert {args.students} students (triggers on): {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        search.rebuild(conn)
+        print(f"rebuild: {time.perf_counter() - started:.2f}s")
+
+        queries = ["j", "ma", "dup", "jean dup", "MAT00012", "Ouedrago", "Mensha", "aminta tra"]
+        print(f"{'query':14s} {'median ms':>10s} {'max ms':>8s}  hits")
+        for q in queries:
+            median, worst = timed(lambda: search.search(conn, q, "student", 10), args.repeat)
+            hits = len(search.search(conn, q, "student", 10))
+            print(f"{q:14s} {median:10.2f} {worst:8.2f}  {hits}")
+
+        like = "SELECT id FROM students WHERE name LIKE ? LIMIT 10"
+        median, worst = timed(lambda: conn.execute(like, ("%Mensha%",)).fetchall(), args.repeat)
+        print(f"{'LIKE miss':14s} {median:10.2f} {worst:8.2f}  (full scan, for comparison)")
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    run(parser.parse_args())
@@ -0,0 +1,180 @@
+"""Batch report cards (bulletins) for a whole class or academic year.
+
+Averages (read from the materialized enrollment_averages table) and ranks come
+from one set-based SQL pass and the per-subject lines from a second query,
+instead of three queries per student; class statistics use the grade_stats
+distribution engine.
+
+    python bulletins.py export --class-id 3 --year 2024-2025 --out bulletins/ --workers 4
+"""
+import argparse
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import groupby
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from grade_stats import class_distributions, where_clause
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+AVERAGES_SQL = """
+    WITH averages AS (
+        SELECT e.id AS enrollment_id, e.class_id, e.academic_year,
+               s.name AS student_name, c.name AS class_name,
+               COALESCE(a1.weighted_sum, 0) AS total1, COALESCE(a1.coeff_sum, 0) AS coeff1,
+               COALESCE(a2.weighted_sum, 0) AS total2, COALESCE(a2.coeff_sum, 0) AS coeff2,
+               a1.average AS avg1,
+               a2.average AS avg2,
+               (COALESCE(a1.weighted_sum, 0) + COALESCE(a2.weighted_sum, 0))
+                   / NULLIF(COALESCE(a1.coeff_sum, 0) + COALESCE(a2.coeff_sum, 0), 0) AS final_average
+        FROM enrollments e
+        JOIN students s ON e.student_id = s.id
+        JOIN classes c ON e.class_id = c.id
+        LEFT JOIN enrollment_averages a1 ON a1.enrollment_id = e.id AND a1.semester = 1
+        LEFT JOIN enrollment_averages a2 ON a2.enrollment_id = e.id AND a2.semester = 2
+        WHERE {where}
+    )
+    SELECT *,
+           CASE WHEN final_average IS NULL THEN NULL ELSE
+               RANK() OVER (PARTITION BY class_id, academic_year, final_average IS NULL
+                            ORDER BY final_average DESC)
+           END AS rank,
+           COUNT(final_average) OVER (PARTITION BY class_id, academic_year) AS class_size
+    FROM averages
+    ORDER BY class_id, academic_year, final_average IS NULL, final_average DESC, student_name
+"""
+
+LINES_SQL = """
+    SELECT r.enrollment_id, r.semester, sub.name AS subject_name, r.score, sub.coefficient
+    FROM results r
+    JOIN subjects sub ON r.subject_id = sub.id
+    JOIN enrollments e ON r.enrollment_id = e.id
+    WHERE {where}
+    ORDER BY r.enrollment_id, r.semester, sub.name
+"""
+
+
+def class_averages(conn, class_id=None, academic_year=None):
+    """Moyennes, rang (ex aequo compris) et effectif de chaque inscription."""
+    where, params = where_clause(class_id, academic_year)
+    rows = conn.execute(AVERAGES_SQL.format(where=where), params).fetchall()
+    return [dict(row) for row in rows]
+
+
+def class_statistics(averages):
+    """Statistiques de classe (moteur de grade_stats), groupées par (class_id, academic_year)."""
+    return {(stats["class_id"], stats["academic_year"]): stats
+            for stats in class_distributions(averages, value="final_average")}
+
+
+def iter_bulletins(conn, class_id=None, academic_year=None):
+    """Génère les bulletins un par un (deux requêtes au total, pas par élève)."""
+    averages = class_averages(conn, class_id, academic_year)
+    stats = class_statistics(averages)
+
+    where, params = where_clause(class_id, academic_year)
+    lines = {}
+    for (enrollment_id, semester), rows in groupby(
+            conn.execute(LINES_SQL.format(where=where), params),
+            key=lambda r: (r["enrollment_id"], r["semester"])):
+        lines[(enrollment_id, semester)] = [dict(r) for r in rows]
+
+    for a in averages:
+        yield {
+            "enrollment": {
+                "id": a["enrollment_id"],
+                "student_name": a["student_name"],
+                "class_name": a["class_name"],
+                "academic_year": a["academic_year"],
+            },
+            "sem1_results": lines.get((a["enrollment_id"], 1), []),
+            "sem2_results": lines.get((a["enrollment_id"], 2), []),
+            "total1": a["total1"], "total2": a["total2"],
+            "avg1": a["avg1"] or 0, "avg2": a["avg2"] or 0,
+            "final_average": a["final_average"] or 0,
+            "rank": a["rank"],
+            "class_size": a["class_size"],
+            "class_stats": stats.get((a["class_id"], a["academic_year"])),
+        }
+
+
+# --- Parallel export ---
+def _render_chunk(template_dir, out_dir, chunk):
+    env = Environment(loader=FileSystemLoader(template_dir), autoescape=select_autoescape())
+    template = env.get_template("bulletin_print.html")
+    for bulletin in chunk:
+        enrollment = bulletin["enrollment"]
+        path = os.path.join(out_dir, f"bulletin_{enrollment['id']}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(template.render(**bulletin))
+    return len(chunk)
+
+
+def export_bulletins(conn, out_dir, class_id=None, academic_year=None,
+                     workers=None, chunk_size=50, progress=None):
+    """Rend un fichier HTML par élève avec un pool de processus (workers=0 : dans ce processus).
+
+    progress(done, total) est appelé à chaque lot terminé.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    bulletins = list(iter_bulletins(conn, class_id, academic_year))
+    total = len(bulletins)
+    template_dir = os.path.join(BASE_DIR, "templates")
+    chunks = [bulletins[i:i + chunk_size] for i in range(0, total, chunk_size)]
+
+    done = 0
+    if progress:
+        progress(done, total)
+    if workers == 0:
+        # Depuis un thread (jobs en arrière-plan) : pas de fork d'un processus multi-thread
+        for chunk in chunks:
+            done += _render_chunk(template_dir, out_dir, chunk)
+            if progress:
+                progress(done, total)
+        return total
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_render_chunk, template_dir, out_dir, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            done += future.result()
+            if progress:
+                progress(done, total)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch bulletin export")
+    parser.add_argument("command", choices=["export", "ranking"])
+    parser.add_argument("--db", default=os.path.join(BASE_DIR, "database.db"))
+    parser.add_argument("--class-id", type=int)
+    parser.add_argument("--year")
+    parser.add_argument("--out", default="bulletins")
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    conn.row_factory = sqlite3.Row
+    started = time.perf_counter()
+    try:
+        if args.command == "ranking":
+            for a in class_averages(conn, args.class_id, args.year):
+                average = "-" if a["final_average"] is None else f"{a['final_average']:.2f}"
+                print(f"{a['class_name']:12s} {a['academic_year'] or '':10s} "
+                      f"{a['rank'] or '-':>4} {average:>6s}  {a['student_name']}")
+            return 0
+
+        def report(done, total):
+            print(f"\r{done}/{total} bulletins", end="", flush=True)
+
+        total = export_bulletins(conn, args.out, args.class_id, args.year, args.workers, progress=report)
+        elapsed = time.perf_counter() - started
+        print(f"\nExported {total} bulletins to {args.out} in {elapsed:.2f}s")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import OrderedDict
+
+# table -> caches à vider quand cette table change
+_dependents = {}
+# table -> compteur de versions, incrémenté à chaque écriture
+_versions = {}
+# caches sans table associée (LRU), listés dans /debug/cache
+_registry = []
+
+
+class TTLCache:
+    """Petit cache clé/valeur en mémoire avec expiration et compteurs de hits."""
+
+    def __init__(self, name, ttl=60.0, tables=()):
+        self.name = name
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        for table in tables:
+            _dependents.setdefault(table, []).append(self)
+
+    def get_or_set(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._data[key] = (now + self.ttl, value)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "ttl": self.ttl,
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+class LRUCache:
+    """Cache LRU borné en nombre d'entrées et en octets, avec expiration optionnelle.
+
+    Les clés contiennent les versions des tables (table_versions), donc une écriture
+    rend les anciennes entrées inaccessibles ; elles sortent ensuite par éviction.
+    """
+
+    def __init__(self, name, max_entries=512, max_bytes=32 * 1024 * 1024, ttl=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()  # clé -> (expiration, taille, valeur)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+        _registry.append(self)
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            self.rejected += 1
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (expires, size, value)
+            self.bytes += size
+            while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        self.bytes -= self._data.pop(key)[1]
+
+    def invalidate(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "ttl": self.ttl,
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "rejected": self.rejected,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+def table_versions(tables, conn=None):
+    """Versions locales (invalidate_tables) ; avec conn, suivies de celles de la table
+    table_versions, que des triggers incrémentent à chaque écriture de n'importe quel
+    processus (worker de jobs, CLI, archivage, restauration)."""
+    local = tuple(_versions.get(table, 0) for table in tables)
+    if conn is None or not tables:
+        return local
+    shared = dict(conn.execute(
+        f"SELECT name, version FROM table_versions WHERE name IN ({','.join('?' * len(tables))})", tables))
+    return local + tuple(shared.get(table, 0) for table in tables)
+
+
+def invalidate_tables(*tables):
+    """À appeler après chaque écriture : vide les caches qui dépendent des tables
+    et incrémente leur version."""
+    for table in tables:
+        _versions[table] = _versions.get(table, 0) + 1
+        for cache in _dependents.get(table, ()):
+            cache.invalidate()
+
+
+def all_caches():
+    seen = list(_registry)
+    for caches in _dependents.values():
+        for cache in caches:
+            if cache not in seen:
+                seen.append(cache)
+    return seen
@@ -0,0 +1,22 @@
+"""Columnar reads: one group_concat string per column, turned into an array.
+
+Shared by the reports that load their data in bulk (aging.py, grade_stats.py).
+A NumPy array when vectorized (NumPy installed), a typed array.array otherwise.
+group_concat skips NULLs, so the query must exclude (or COALESCE) them: a
+missing value would shift every later value of the column.
+"""
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy optionnel : les appelants passent alors vectorized=False
+    np = None
+
+
+def column(text, kind, vectorized):
+    """'1,2,3' -> tableau d'entiers (kind=int) ou de flottants (kind=float)."""
+    typecode = "q" if kind is int else "d"
+    if vectorized:
+        dtype = np.int64 if kind is int else np.float64
+        return np.array(text.split(","), dtype=dtype) if text else np.empty(0, dtype=dtype)
+    return array(typecode, map(kind, text.split(","))) if text else array(typecode)
@@ -0,0 +1,199 @@
+"""Timetable conflict detection.
+
+One sorted interval index per (resource, day) — resource being the teacher, the
+room or the class of a slot. Checking a new slot is a bisect plus a short walk
+back bounded by the longest slot of the index. find() checks a slot against the
+database: three index searches on (resource, day, start_time) read only that
+day's slots of its teacher, room and class, so the cost does not grow with the
+size of the timetable. validate() is the bulk pass over the whole timetable
+(sweep line).
+
+    python conflicts.py check
+"""
+import argparse
+import os
+import sqlite3
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+RESOURCES = ("teacher", "room", "class")
+
+Conflict = namedtuple("Conflict", "resource resource_id day entry_id other_id start end")
+
+
+def to_minutes(value):
+    """'08:30' -> 510"""
+    hours, minutes = str(value).split(":")[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def format_minutes(value):
+    return f"{value // 60:02d}:{value % 60:02d}"
+
+
+class IntervalIndex:
+    """Intervalles [start, end) triés par début, pour une ressource et un jour."""
+
+    def __init__(self):
+        self._items = []  # (start, end, entry_id)
+        self._max_length = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def overlaps(self, start, end):
+        # Seuls les intervalles qui commencent avant `end` peuvent chevaucher ;
+        # on remonte tant qu'un intervalle aussi long que le plus long peut encore atteindre `start`
+        found = []
+        i = bisect_left(self._items, (end,)) - 1
+        while i >= 0 and self._items[i][0] > start - self._max_length:
+            item_start, item_end, entry_id = self._items[i]
+            if item_end > start:
+                found.append((item_start, item_end, entry_id))
+            i -= 1
+        return found
+
+    def add(self, start, end, entry_id):
+        insort(self._items, (start, end, entry_id))
+        self._max_length = max(self._max_length, end - start)
+
+    def remove(self, start, end, entry_id):
+        i = bisect_left(self._items, (start, end, entry_id))
+        if i < len(self._items) and self._items[i] == (start, end, entry_id):
+            del self._items[i]
+
+
+def _keys(slot):
+    return [(resource, slot[f"{resource}_id"], slot["day"]) for resource in RESOURCES]
+
+
+class Schedule:
+    """Index des créneaux par (ressource, jour)."""
+
+    def __init__(self):
+        self._indexes = {}
+        self._slots = {}
+
+    def __len__(self):
+        return len(self._slots)
+
+    def conflicts(self, slot, entry_id=None):
+        """Conflits qu'entraînerait `slot` (dict avec class_id, teacher_id, room_id, day, start_time, end_time)."""
+        start, end = to_minutes(slot["start_time"]), to_minutes(slot["end_time"])
+        found = []
+        for key in _keys(slot):
+            index = self._indexes.get(key)
+            if index is None:
+                continue
+            for other_start, other_end, other_id in index.overlaps(start, end):
+                if other_id != entry_id:
+                    found.append(Conflict(key[0], key[1], key[2], entry_id, other_id,
+                                          max(start, other_start), min(end, other_end)))
+        return found
+
+    def add(self, entry_id, slot):
+        start, end = to_minutes(slot["start_time"]), to_minutes(slot["end_time"])
+        for key in _keys(slot):
+            self._indexes.setdefault(key, IntervalIndex()).add(start, end, entry_id)
+        self._slots[entry_id] = dict(slot)
+
+    def remove(self, entry_id):
+        slot = self._slots.pop(entry_id, None)
+        if slot is None:
+            return
+        start, end = to_minutes(slot["start_time"]), to_minutes(slot["end_time"])
+        for key in _keys(slot):
+            self._indexes[key].remove(start, end, entry_id)
+
+
+SLOTS_SQL = """
+    SELECT id, class_id, teacher_id, room_id, day, start_time, end_time
+    FROM timetable
+"""
+
+# Un terme par ressource, pour que SQLite combine les trois index (MULTI-INDEX OR)
+FIND_SQL = SLOTS_SQL + """
+    WHERE (teacher_id = :teacher_id AND day = :day)
+       OR (room_id = :room_id AND day = :day)
+       OR (class_id = :class_id AND day = :day)
+"""
+
+
+def load(conn):
+    schedule = Schedule()
+    for row in conn.execute(SLOTS_SQL):
+        schedule.add(row[0], {
+            "class_id": row[1], "teacher_id": row[2], "room_id": row[3],
+            "day": row[4], "start_time": row[5], "end_time": row[6],
+        })
+    return schedule
+
+
+def find(conn, slot, entry_id=None):
+    """Conflits de `slot` lus en base : seuls les créneaux du jour qui partagent
+    l'enseignant, la salle ou la classe (un index par ressource, migration 10). À appeler
+    dans la transaction d'écriture, pour voir les créneaux ajoutés par les autres processus."""
+    schedule = Schedule()
+    for row in conn.execute(FIND_SQL, slot):
+        schedule.add(row[0], {
+            "class_id": row[1], "teacher_id": row[2], "room_id": row[3],
+            "day": row[4], "start_time": row[5], "end_time": row[6],
+        })
+    return schedule.conflicts(slot, entry_id)
+
+
+def validate(conn):
+    """Passe complète : tous les couples de créneaux qui se chevauchent, par ressource."""
+    by_key = {}
+    for row in conn.execute(SLOTS_SQL):
+        entry_id, day = row[0], row[4]
+        start, end = to_minutes(row[5]), to_minutes(row[6])
+        for resource, resource_id in zip(RESOURCES, (row[2], row[3], row[1])):
+            by_key.setdefault((resource, resource_id, day), []).append((start, end, entry_id))
+
+    found = []
+    for (resource, resource_id, day), slots in by_key.items():
+        slots.sort()
+        active = []  # créneaux encore ouverts au début du créneau courant
+        for start, end, entry_id in slots:
+            active = [item for item in active if item[1] > start]
+            for other_start, other_end, other_id in active:
+                found.append(Conflict(resource, resource_id, day, entry_id, other_id,
+                                      start, min(end, other_end)))
+            active.append((start, end, entry_id))
+    return found
+
+
+def conflicting_ids(conflicts):
+    ids = set()
+    for conflict in conflicts:
+        ids.add(conflict.entry_id)
+        ids.add(conflict.other_id)
+    return ids
+
+
+def describe(conflict):
+    return (f"{conflict.resource} {conflict.resource_id} is already booked on {conflict.day} "
+            f"{format_minutes(conflict.start)}-{format_minutes(conflict.end)} (slot {conflict.other_id})")
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Timetable conflict check")
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("--db", default=os.path.join(base_dir, "database.db"))
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        found = validate(conn)
+    finally:
+        conn.close()
+    for conflict in found:
+        print(f"slot {conflict.entry_id}: {describe(conflict)}")
+    print(f"{len(found)} conflicts")
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,262 @@
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+from flask import g
+
+
+# --- SQLite Settings ---
+# journal_mode est persistant (stocké dans le fichier), les autres PRAGMAs
+# sont appliqués à chaque nouvelle connexion.
+SQLITE_SETTINGS = {
+    "development": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -16000,
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 15000,
+        "cache_size": -64000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+    "testing": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "busy_timeout": 1000,
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "temp_store": "MEMORY",
+    },
+}
+
+CONNECTION_PRAGMAS = ("synchronous", "busy_timeout", "cache_size", "mmap_size", "temp_store")
+
+
+def configure_database(path, settings):
+    """Étape de démarrage : active le mode de journal une fois pour toutes."""
+    conn = sqlite3.connect(path)
+    try:
+        mode = conn.execute(f"PRAGMA journal_mode={settings['journal_mode']}").fetchone()[0]
+    finally:
+        conn.close()
+    return mode
+
+
+def apply_connection_pragmas(conn, settings):
+    for name in CONNECTION_PRAGMAS:
+        if name in settings:
+            conn.execute(f"PRAGMA {name}={settings[name]}")
+
+
+# --- Write Transactions ---
+def is_lock_error(error):
+    message = str(error).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+def write_transaction(conn, work, attempts=5, base_delay=0.05):
+    """Exécute work(conn) dans une transaction BEGIN IMMEDIATE.
+
+    En cas de "database is locked", la transaction est annulée puis rejouée
+    avec un backoff exponentiel (et un peu d'aléa pour désynchroniser les writers).
+    """
+    for attempt in range(attempts):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            result = work(conn)
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not is_lock_error(e) or attempt == attempts - 1:
+                raise
+            time.sleep(base_delay * (2 ** attempt) * (1 + random.random()))
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+
+# --- Connection Pool ---
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Bounded pool of warm SQLite connections, shared by the threads of one worker."""
+
+    def __init__(self, path, size=5, timeout=10.0, health_check_interval=30.0, settings=None,
+                 factory=sqlite3.Connection):
+        self.path = path
+        self.factory = factory
+        self.settings = settings or {}
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._last_used = {}
+        self.stats = {
+            "checkouts": 0,
+            "connections_created": 0,
+            "connections_discarded": 0,
+            "health_checks": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        apply_connection_pragmas(conn, self.settings)
+        self.stats["connections_created"] += 1
+        return conn
+
+    def _is_healthy(self, conn):
+        # Un test "SELECT 1" seulement si la connexion est restée inactive longtemps
+        last_used = self._last_used.get(id(conn), 0)
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        self.stats["health_checks"] += 1
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+        self.stats["connections_discarded"] += 1
+
+    def acquire(self):
+        started = time.perf_counter()
+        conn = None
+        while conn is None:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        conn = self._connect()
+                    except sqlite3.Error:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                    break
+                remaining = self.timeout - (time.perf_counter() - started)
+                try:
+                    conn = self._idle.get(timeout=max(remaining, 0))
+                except queue.Empty:
+                    self.stats["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+            if not self._is_healthy(conn):
+                self._discard(conn)
+                conn = None
+
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.stats["checkouts"] += 1
+            self.stats["wait_time_total"] += waited
+            self.stats["wait_time_max"] = max(self.stats["wait_time_max"], waited)
+        return conn
+
+    def release(self, conn):
+        # Ne jamais rendre au pool une connexion avec une transaction ouverte
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._last_used[id(conn)] = time.monotonic()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            self._discard(conn)
+
+    def snapshot(self):
+        data = dict(self.stats)
+        data["size"] = self.size
+        data["open_connections"] = self._created
+        data["idle_connections"] = self._idle.qsize()
+        checkouts = data["checkouts"] or 1
+        data["wait_time_avg"] = data["wait_time_total"] / checkouts
+        return data
+
+
+# --- Flask Integration ---
+_pool = None
+
+
+def init_app(app):
+    global _pool
+    settings = dict(SQLITE_SETTINGS[app.config.get("APP_ENV", "development")])
+    settings.update(app.config.get("SQLITE_SETTINGS", {}))
+    app.config["SQLITE_JOURNAL_MODE"] = configure_database(app.config["DB_PATH"], settings)
+    _pool = ConnectionPool(
+        app.config["DB_PATH"],
+        size=app.config.get("DB_POOL_SIZE", 5),
+        timeout=app.config.get("DB_POOL_TIMEOUT", 10.0),
+        health_check_interval=app.config.get("DB_POOL_HEALTH_CHECK_INTERVAL", 30.0),
+        settings=settings,
+        factory=app.config.get("DB_CONNECTION_FACTORY", sqlite3.Connection),
+    )
+    app.teardown_appcontext(close_db)
+    return _pool
+
+
+def get_pool():
+    return _pool
+
+
+def get_db():
+    """Connexion de la requête courante, empruntée au pool au premier appel."""
+    if "db" not in g:
+        g.db = _pool.acquire()
+    return g.db
+
+
+def close_db(exc=None):
+    conn = g.pop("db", None)
+    if conn is not None:
+        _pool.release(conn)
+
+
+def pool_metrics():
+    """Compteurs du pool au format texte Prometheus."""
+    data = _pool.snapshot()
+    lines = []
+    for key in ("checkouts", "connections_created", "connections_discarded",
+                "health_checks", "timeouts"):
+        lines.append(f"# TYPE db_pool_{key} counter")
+        lines.append(f"db_pool_{key}_total {data[key]}")
+    lines.append("# TYPE db_pool_wait_seconds summary")
+    lines.append(f"db_pool_wait_seconds_sum {data['wait_time_total']:.6f}")
+    lines.append(f"db_pool_wait_seconds_count {data['checkouts']}")
+    lines.append("# TYPE db_pool_wait_seconds_max gauge")
+    lines.append(f"db_pool_wait_seconds_max {data['wait_time_max']:.6f}")
+    for key in ("size", "open_connections", "idle_connections"):
+        lines.append(f"# TYPE db_pool_{key} gauge")
+        lines.append(f"db_pool_{key} {data[key]}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,204 @@
+"""Streaming CSV / JSON Lines exports of the fees, ledger, results and timetable views.
+
+Rows are read from the cursor with fetchmany and written out batch by batch,
+optionally gzip-compressed on the fly, so memory stays flat whatever the size of
+the result set. The filters are the query-string filters of the list views.
+
+    python exports.py fees --format csv --out fees.csv
+    python exports.py results --format jsonl --gzip --filter semester=1 --out results.jsonl.gz
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from collections import namedtuple
+
+from werkzeug.datastructures import MultiDict
+
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+FETCH_SIZE = 1000
+
+Export = namedtuple("Export", "sql order_by filters")
+
+DAY_ORDER = """
+    CASE t.day
+        WHEN 'Monday' THEN 1
+        WHEN 'Tuesday' THEN 2
+        WHEN 'Wednesday' THEN 3
+        WHEN 'Thursday' THEN 4
+        WHEN 'Friday' THEN 5
+        WHEN 'Saturday' THEN 6
+        WHEN 'Sunday' THEN 7
+    END
+"""
+
+
+# --- Filters (partagés avec les vues liste) ---
+def fees_filters(args):
+    where, params = [], []
+    class_id = args.get("class_id", type=int)
+    if class_id:
+        where.append("f.class_id = ?")
+        params.append(class_id)
+    return where, params
+
+
+def results_filters(args):
+    where, params = [], []
+    q = args.get("q", "").strip()
+    semester = args.get("semester", type=int)
+    if q:
+        where.append("s.name LIKE ? OR sub.name LIKE ?")
+        params += [f"%{q}%", f"%{q}%"]
+    if semester:
+        where.append("r.semester = ?")
+        params.append(semester)
+    return where, params
+
+
+def timetable_filters(args):
+    where, params = [], []
+    day = args.get("day", "").strip()
+    class_id = args.get("class_id", type=int)
+    if day:
+        where.append("t.day = ?")
+        params.append(day)
+    if class_id:
+        where.append("t.class_id = ?")
+        params.append(class_id)
+    return where, params
+
+
+EXPORTS = {
+    "fees": Export("""
+        SELECT f.id, s.matricule, s.name AS student_name, c.name AS class_name,
+               f.total_due, f.total_paid, f.balance, f.last_payment_mode, f.status
+        FROM fee_balances f
+        JOIN students s ON f.student_id = s.id
+        JOIN classes c ON f.class_id = c.id
+    """, "f.id", fees_filters),
+    "ledger": Export("""
+        SELECT f.id, f.created_at, s.matricule, s.name AS student_name, c.name AS class_name,
+               f.kind, f.amount, f.payment_mode, f.note
+        FROM fee_transactions f
+        JOIN students s ON f.student_id = s.id
+        JOIN classes c ON f.class_id = c.id
+    """, "f.id", fees_filters),
+    "results": Export("""
+        SELECT r.id, s.matricule, s.name AS student_name, c.name AS class_name,
+               e.academic_year, sub.name AS subject_name, sub.coefficient,
+               r.semester, r.score
+        FROM results r
+        JOIN enrollments e ON r.enrollment_id = e.id
+        JOIN students s ON e.student_id = s.id
+        JOIN classes c ON e.class_id = c.id
+        JOIN subjects sub ON r.subject_id = sub.id
+    """, "r.id", results_filters),
+    "timetable": Export("""
+        SELECT t.id, t.day, t.start_time, t.end_time, c.name AS class_name,
+               sub.name AS subject_name, te.first_name || ' ' || te.last_name AS teacher_name,
+               r.name AS room_name
+        FROM timetable t
+        JOIN classes c ON t.class_id = c.id
+        JOIN subjects sub ON t.subject_id = sub.id
+        JOIN teachers te ON t.teacher_id = te.id
+        JOIN rooms r ON t.room_id = r.id
+    """, DAY_ORDER + ", t.start_time, t.id", timetable_filters),
+}
+
+
+def build_query(name, args):
+    export = EXPORTS[name]
+    where, params = export.filters(args)
+    sql = export.sql
+    if where:
+        sql += " WHERE " + " AND ".join(f"({clause})" for clause in where)
+    return sql + " ORDER BY " + export.order_by, params
+
+
+# --- Writers ---
+def _batches(cursor):
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return
+        yield rows
+
+
+def iter_csv(cursor):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column[0] for column in cursor.description])
+    for rows in _batches(cursor):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_jsonl(cursor):
+    columns = [column[0] for column in cursor.description]
+    for rows in _batches(cursor):
+        yield "".join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows)
+
+
+def gzip_chunks(chunks):
+    # wbits=31 : en-tête et CRC gzip, compatible gunzip / zcat
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(conn, name, args, fmt="csv", compress=False):
+    """Produit l'export sous forme de morceaux de bytes, lus au fil du curseur."""
+    sql, params = build_query(name, args)
+    cursor = conn.execute(sql, params)
+    writer = iter_csv if fmt == "csv" else iter_jsonl
+    chunks = (text.encode("utf-8") for text in writer(cursor))
+    try:
+        yield from gzip_chunks(chunks) if compress else chunks
+    finally:
+        cursor.close()
+
+
+def filename(name, fmt, compress):
+    return f"{name}_{time.strftime('%Y%m%d')}.{fmt}" + (".gz" if compress else "")
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Streaming export")
+    parser.add_argument("name", choices=sorted(EXPORTS))
+    parser.add_argument("--db", default=os.path.join(base_dir, "database.db"))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--filter", action="append", default=[], metavar="KEY=VALUE",
+                        help="same filters as the list view, e.g. class_id=3")
+    parser.add_argument("--out", help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    filters = MultiDict(item.split("=", 1) for item in args.filter)
+    conn = sqlite3.connect(args.db)
+    out = open(args.out, "wb") if args.out else sys.stdout.buffer
+    try:
+        for chunk in iter_export(conn, args.name, filters, args.format, args.gzip):
+            out.write(chunk)
+    finally:
+        if args.out:
+            out.close()
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
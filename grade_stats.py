@@ -0,0 +1,332 @@
+"""Class and subject statistics on results: ranks, percentiles and distributions.
+
+- Student rankings are set-based SQL over the materialized averages: window
+  functions give RANK / DENSE_RANK (ties share a rank) and CUME_DIST (the
+  percentile rank) for every enrollment in one query.
+- Distributions (count, mean, standard deviation, min, max, deciles,
+  quartiles and a 2-point histogram on the /20 scale) per class and per
+  subject are computed on columnar arrays: results are read in bulk, one
+  column at a time, then sorted and reduced per group with NumPy when it is
+  installed, or grouped and sorted in pure Python otherwise.
+
+    python grade_stats.py report --class-id 3 --year 2024-2025 --semester 1
+"""
+import argparse
+import json
+import math
+import os
+import sqlite3
+import time
+from array import array
+
+from columnar import column
+
+try:
+    import numpy as np
+except ImportError:  # NumPy optionnel : repli sur des listes triées
+    np = None
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+HISTOGRAM_BINS = 10   # tranches de 2 points sur 20
+MAX_SCORE = 20
+BIN_WIDTH = MAX_SCORE / HISTOGRAM_BINS
+PASS_MARK = 10
+
+
+def where_clause(class_id=None, academic_year=None, semester=None, semester_column="r.semester"):
+    """Filtres communs sur l'inscription (alias e) et le semestre : (clause WHERE, paramètres)."""
+    clauses, params = [], []
+    if class_id is not None:
+        clauses.append("e.class_id = ?")
+        params.append(class_id)
+    if academic_year:
+        clauses.append("e.academic_year = ?")
+        params.append(academic_year)
+    if semester is not None:
+        clauses.append(f"{semester_column} = ?")
+        params.append(semester)
+    return " AND ".join(clauses) or "1", params
+
+
+def histogram_labels():
+    width = MAX_SCORE // HISTOGRAM_BINS
+    return [f"{b * width}-{(b + 1) * width}" for b in range(HISTOGRAM_BINS)]
+
+
+# --- Distributions ---
+def _summary(count, mean, stdev, low, high, pass_rate, quantiles, histogram):
+    quantiles = {f"p{round(p * 100)}": q for p, q in zip(QUANTILES, quantiles)}
+    return {
+        "count": count,
+        "mean": mean,
+        "median": quantiles["p50"],
+        "stdev": stdev,
+        "min": low,
+        "max": high,
+        "pass_rate": pass_rate,
+        "quantiles": quantiles,
+        "histogram": histogram,
+    }
+
+
+def _bin(value):
+    return min(int(value // BIN_WIDTH), HISTOGRAM_BINS - 1)
+
+
+def _distributions_python(codes, values):
+    """{code: statistiques} ; quantiles interpolés linéairement (méthode 'inclusive')."""
+    groups = {}
+    for code, value in zip(codes, values):
+        groups.setdefault(code, []).append(value)
+    result = {}
+    for code, group in groups.items():
+        group.sort()
+        n = len(group)
+        quantiles = []
+        for p in QUANTILES:
+            k = (n - 1) * p
+            lo = int(k)
+            hi = min(lo + 1, n - 1)
+            quantiles.append(group[lo] + (k - lo) * (group[hi] - group[lo]))
+        histogram = [0] * HISTOGRAM_BINS
+        for value in group:
+            histogram[_bin(value)] += 1
+        mean = sum(group) / n
+        variance = max(sum(v * v for v in group) / n - mean * mean, 0)
+        result[code] = _summary(n, round(mean, 2), round(math.sqrt(variance), 2),
+                                round(group[0], 2), round(group[-1], 2),
+                                round(sum(1 for v in group if v >= PASS_MARK) / n, 4),
+                                [round(q, 2) for q in quantiles], histogram)
+    return result
+
+
+def _distributions_numpy(codes, values):
+    # Un seul tri (groupe, valeur) ; chaque groupe est alors une tranche contiguë et triée
+    order = np.lexsort((values, codes))
+    codes, values = codes[order], values[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    counts = np.diff(np.r_[starts, len(values)])
+    totals = np.add.reduceat(values, starts)
+    squares = np.add.reduceat(values * values, starts)
+    passed = np.add.reduceat((values >= PASS_MARK).astype(np.int64), starts)
+    quantiles = np.empty((len(starts), len(QUANTILES)))
+    for j, p in enumerate(QUANTILES):
+        k = (counts - 1) * p
+        lo = k.astype(np.int64)
+        hi = np.minimum(lo + 1, counts - 1)
+        quantiles[:, j] = values[starts + lo] + (k - lo) * (values[starts + hi] - values[starts + lo])
+    bins = np.minimum((values // BIN_WIDTH).astype(np.int64), HISTOGRAM_BINS - 1)
+    group = np.repeat(np.arange(len(starts)), counts)
+    histograms = np.bincount(group * HISTOGRAM_BINS + bins,
+                             minlength=len(starts) * HISTOGRAM_BINS).reshape(-1, HISTOGRAM_BINS)
+    means = totals / counts
+    stdevs = np.sqrt(np.maximum(squares / counts - means * means, 0))
+    # Arrondis et conversion en types Python en une fois, pas groupe par groupe
+    columns = zip(codes[starts].tolist(), counts.tolist(), np.round(means, 2).tolist(),
+                  np.round(stdevs, 2).tolist(), np.round(values[starts], 2).tolist(),
+                  np.round(values[starts + counts - 1], 2).tolist(), np.round(passed / counts, 4).tolist(),
+                  np.round(quantiles, 2).tolist(), histograms.tolist())
+    return {code: _summary(*stats) for code, *stats in columns}
+
+
+def distributions(codes, values, engine=None):
+    """Statistiques par code de groupe ; engine force 'numpy' ou 'python'."""
+    engine = engine or ("numpy" if np is not None else "python")
+    if not len(values):
+        return {}
+    if engine == "numpy":
+        return _distributions_numpy(np.asarray(codes, dtype=np.int64),
+                                    np.asarray(values, dtype=np.float64))
+    return _distributions_python(codes, values)
+
+
+# Moyenne pondérée de chaque inscription, depuis la table matérialisée enrollment_averages
+AVERAGES_SQL = """
+    SELECT e.id AS enrollment_id, e.class_id, e.academic_year, s.name AS student_name,
+           SUM(a.weighted_sum) / NULLIF(SUM(a.coeff_sum), 0) AS value
+    FROM enrollments e
+    JOIN students s ON e.student_id = s.id
+    JOIN enrollment_averages a ON a.enrollment_id = e.id
+    WHERE {where}
+    GROUP BY e.id
+"""
+
+# Note d'une matière (moyenne des semestres retenus) de chaque inscription
+SUBJECT_SCORES_SQL = """
+    SELECT e.id AS enrollment_id, e.class_id, e.academic_year, s.name AS student_name,
+           AVG(r.score) AS value
+    FROM results r
+    JOIN enrollments e ON r.enrollment_id = e.id
+    JOIN students s ON e.student_id = s.id
+    WHERE {where} AND r.subject_id = ?
+    GROUP BY e.id
+"""
+
+# Lecture en bloc des notes : une chaîne par colonne, sans jointure. group_concat saute
+# les NULL (le schéma historique les permet) : une ligne incomplète décalerait toute la colonne
+RESULTS_SQL = """
+    SELECT group_concat(enrollment_id), group_concat(subject_id), group_concat(semester),
+           group_concat(score)
+    FROM results
+    WHERE score IS NOT NULL AND semester IS NOT NULL
+      AND enrollment_id IS NOT NULL AND subject_id IS NOT NULL{where}
+"""
+
+RANKINGS_SQL = """
+    SELECT enrollment_id, class_id, academic_year, student_name, value AS average,
+           RANK() OVER by_class AS rank,
+           DENSE_RANK() OVER by_class AS dense_rank,
+           CUME_DIST() OVER (PARTITION BY class_id, academic_year ORDER BY value) AS cume_dist,
+           COUNT(*) OVER (PARTITION BY class_id, academic_year) AS class_size
+    FROM ({source})
+    WHERE value IS NOT NULL
+    WINDOW by_class AS (PARTITION BY class_id, academic_year ORDER BY value DESC)
+    ORDER BY class_id, academic_year, rank, student_name
+"""
+
+
+def student_rankings(conn, class_id=None, academic_year=None, semester=None, subject_id=None):
+    """Rang (ex aequo compris) et rang centile de chaque élève dans sa classe,
+    sur la moyenne générale ou, avec subject_id, sur une matière."""
+    if subject_id is None:
+        where, params = where_clause(class_id, academic_year, semester, semester_column="a.semester")
+        source = AVERAGES_SQL.format(where=where)
+    else:
+        where, params = where_clause(class_id, academic_year, semester)
+        source = SUBJECT_SCORES_SQL.format(where=where)
+        params.append(subject_id)
+    # row_factory sur un curseur : la connexion (partagée, du pool) n'est pas modifiée
+    cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+    rows = cur.execute(RANKINGS_SQL.format(source=source), params)
+    rankings = []
+    for row in rows:
+        ranking = dict(zip(row.keys(), row))
+        ranking["average"] = round(ranking["average"], 2)
+        # Part de la classe dont la moyenne est inférieure ou égale
+        ranking["percentile"] = round(ranking.pop("cume_dist") * 100, 1)
+        rankings.append(ranking)
+    return rankings
+
+
+def class_distributions(rankings, engine=None, value="average"):
+    """Distribution des moyennes des élèves, par (classe, année) ; les moyennes absentes sont ignorées."""
+    rows = [r for r in rankings if r[value] is not None]
+    keys = {}
+    codes = array("q", (keys.setdefault((r["class_id"], r["academic_year"]), len(keys)) for r in rows))
+    values = array("d", (r[value] for r in rows))
+    stats = distributions(codes, values, engine)
+    return [{"class_id": key[0], "academic_year": key[1], **stats[code]} for key, code in keys.items()]
+
+
+def subject_distributions(conn, class_id=None, academic_year=None, semester=None, engine=None):
+    """Distribution des notes, par (classe, année, semestre, matière)."""
+    engine = engine or ("numpy" if np is not None else "python")
+    where, params = where_clause(class_id, academic_year)
+    enrollments = conn.execute(f"SELECT e.id, e.class_id, e.academic_year FROM enrollments e WHERE {where}",
+                               params).fetchall()
+    extra = ""
+    if params:
+        extra += f" AND enrollment_id IN (SELECT e.id FROM enrollments e WHERE {where})"
+    if semester is not None:
+        extra += " AND semester = ?"
+        params.append(semester)
+    enrollment_ids, subject_ids, semesters, scores = conn.execute(RESULTS_SQL.format(where=extra), params).fetchone()
+    vectorized = engine == "numpy"
+    enrollment_ids = column(enrollment_ids, int, vectorized)
+    subject_ids = column(subject_ids, int, vectorized)
+    semesters = column(semesters, int, vectorized)
+    scores = column(scores, float, vectorized)
+
+    # Code de groupe entier : (classe, année) de l'inscription, semestre, matière ;
+    # les notes d'inscriptions hors filtre (ou supprimées) ont le code -1 et sont ignorées
+    class_years = {}
+    class_year_of = {row[0]: class_years.setdefault((row[1], row[2]), len(class_years)) for row in enrollments}
+    if not len(scores):
+        return []
+    width = int(subject_ids.max() if vectorized else max(subject_ids)) + 1
+    n_semesters = int(semesters.max() if vectorized else max(semesters)) + 1
+    if vectorized:
+        lookup = np.full(max(int(enrollment_ids.max()), max(class_year_of, default=0)) + 1, -1,
+                         dtype=np.int64)
+        lookup[np.fromiter(class_year_of, dtype=np.int64)] = np.fromiter(class_year_of.values(), dtype=np.int64)
+        class_year = lookup[enrollment_ids]
+        known = class_year >= 0
+        codes = ((class_year * n_semesters + semesters) * width + subject_ids)[known]
+        scores = scores[known]
+    else:
+        codes, kept = array("q"), array("d")
+        for e, sem, sub, score in zip(enrollment_ids, semesters, subject_ids, scores):
+            class_year = class_year_of.get(e)
+            if class_year is not None:
+                codes.append((class_year * n_semesters + sem) * width + sub)
+                kept.append(score)
+        scores = kept
+
+    keys = {code: key for key, code in class_years.items()}
+    result = []
+    for code, stats in distributions(codes, scores, engine).items():
+        class_year, rest = divmod(code, n_semesters * width)
+        sem, subject_id = divmod(rest, width)
+        result.append({"class_id": keys[class_year][0], "academic_year": keys[class_year][1],
+                       "semester": sem, "subject_id": subject_id, **stats})
+    return result
+
+
+def compute(conn, class_id=None, academic_year=None, semester=None, subject_id=None, engine=None):
+    """Rapport complet, avec les noms de classes et de matières ; subject_id ne change que le classement."""
+    started = time.perf_counter()
+    rankings = student_rankings(conn, class_id, academic_year, semester, subject_id)
+    # Distribution des moyennes générales, même quand le classement porte sur une matière
+    averages = rankings if subject_id is None else student_rankings(conn, class_id, academic_year, semester)
+    classes = class_distributions(averages, engine)
+    subjects = subject_distributions(conn, class_id, academic_year, semester, engine)
+
+    class_names = dict(conn.execute("SELECT id, name FROM classes").fetchall())
+    subject_names = dict(conn.execute("SELECT id, name FROM subjects").fetchall())
+    for row in classes + rankings:
+        row["class_name"] = class_names.get(row["class_id"], f"#{row['class_id']}")
+    for row in subjects:
+        row["class_name"] = class_names.get(row["class_id"], f"#{row['class_id']}")
+        row["subject_name"] = subject_names.get(row["subject_id"], f"#{row['subject_id']}")
+    subjects.sort(key=lambda r: (r["class_name"], r["academic_year"] or "", r["semester"], r["subject_name"]))
+    classes.sort(key=lambda r: (r["class_name"], r["academic_year"] or ""))
+
+    return {
+        "filters": {"class_id": class_id, "academic_year": academic_year, "semester": semester,
+                    "subject_id": subject_id},
+        "histogram_labels": histogram_labels(),
+        "classes": classes,
+        "subjects": subjects,
+        "rankings": rankings,
+        "elapsed": round(time.perf_counter() - started, 3),
+    }
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Class and subject statistics")
+    parser.add_argument("command", choices=["report", "ranking"])
+    parser.add_argument("--db", default=os.path.join(base_dir, "database.db"))
+    parser.add_argument("--class-id", type=int)
+    parser.add_argument("--year")
+    parser.add_argument("--semester", type=int, choices=[1, 2])
+    parser.add_argument("--subject-id", type=int, help="rank on one subject instead of the average")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    conn.row_factory = sqlite3.Row
+    try:
+        if args.command == "ranking":
+            for r in student_rankings(conn, args.class_id, args.year, args.semester, args.subject_id):
+                print(f"{r['class_id']:>5} {r['academic_year'] or '':10s} {r['rank']:>4} "
+                      f"{r['average']:6.2f} {r['percentile']:6.1f}%  {r['student_name']}")
+            return 0
+        print(json.dumps(compute(conn, args.class_id, args.year, args.semester, args.subject_id), indent=2))
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,83 @@
+"""Saisie des notes en grille : une classe, une matière, un semestre.
+
+La liste des élèves est lue une fois (avec les notes existantes), toutes les
+cellules sont validées en une passe, puis les notes sont enregistrées dans une
+seule transaction : UPSERT sur l'index unique (enrollment_id, subject_id,
+semester) pour les cellules remplies, DELETE pour les cellules vidées.
+"""
+from collections import namedtuple
+
+from db import write_transaction
+
+MAX_SCORE = 20
+
+Entry = namedtuple("Entry", "enrollment_id student_name matricule result_id score")
+
+ROSTER_SQL = """
+    SELECT e.id, s.name, s.matricule, r.id, r.score
+    FROM enrollments e
+    JOIN students s ON s.id = e.student_id
+    LEFT JOIN results r ON r.enrollment_id = e.id AND r.subject_id = ? AND r.semester = ?
+    WHERE e.class_id = ? AND e.academic_year = ?
+    ORDER BY s.name
+"""
+
+UPSERT_SQL = """
+    INSERT INTO results (enrollment_id, subject_id, score, semester)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (enrollment_id, subject_id, semester)
+    DO UPDATE SET score = excluded.score WHERE score IS NOT excluded.score
+"""
+
+
+def roster(conn, class_id, subject_id, semester, academic_year):
+    return [Entry(*row) for row in conn.execute(ROSTER_SQL, (subject_id, semester, class_id, academic_year))]
+
+
+def parse_score(value):
+    """'' -> None ; accepte la virgule décimale ; ValueError si hors de 0..MAX_SCORE."""
+    value = (value or "").strip().replace(",", ".")
+    if not value:
+        return None
+    try:
+        score = float(value)
+    except ValueError:
+        raise ValueError("Enter a number")
+    if not 0 <= score <= MAX_SCORE:
+        raise ValueError(f"Score must be between 0 and {MAX_SCORE}")
+    return score
+
+
+def validate(entries, form):
+    """Une passe sur la grille : (changements, erreurs par enrollment_id).
+
+    Seules les cellules modifiées sont retenues : (enrollment_id, note ou None pour effacer).
+    """
+    changes, errors = [], {}
+    for entry in entries:
+        field = f"score_{entry.enrollment_id}"
+        if field not in form:
+            continue
+        try:
+            score = parse_score(form[field])
+        except ValueError as e:
+            errors[entry.enrollment_id] = str(e)
+            continue
+        if score is None and entry.result_id is None:
+            continue
+        if score != entry.score or entry.result_id is None:
+            changes.append((entry.enrollment_id, score))
+    return changes, errors
+
+
+def save(conn, subject_id, semester, changes):
+    """Enregistre les changements validés dans une transaction ; retourne (écrites, effacées)."""
+    upserts = [(enrollment_id, subject_id, score, semester) for enrollment_id, score in changes if score is not None]
+    deletes = [(enrollment_id, subject_id, semester) for enrollment_id, score in changes if score is None]
+
+    def work(c):
+        c.executemany(UPSERT_SQL, upserts)
+        c.executemany("DELETE FROM results WHERE enrollment_id = ? AND subject_id = ? AND semester = ?", deletes)
+
+    write_transaction(conn, work)
+    return len(upserts), len(deletes)
@@ -0,0 +1,422 @@
+"""Bulk import of students, enrollments and results from CSV or Excel files.
+
+Rows are read as a stream, validated a chunk at a time against the same
+uniqueness rules as the forms (matricule, class name + level,
+enrollment/subject/semester) and inserted with executemany, one transaction
+per chunk.
+
+    python importer.py students students.csv
+    python importer.py enrollments enrollments.xlsx --chunk-size 5000
+    python importer.py results results.csv --dry-run
+
+Columns:
+    students:    name, matricule, date_of_birth, gender
+    enrollments: matricule (or student_id), class_name + class_level (or class_id), academic_year
+    results:     enrollment_id (or matricule + academic_year), subject (or subject_id), score, semester
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import time
+from itertools import islice
+
+from db import write_transaction
+
+try:
+    import openpyxl
+except ImportError:  # Excel optionnel : pip install openpyxl
+    openpyxl = None
+
+DEFAULT_CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 500
+_IN_BATCH = 500
+FALLBACK_ENCODING = "cp1252"
+
+
+class ImportFileError(Exception):
+    pass
+
+
+class ImportReport:
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.rows_read = 0
+        self.inserted = 0
+        self.errors = []
+        self.error_count = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rows_per_second(self):
+        return self.rows_read / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "dataset": self.dataset,
+            "rows_read": self.rows_read,
+            "inserted": self.inserted,
+            "error_count": self.error_count,
+            "errors": [{"line": line, "message": message} for line, message in self.errors],
+            "elapsed": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+
+# --- Readers ---
+def read_csv(stream):
+    """stream : fichier texte ; produit (numéro de ligne, dict)."""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, {_normalize(k): (v or "").strip() for k, v in row.items() if k}
+
+
+def read_excel(path_or_stream):
+    if openpyxl is None:
+        raise ImportFileError("Excel import needs openpyxl (pip install openpyxl)")
+    workbook = openpyxl.load_workbook(path_or_stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_normalize(str(h or "")) for h in next(rows, [])]
+        for line, values in enumerate(rows, start=2):
+            if all(v is None for v in values):
+                continue
+            yield line, {h: ("" if v is None else str(v).strip()) for h, v in zip(header, values) if h}
+    finally:
+        workbook.close()
+
+
+def open_rows(filename, stream=None):
+    """Choisit le lecteur selon l'extension ; stream est un flux binaire optionnel."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in (".xlsx", ".xlsm"):
+        return read_excel(stream or filename)
+    if extension != ".csv":
+        raise ImportFileError(f"Unsupported file type '{extension}' (use .csv or .xlsx)")
+    if stream is None:
+        stream = open(filename, "rb")
+    return read_csv(_decode_lines(stream))
+
+
+def _decode_lines(stream):
+    """Lignes d'un flux binaire en UTF-8 ; une ligne qui n'en est pas est lue en Windows-1252,
+    l'encodage des CSV enregistrés par Excel (Zoé, Élise...)."""
+    for number, raw in enumerate(stream):
+        try:
+            line = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            line = raw.decode(FALLBACK_ENCODING, errors="replace")
+        yield line.lstrip("\ufeff") if number == 0 else line
+
+
+def _normalize(header):
+    return header.strip().lower().replace(" ", "_")
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _lookup(conn, sql, values):
+    """Exécute sql (avec un IN ({})) par paquets pour rester sous la limite de paramètres."""
+    values = list(values)
+    found = []
+    for i in range(0, len(values), _IN_BATCH):
+        batch = values[i:i + _IN_BATCH]
+        found.extend(conn.execute(sql.format(",".join("?" * len(batch))), batch).fetchall())
+    return found
+
+
+def _int(value, field):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an integer")
+
+
+# --- Datasets ---
+class StudentImporter:
+    table = "students"
+    insert_sql = "INSERT INTO students (name, matricule, date_of_birth, gender) VALUES (?, ?, ?, ?)"
+
+    @staticmethod
+    def key(values):
+        return values[1]
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.seen = set()
+
+    def prepare(self, chunk, report):
+        matricules = {row.get("matricule") for _, row in chunk if row.get("matricule")}
+        existing = {r[0] for r in _lookup(
+            self.conn, "SELECT matricule FROM students WHERE matricule IN ({})", matricules)}
+        params = []
+        for line, row in chunk:
+            name, matricule = row.get("name"), row.get("matricule")
+            if not name or not matricule:
+                report.error(line, "name and matricule are required")
+            elif matricule in existing or matricule in self.seen:
+                report.error(line, f"Matricule number already exists: {matricule}")
+            else:
+                self.seen.add(matricule)
+                params.append((name, matricule, row.get("date_of_birth") or None, row.get("gender") or None))
+        return params
+
+
+class EnrollmentImporter:
+    table = "enrollments"
+    insert_sql = "INSERT INTO enrollments (student_id, class_id, academic_year) VALUES (?, ?, ?)"
+
+    @staticmethod
+    def key(values):
+        return values
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.seen = set()
+        # Les classes sont identifiées par (nom, niveau), comme dans add_class
+        self.classes = {(r[1].lower(), r[2].lower()): r[0]
+                        for r in conn.execute("SELECT id, name, level FROM classes")}
+        self.class_ids = set(self.classes.values())
+
+    def _class_id(self, row):
+        if row.get("class_id"):
+            class_id = _int(row["class_id"], "class_id")
+            if class_id not in self.class_ids:
+                raise ValueError(f"Unknown class_id {class_id}")
+            return class_id
+        key = (row.get("class_name", "").lower(), row.get("class_level", "").lower())
+        if key not in self.classes:
+            raise ValueError(f"Unknown class {row.get('class_name')!r} level {row.get('class_level')!r}")
+        return self.classes[key]
+
+    def prepare(self, chunk, report):
+        matricules = {row["matricule"] for _, row in chunk if row.get("matricule")}
+        students = dict(_lookup(self.conn, "SELECT matricule, id FROM students WHERE matricule IN ({})",
+                                matricules))
+        ids = {row["student_id"] for _, row in chunk if row.get("student_id", "").isdigit()}
+        known_ids = {r[0] for r in _lookup(self.conn, "SELECT id FROM students WHERE id IN ({})", ids)}
+
+        candidates = []
+        for line, row in chunk:
+            try:
+                if row.get("student_id"):
+                    student_id = _int(row["student_id"], "student_id")
+                    if student_id not in known_ids:
+                        raise ValueError(f"Unknown student_id {student_id}")
+                elif row.get("matricule") in students:
+                    student_id = students[row["matricule"]]
+                else:
+                    raise ValueError(f"Unknown matricule {row.get('matricule')!r}")
+                class_id = self._class_id(row)
+                year = row.get("academic_year")
+                if not year:
+                    raise ValueError("academic_year is required")
+            except ValueError as e:
+                report.error(line, str(e))
+                continue
+            candidates.append((line, (student_id, class_id, year)))
+
+        existing = {tuple(r) for r in _lookup(self.conn, """
+            SELECT student_id, class_id, academic_year FROM enrollments WHERE student_id IN ({})
+        """, {c[1][0] for c in candidates})}
+        params = []
+        for line, key in candidates:
+            if key in existing or key in self.seen:
+                report.error(line, "Student is already enrolled in this class for this year")
+            else:
+                self.seen.add(key)
+                params.append(key)
+        return params
+
+
+class ResultImporter:
+    table = "results"
+    insert_sql = "INSERT INTO results (enrollment_id, subject_id, score, semester) VALUES (?, ?, ?, ?)"
+
+    @staticmethod
+    def key(values):
+        return values[0], values[1], values[3]
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.seen = set()
+        self.subjects_by_id = {}
+        self.subjects_by_name = {}
+        for subject_id, name, class_id in conn.execute("SELECT id, name, class_id FROM subjects"):
+            self.subjects_by_id[subject_id] = class_id
+            self.subjects_by_name.setdefault(name.lower(), []).append((subject_id, class_id))
+
+    def _subject_id(self, row, class_id):
+        if row.get("subject_id"):
+            subject_id = _int(row["subject_id"], "subject_id")
+            if subject_id not in self.subjects_by_id:
+                raise ValueError(f"Unknown subject_id {subject_id}")
+            return subject_id
+        matches = self.subjects_by_name.get(row.get("subject", "").lower(), [])
+        # Même nom de matière dans plusieurs classes : on prend celle de la classe de l'élève
+        in_class = [s for s, c in matches if c == class_id]
+        if len(in_class) == 1:
+            return in_class[0]
+        if len(matches) == 1:
+            return matches[0][0]
+        if not matches:
+            raise ValueError(f"Unknown subject {row.get('subject')!r}")
+        raise ValueError(f"Ambiguous subject {row.get('subject')!r}, use subject_id")
+
+    def prepare(self, chunk, report):
+        ids = {row["enrollment_id"] for _, row in chunk if row.get("enrollment_id", "").isdigit()}
+        by_id = dict(_lookup(self.conn, "SELECT id, class_id FROM enrollments WHERE id IN ({})", ids))
+        matricules = {row["matricule"] for _, row in chunk if row.get("matricule")}
+        by_student = {}
+        for enrollment_id, matricule, year, class_id in _lookup(self.conn, """
+            SELECT e.id, s.matricule, e.academic_year, e.class_id
+            FROM enrollments e JOIN students s ON e.student_id = s.id
+            WHERE s.matricule IN ({})
+        """, matricules):
+            by_student.setdefault((matricule, year), []).append((enrollment_id, class_id))
+
+        candidates = []
+        for line, row in chunk:
+            try:
+                if row.get("enrollment_id"):
+                    enrollment_id = _int(row["enrollment_id"], "enrollment_id")
+                    if enrollment_id not in by_id:
+                        raise ValueError(f"Unknown enrollment_id {enrollment_id}")
+                    class_id = by_id[enrollment_id]
+                else:
+                    found = by_student.get((row.get("matricule"), row.get("academic_year")), [])
+                    if len(found) != 1:
+                        raise ValueError("No unique enrollment for this matricule and academic_year"
+                                         if found else "No enrollment for this matricule and academic_year")
+                    enrollment_id, class_id = found[0]
+                subject_id = self._subject_id(row, class_id)
+                try:
+                    score = float(row.get("score", ""))
+                except ValueError:
+                    raise ValueError("score must be a number")
+                if not 0 <= score <= 20:
+                    raise ValueError("score must be between 0 and 20")
+                semester = _int(row.get("semester") or 1, "semester")
+                if semester not in (1, 2):
+                    raise ValueError("semester must be 1 or 2")
+            except ValueError as e:
+                report.error(line, str(e))
+                continue
+            candidates.append((line, (enrollment_id, subject_id, score, semester)))
+
+        existing = {tuple(r) for r in _lookup(self.conn, """
+            SELECT enrollment_id, subject_id, semester FROM results WHERE enrollment_id IN ({})
+        """, {c[1][0] for c in candidates})}
+        params = []
+        for line, values in candidates:
+            key = self.key(values)
+            if key in existing or key in self.seen:
+                report.error(line, "Result for this student/subject/semester already exists")
+            else:
+                self.seen.add(key)
+                params.append(values)
+        return params
+
+
+DATASETS = {
+    "students": StudentImporter,
+    "enrollments": EnrollmentImporter,
+    "results": ResultImporter,
+}
+
+
+class _ChunkErrors(list):
+    """Erreurs d'un paquet, reportées dans l'ImportReport une fois le paquet validé."""
+    def error(self, line, message):
+        self.append((line, message))
+
+
+def _write_chunk(conn, importer, chunk, report):
+    """Valide et insère un paquet dans la même transaction BEGIN IMMEDIATE : les doublons et
+    les clés étrangères sont vérifiés sous le verrou d'écriture, aucun autre writer ne peut
+    s'intercaler entre la vérification et l'insertion."""
+    added = []
+
+    def work(c):
+        # Tentative rejouée (verrou refusé) : les clés de la tentative annulée ne sont plus des doublons
+        importer.seen.difference_update(added)
+        errors = _ChunkErrors()
+        params = importer.prepare(chunk, errors)
+        added[:] = [importer.key(values) for values in params]
+        if params:
+            c.executemany(importer.insert_sql, params)
+        return params, errors
+
+    params, errors = write_transaction(conn, work)
+    for line, message in errors:
+        report.error(line, message)
+    return params
+
+
+def import_rows(conn, dataset, rows, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, progress=None):
+    """Valide et insère un flux de lignes (numéro, dict) ; retourne un ImportReport."""
+    if dataset not in DATASETS:
+        raise ImportFileError(f"Unknown dataset '{dataset}'")
+    importer = DATASETS[dataset](conn)
+    report = ImportReport(dataset)
+    for chunk in _chunks(rows, chunk_size):
+        report.rows_read += len(chunk)
+        if dry_run:
+            params = importer.prepare(chunk, report)
+        else:
+            params = _write_chunk(conn, importer, chunk, report)
+        report.inserted += len(params)
+        if progress:
+            progress(report)
+    return report.finish()
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Bulk import")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("file")
+    parser.add_argument("--db", default=os.path.join(base_dir, "database.db"))
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="validate only, insert nothing")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        report = import_rows(
+            conn, args.dataset, open_rows(args.file), args.chunk_size, args.dry_run,
+            progress=lambda r: print(f"\r{r.rows_read} rows read, {r.inserted} valid", end="", flush=True))
+    except ImportFileError as e:
+        print(e)
+        return 2
+    finally:
+        conn.close()
+
+    print()
+    for line, message in report.errors:
+        print(f"  line {line}: {message}")
+    verb = "validated" if args.dry_run else "inserted"
+    print(f"{report.inserted}/{report.rows_read} rows {verb}, {report.error_count} errors, "
+          f"{report.elapsed:.2f}s ({report.rows_per_second:.0f} rows/s)")
+    return 1 if report.error_count else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
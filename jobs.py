@@ -0,0 +1,377 @@
+"""Background jobs: a SQLite-backed queue and a pool of worker threads.
+
+Long operations (class bulletins, imports, exports, statistics rebuilds,
+timetable checks and generation) are queued in the jobs table and run by worker
+threads of the web process, or by `python jobs.py worker` in a process of its
+own, so a web worker returns at once and the UI polls /api/jobs/<id>.
+
+A worker claims the next job (highest priority, then oldest) with a single
+UPDATE ... RETURNING inside BEGIN IMMEDIATE, so threads and processes can share
+the table. A failing job is retried with exponential backoff up to its
+max_attempts; JobError fails it at once. Handlers report progress with
+ctx.progress(done, total, message), which is also where a cancellation is
+noticed. Running jobs send heartbeats; a job whose worker died is requeued.
+
+    python jobs.py worker --threads 4
+    python jobs.py list --status failed
+    python jobs.py purge --days 7
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+from db import write_transaction
+
+STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED = ("succeeded", "failed", "cancelled")
+PROGRESS_INTERVAL = 0.5  # secondes minimum entre deux écritures de progression
+
+Handler = namedtuple("Handler", "func max_attempts priority")
+_handlers = {}
+# Réveille les workers dès qu'un job est ajouté par ce processus
+_wakeup = threading.Event()
+
+CLAIM_SQL = """
+    UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?,
+                    started_at = ?, heartbeat_at = ?, progress = 0, message = NULL
+    WHERE id = (SELECT id FROM jobs WHERE status = 'queued' AND run_after <= ?
+                ORDER BY priority DESC, id LIMIT 1)
+    RETURNING id, kind, params, attempts, max_attempts
+"""
+
+COLUMNS = ("id, kind, params, status, priority, attempts, max_attempts, progress, message, "
+           "result, error, cancel_requested, created_by, worker, created_at, run_after, "
+           "started_at, heartbeat_at, finished_at")
+
+
+class JobError(Exception):
+    """Échec définitif : le job passe en 'failed' sans nouvel essai."""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def handler(kind, max_attempts=3, priority=0):
+    """Enregistre func(ctx, params) comme traitement des jobs `kind`."""
+    def decorator(func):
+        _handlers[kind] = Handler(func, max_attempts, priority)
+        return func
+    return decorator
+
+
+def kinds():
+    return sorted(_handlers)
+
+
+# --- File d'attente ---
+def submit(conn, kind, params=None, priority=None, max_attempts=None, created_by=None, delay=0):
+    if kind not in _handlers:
+        raise JobError(f"Unknown job kind '{kind}'")
+    spec = _handlers[kind]
+    now = time.time()
+    job_id = write_transaction(conn, lambda c: c.execute("""
+        INSERT INTO jobs (kind, params, priority, max_attempts, created_by, created_at, run_after)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (kind, json.dumps(params or {}), spec.priority if priority is None else priority,
+          max_attempts or spec.max_attempts, created_by, now, now + delay)).lastrowid)
+    _wakeup.set()
+    return job_id
+
+
+def as_dict(row):
+    job = dict(zip(COLUMNS.split(", "), row))
+    job["params"] = json.loads(job["params"] or "{}")
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    job["finished"] = job["status"] in FINISHED
+    return job
+
+
+def get(conn, job_id):
+    row = conn.execute(f"SELECT {COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return as_dict(row) if row else None
+
+
+def list_jobs(conn, status=None, kind=None, limit=50):
+    where, params = [], []
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if kind:
+        where.append("kind = ?")
+        params.append(kind)
+    sql = f"SELECT {COLUMNS} FROM jobs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return [as_dict(row) for row in conn.execute(sql + " ORDER BY id DESC LIMIT ?", params + [limit])]
+
+
+def cancel(conn, job_id):
+    """Un job en attente est annulé tout de suite ; un job en cours à sa prochaine progression."""
+    return write_transaction(conn, lambda c: c.execute("""
+        UPDATE jobs SET cancel_requested = 1,
+            status = CASE WHEN status = 'queued' THEN 'cancelled' ELSE status END,
+            finished_at = CASE WHEN status = 'queued' THEN ? ELSE finished_at END
+        WHERE id = ? AND status IN ('queued', 'running')
+    """, (time.time(), job_id)).rowcount) > 0
+
+
+def claim(conn, worker):
+    now = time.time()
+    rows = write_transaction(conn, lambda c: c.execute(CLAIM_SQL, (worker, now, now, now)).fetchall())
+    return rows[0] if rows else None
+
+
+def requeue_stale(conn, stale_after, retry_delay):
+    """Jobs 'running' sans heartbeat récent : leur worker a disparu."""
+    now = time.time()
+    return write_transaction(conn, lambda c: c.execute("""
+        UPDATE jobs SET
+            status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+            finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE ? END,
+            run_after = ?, error = 'worker lost (no heartbeat)'
+        WHERE status = 'running' AND heartbeat_at < ?
+    """, (now, now + retry_delay, now - stale_after)).rowcount)
+
+
+def purge(conn, files_dir, days):
+    """Supprime les jobs terminés depuis plus de `days` jours, et leurs fichiers."""
+    cutoff = time.time() - days * 86400
+    ids = [row[0] for row in conn.execute("SELECT id FROM jobs WHERE finished_at < ?", (cutoff,))]
+    for job_id in ids:
+        shutil.rmtree(os.path.join(files_dir, str(job_id)), ignore_errors=True)
+    if ids:
+        write_transaction(conn, lambda c: c.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,)))
+    return len(ids)
+
+
+# --- Exécution ---
+class JobContext:
+    def __init__(self, conn, job_id, kind, attempt, files_dir):
+        self.conn = conn
+        self.job_id = job_id
+        self.kind = kind
+        self.attempt = attempt
+        self.files_dir = os.path.join(files_dir, str(job_id))
+        self._last_progress = 0.0
+
+    def path(self, filename):
+        """Fichier de résultat du job, servi par /jobs/<id>/download."""
+        os.makedirs(self.files_dir, exist_ok=True)
+        return os.path.join(self.files_dir, filename)
+
+    def progress(self, done, total=None, message=None):
+        now = time.monotonic()
+        if now - self._last_progress < PROGRESS_INTERVAL and (total is None or done < total):
+            return
+        self._last_progress = now
+        fraction = min(done / total, 1.0) if total else 0.0
+        rows = write_transaction(self.conn, lambda c: c.execute("""
+            UPDATE jobs SET progress = ?, message = ?, heartbeat_at = ? WHERE id = ?
+            RETURNING cancel_requested
+        """, (fraction, message, time.time(), self.job_id)).fetchall())
+        if rows and rows[0][0]:
+            raise JobCancelled()
+
+
+def execute(conn, job, files_dir, retry_delay=5.0):
+    """Exécute un job réclamé et enregistre son issue."""
+    job_id, kind, params, attempts, max_attempts = job
+    status, result, error, run_after = "succeeded", None, None, None
+    try:
+        spec = _handlers.get(kind)
+        if spec is None:
+            raise JobError(f"No handler for job kind '{kind}'")
+        ctx = JobContext(conn, job_id, kind, attempts, files_dir)
+        result = spec.func(ctx, json.loads(params or "{}"))
+    except JobCancelled:
+        status = "cancelled"
+    except JobError as e:
+        status, error = "failed", str(e)
+    except Exception:
+        error = traceback.format_exc(limit=5)
+        if attempts < max_attempts:
+            # Nouvel essai plus tard : 5 s, 10 s, 20 s...
+            status, run_after = "queued", time.time() + retry_delay * 2 ** (attempts - 1)
+        else:
+            status = "failed"
+    # Un traitement réussi a pu laisser une transaction implicite ouverte
+    if conn.in_transaction:
+        if status == "succeeded":
+            conn.commit()
+        else:
+            conn.rollback()
+
+    now = time.time()
+    write_transaction(conn, lambda c: c.execute("""
+        UPDATE jobs SET status = ?, result = ?, error = ?,
+            progress = CASE WHEN ? = 'succeeded' THEN 1 ELSE progress END,
+            run_after = COALESCE(?, run_after),
+            finished_at = CASE WHEN ? = 'queued' THEN NULL ELSE ? END
+        WHERE id = ?
+    """, (status, None if result is None else json.dumps(result, default=str), error,
+          status, run_after, status, now, job_id)))
+    return status
+
+
+class WorkerPool:
+    """Threads qui vident la file ; un thread superviseur envoie les heartbeats,
+    remet en file les jobs orphelins et purge les anciens."""
+
+    def __init__(self, db_pool, files_dir, threads=2, poll_interval=2.0, heartbeat_interval=10.0,
+                 stale_after=60.0, retry_delay=5.0, retention_days=7):
+        self.db_pool = db_pool
+        self.files_dir = files_dir
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.retry_delay = retry_delay
+        self.retention_days = retention_days
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._running = {}  # thread -> job id
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._last_purge = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.threads):
+                self._threads.append(threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True))
+            self._threads.append(threading.Thread(target=self._supervise, name="job-supervisor", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        _wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run_next(self):
+        conn = self.db_pool.acquire()
+        try:
+            job = claim(conn, f"{self.name}/{threading.current_thread().name}")
+            if job is None:
+                return False
+            with self._lock:
+                self._running[threading.current_thread()] = job[0]
+            try:
+                execute(conn, job, self.files_dir, self.retry_delay)
+            finally:
+                with self._lock:
+                    self._running.pop(threading.current_thread(), None)
+            return True
+        finally:
+            self.db_pool.release(conn)
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                if self.run_next():
+                    continue
+            except Exception:
+                traceback.print_exc()
+            _wakeup.wait(self.poll_interval)
+            _wakeup.clear()
+
+    def _supervise(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.supervise()
+            except Exception:
+                traceback.print_exc()
+
+    def supervise(self):
+        conn = self.db_pool.acquire()
+        try:
+            with self._lock:
+                running = list(self._running.values())
+            if running:
+                write_transaction(conn, lambda c: c.execute(
+                    f"UPDATE jobs SET heartbeat_at = ? WHERE id IN ({', '.join('?' * len(running))})",
+                    [time.time()] + running))
+            if requeue_stale(conn, self.stale_after, self.retry_delay):
+                _wakeup.set()
+            if time.monotonic() - self._last_purge > 3600:
+                self._last_purge = time.monotonic()
+                purge(conn, self.files_dir, self.retention_days)
+        finally:
+            self.db_pool.release(conn)
+
+
+# --- Flask Integration ---
+_pool = None
+
+
+def init_app(app, db_pool):
+    """Pool de workers démarré à la première requête (pas au simple import de app.py)."""
+    global _pool
+    _pool = WorkerPool(
+        db_pool,
+        app.config["JOB_FILES_DIR"],
+        threads=app.config.get("JOB_WORKERS", 2),
+        poll_interval=app.config.get("JOB_POLL_INTERVAL", 2.0),
+        retention_days=app.config.get("JOB_RETENTION_DAYS", 7),
+    )
+    if _pool.threads:
+        app.before_request(_pool.start)
+    return _pool
+
+
+def get_pool():
+    return _pool
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Background jobs")
+    parser.add_argument("command", choices=["worker", "list", "purge"])
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--status", choices=STATUSES)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--days", type=float, default=7)
+    args = parser.parse_args(argv)
+
+    # Les traitements sont déclarés dans app.py, sur le module jobs importé (pas ce __main__) ;
+    # pas de workers dans le processus web importé
+    os.environ["JOB_WORKERS"] = "0"
+    from app import app, job_db_pool
+    import jobs
+
+    pool = jobs.WorkerPool(job_db_pool(args.threads), app.config["JOB_FILES_DIR"], threads=args.threads,
+                           poll_interval=app.config["JOB_POLL_INTERVAL"])
+    conn = pool.db_pool.acquire()
+    try:
+        if args.command == "list":
+            for job in jobs.list_jobs(conn, args.status, limit=args.limit):
+                print(f"{job['id']:6d} {job['kind']:20s} {job['status']:10s} {job['progress']:5.0%} "
+                      f"{job['attempts']}/{job['max_attempts']}  {job['message'] or job['error'] or ''}"[:160])
+            return 0
+        if args.command == "purge":
+            print(f"Purged {jobs.purge(conn, pool.files_dir, args.days)} jobs")
+            return 0
+    finally:
+        pool.db_pool.release(conn)
+
+    print(f"Worker {pool.name}: {args.threads} threads, handlers: {', '.join(jobs.kinds())}")
+    pool.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pool.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
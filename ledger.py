@@ -0,0 +1,120 @@
+"""Fee ledger: append-only payment transactions and per (student, class) balances.
+
+fee_transactions is never updated or deleted (triggers refuse it); corrections
+are 'adjustment' rows. fee_balances holds the running totals, maintained by the
+insert trigger of migration 5, so outstanding balances are index lookups.
+
+    python ledger.py check
+    python ledger.py rebuild
+"""
+import argparse
+import os
+import sqlite3
+
+KINDS = ("charge", "payment", "adjustment")
+TOLERANCE = 0.005
+
+EXPECTED_SQL = """
+    SELECT student_id, class_id,
+           SUM(CASE WHEN kind = 'payment' THEN 0 ELSE amount END) AS total_due,
+           SUM(CASE WHEN kind = 'payment' THEN amount ELSE 0 END) AS total_paid,
+           COUNT(*) AS transaction_count,
+           MAX(id) AS last_transaction_id
+    FROM fee_transactions
+    GROUP BY student_id, class_id
+"""
+
+
+def record(conn, student_id, class_id, kind, amount, payment_mode=None, note=None):
+    """Ajoute une écriture (dans la transaction de l'appelant) ; retourne son id."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown transaction kind '{kind}'")
+    if kind != "adjustment" and amount <= 0:
+        raise ValueError("Amount must be positive")
+    cursor = conn.execute("""
+        INSERT INTO fee_transactions (student_id, class_id, kind, amount, payment_mode, note)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (student_id, class_id, kind, amount, payment_mode, note))
+    return cursor.lastrowid
+
+
+def get_balance(conn, student_id, class_id):
+    return conn.execute("""
+        SELECT * FROM fee_balances WHERE student_id = ? AND class_id = ?
+    """, (student_id, class_id)).fetchone()
+
+
+def check(conn):
+    """Compare fee_balances à un recalcul complet depuis le grand livre."""
+    expected = {(r[0], r[1]): r[2:] for r in conn.execute(EXPECTED_SQL)}
+    actual = {
+        (r[0], r[1]): r[2:]
+        for r in conn.execute("""
+            SELECT student_id, class_id, total_due, total_paid, transaction_count, last_transaction_id
+            FROM fee_balances
+        """)
+    }
+    problems = []
+    for key in sorted(set(expected) | set(actual)):
+        want, got = expected.get(key), actual.get(key)
+        if want is None or got is None:
+            problems.append((key, want, got))
+        elif (abs(want[0] - got[0]) > TOLERANCE or abs(want[1] - got[1]) > TOLERANCE
+              or want[2:] != got[2:]):
+            problems.append((key, want, got))
+    return problems
+
+
+def rebuild(conn):
+    """Recalcule fee_balances depuis le grand livre. Upsert sur (student_id, class_id) :
+    les lignes existantes gardent leur id, seules celles sans écriture sont supprimées."""
+    with conn:
+        # WHERE true : sans lui, ON CONFLICT serait lu comme la contrainte d'une jointure
+        conn.execute(f"""
+            INSERT INTO fee_balances (student_id, class_id, total_due, total_paid, transaction_count,
+                                      last_transaction_id, last_payment_mode)
+            SELECT e.*, (SELECT payment_mode FROM fee_transactions t
+                         WHERE t.student_id = e.student_id AND t.class_id = e.class_id
+                           AND t.kind = 'payment' AND t.payment_mode IS NOT NULL
+                         ORDER BY t.id DESC LIMIT 1)
+            FROM ({EXPECTED_SQL}) e
+            WHERE true
+            ON CONFLICT (student_id, class_id) DO UPDATE SET
+                total_due = excluded.total_due,
+                total_paid = excluded.total_paid,
+                transaction_count = excluded.transaction_count,
+                last_transaction_id = excluded.last_transaction_id,
+                last_payment_mode = excluded.last_payment_mode
+        """)
+        conn.execute("""
+            DELETE FROM fee_balances
+            WHERE NOT EXISTS (SELECT 1 FROM fee_transactions t
+                              WHERE t.student_id = fee_balances.student_id
+                                AND t.class_id = fee_balances.class_id)
+        """)
+    return conn.execute("SELECT COUNT(*) FROM fee_balances").fetchone()[0]
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Fee ledger reconciliation")
+    parser.add_argument("command", choices=["check", "rebuild"])
+    parser.add_argument("--db", default=os.path.join(base_dir, "database.db"))
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.command == "rebuild":
+            print(f"Rebuilt {rebuild(conn)} balances")
+            return 0
+        problems = check(conn)
+        for (student_id, class_id), want, got in problems:
+            print(f"student {student_id} class {class_id}: ledger {want}, summary {got}")
+        print(f"{len(problems)} inconsistent balances")
+        return 1 if problems else 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
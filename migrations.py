@@ -0,0 +1,685 @@
+"""Versioned schema migrations.
+
+The applied version lives in PRAGMA user_version. Each migration runs in its own
+transaction together with the EXPLAIN QUERY PLAN checks of every migration applied
+so far, so an index that disappears (or a query that stops using it) rolls back.
+
+    python migrations.py status
+    python migrations.py upgrade
+    python migrations.py check
+"""
+import argparse
+import os
+import sqlite3
+from collections import namedtuple
+
+# checks: (sql, tables that must not be full-scanned)
+Migration = namedtuple("Migration", "version name sql checks")
+
+
+class MigrationError(Exception):
+    pass
+
+
+def search_sync_triggers(table, kind, code, label_sql, detail_sql):
+    """Triggers qui recopient une table dans les deux index FTS5 de recherche.
+
+    Le rowid FTS vaut id * 4 + code : une mise à jour supprime l'ancienne entrée
+    par rowid au lieu de parcourir tout l'index.
+    """
+    def insert(ref):
+        label = label_sql.format(ref=ref)
+        detail = detail_sql.format(ref=ref)
+        return "\n".join(
+            f"            INSERT INTO {index} (rowid, kind, ref_id, label, detail) "
+            f"VALUES ({ref}.id * 4 + {code}, '{kind}', {ref}.id, {label}, {detail});"
+            for index in ("search_words", "search_trigrams")
+        )
+
+    delete = "\n".join(
+        f"            DELETE FROM {index} WHERE rowid = OLD.id * 4 + {code};"
+        for index in ("search_words", "search_trigrams")
+    )
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN
+{insert("NEW")}
+        END;
+        CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN
+{delete}
+        END;
+        CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE ON {table} BEGIN
+{delete}
+{insert("NEW")}
+        END;
+    """
+
+
+# Remplissage complet des deux index de recherche depuis les tables sources
+# (migrations 3 et 8, search.rebuild)
+SEARCH_REBUILD_SQL = """
+        DELETE FROM search_words;
+        DELETE FROM search_trigrams;
+        INSERT INTO search_words (rowid, kind, ref_id, label, detail)
+            SELECT id * 4 + 1, 'student', id, name, matricule FROM students;
+        INSERT INTO search_words (rowid, kind, ref_id, label, detail)
+            SELECT id * 4 + 2, 'teacher', id, first_name || ' ' || last_name, COALESCE(profession, '')
+            FROM teachers;
+        INSERT INTO search_words (rowid, kind, ref_id, label, detail)
+            SELECT s.id * 4 + 3, 'subject', s.id, s.name, COALESCE(c.name, '')
+            FROM subjects s LEFT JOIN classes c ON s.class_id = c.id;
+        INSERT INTO search_trigrams (rowid, kind, ref_id, label, detail)
+            SELECT rowid, kind, ref_id, label, detail FROM search_words;
+"""
+
+
+def class_search_triggers():
+    """Le détail indexé d'une matière est le nom de sa classe : renommer ou supprimer
+    la classe réindexe ses matières (index idx_subjects_class)."""
+    def reindex(name):
+        return "\n".join(
+            f"""            DELETE FROM {index} WHERE rowid IN (SELECT id * 4 + 3 FROM subjects WHERE class_id = OLD.id);
+            INSERT INTO {index} (rowid, kind, ref_id, label, detail)
+                SELECT id * 4 + 3, 'subject', id, name, {name} FROM subjects WHERE class_id = OLD.id;"""
+            for index in ("search_words", "search_trigrams")
+        )
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS classes_search_au AFTER UPDATE OF name ON classes BEGIN
+{reindex("COALESCE(NEW.name, '')")}
+        END;
+        CREATE TRIGGER IF NOT EXISTS classes_search_ad AFTER DELETE ON classes BEGIN
+{reindex("''")}
+        END;
+    """
+
+
+# Tables lues par les caches versionnés (pages, fragments, listes de référence)
+VERSIONED_TABLES = ("classes", "subjects", "teachers", "rooms", "timetable", "students", "enrollments",
+                    "fee_balances")
+
+
+def table_version_triggers(tables):
+    """Triggers qui incrémentent table_versions à chaque écriture : la version suit aussi
+    le worker de jobs, les autres processus, l'archivage et la restauration."""
+    statements = []
+    for table in tables:
+        statements.append(f"INSERT OR IGNORE INTO table_versions (name) VALUES ('{table}');")
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            statements.append(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_version_{event[0].lower()} AFTER {event} ON {table} BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+        END;""")
+    return "\n".join(statements)
+
+
+MIGRATIONS = [
+    Migration(1, "baseline schema", """
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            matricule TEXT UNIQUE NOT NULL,
+            date_of_birth TEXT,
+            gender TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS classes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            level TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS teachers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            phone TEXT,
+            profession TEXT,
+            diploma TEXT,
+            country TEXT,
+            photo TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS subjects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            coefficient INTEGER NOT NULL,
+            class_id INTEGER,
+            teacher_id INTEGER,
+            FOREIGN KEY(class_id) REFERENCES classes(id),
+            FOREIGN KEY(teacher_id) REFERENCES teachers(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS enrollments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER,
+            class_id INTEGER,
+            academic_year TEXT,
+            FOREIGN KEY(student_id) REFERENCES students(id),
+            FOREIGN KEY(class_id) REFERENCES classes(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            enrollment_id INTEGER,
+            subject_id INTEGER,
+            score REAL,
+            semester INTEGER DEFAULT 1,
+            FOREIGN KEY(enrollment_id) REFERENCES enrollments(id),
+            FOREIGN KEY(subject_id) REFERENCES subjects(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS school_fees (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER,
+            class_id INTEGER,
+            total_fee REAL NOT NULL,
+            payment_method TEXT,
+            amount_paid REAL DEFAULT 0,
+            remaining_amount REAL,
+            status TEXT,
+            FOREIGN KEY(student_id) REFERENCES students(id),
+            FOREIGN KEY(class_id) REFERENCES classes(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS rooms (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            capacity INTEGER,
+            location TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS timetable (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_id INTEGER NOT NULL,
+            subject_id INTEGER NOT NULL,
+            teacher_id INTEGER NOT NULL,
+            room_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            FOREIGN KEY(class_id) REFERENCES classes(id),
+            FOREIGN KEY(subject_id) REFERENCES subjects(id),
+            FOREIGN KEY(teacher_id) REFERENCES teachers(id),
+            FOREIGN KEY(room_id) REFERENCES rooms(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS admins (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS fees (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            class_id INTEGER NOT NULL,
+            total_fee REAL NOT NULL,
+            amount_paid REAL DEFAULT 0,
+            payment_mode TEXT,
+            status TEXT DEFAULT 'Unpaid',
+            FOREIGN KEY(student_id) REFERENCES students(id),
+            FOREIGN KEY(class_id) REFERENCES classes(id)
+        );
+    """, []),
+
+    Migration(2, "foreign key and lookup indexes", """
+        -- Doublons saisis avant l'index unique (formulaires envoyés en parallèle) : on garde
+        -- la note la plus récente de chaque clé. Les clés incomplètes (NULL) ne sont pas des doublons
+        -- pour l'index et ne sont pas touchées
+        DELETE FROM results
+        WHERE enrollment_id IS NOT NULL AND subject_id IS NOT NULL AND semester IS NOT NULL
+          AND id NOT IN (
+              SELECT MAX(id) FROM results
+              WHERE enrollment_id IS NOT NULL AND subject_id IS NOT NULL AND semester IS NOT NULL
+              GROUP BY enrollment_id, subject_id, semester
+          );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_results_enrollment_subject_semester
+            ON results(enrollment_id, subject_id, semester);
+        CREATE INDEX IF NOT EXISTS idx_results_subject ON results(subject_id);
+
+        CREATE INDEX IF NOT EXISTS idx_enrollments_student ON enrollments(student_id);
+        CREATE INDEX IF NOT EXISTS idx_enrollments_class_year ON enrollments(class_id, academic_year);
+
+        CREATE INDEX IF NOT EXISTS idx_subjects_class ON subjects(class_id);
+        CREATE INDEX IF NOT EXISTS idx_subjects_teacher ON subjects(teacher_id);
+
+        CREATE INDEX IF NOT EXISTS idx_fees_student ON fees(student_id);
+        CREATE INDEX IF NOT EXISTS idx_fees_class ON fees(class_id);
+        CREATE INDEX IF NOT EXISTS idx_school_fees_student ON school_fees(student_id);
+        CREATE INDEX IF NOT EXISTS idx_school_fees_class ON school_fees(class_id);
+
+        CREATE INDEX IF NOT EXISTS idx_timetable_day_start ON timetable(day, start_time);
+        CREATE INDEX IF NOT EXISTS idx_timetable_class ON timetable(class_id);
+        CREATE INDEX IF NOT EXISTS idx_timetable_teacher ON timetable(teacher_id);
+        CREATE INDEX IF NOT EXISTS idx_timetable_room ON timetable(room_id);
+        CREATE INDEX IF NOT EXISTS idx_timetable_subject ON timetable(subject_id);
+
+        CREATE INDEX IF NOT EXISTS idx_classes_name_level ON classes(name, level);
+    """, [
+        ("SELECT id FROM results WHERE enrollment_id = ? AND subject_id = ? AND semester = ?",
+         ["results"]),
+        ("""SELECT sub.name, r.score, sub.coefficient FROM results r
+            JOIN subjects sub ON r.subject_id = sub.id
+            WHERE r.enrollment_id = ? AND r.semester = ?""", ["r", "sub"]),
+        ("SELECT id FROM results WHERE subject_id = ?", ["results"]),
+        ("SELECT id FROM enrollments WHERE student_id = ?", ["enrollments"]),
+        ("SELECT id FROM enrollments WHERE class_id = ? AND academic_year = ?", ["enrollments"]),
+        ("SELECT id FROM subjects WHERE class_id = ?", ["subjects"]),
+        ("SELECT id FROM subjects WHERE teacher_id = ?", ["subjects"]),
+        ("SELECT id FROM fees WHERE student_id = ?", ["fees"]),
+        ("SELECT id FROM fees WHERE class_id = ?", ["fees"]),
+        ("SELECT id FROM school_fees WHERE student_id = ?", ["school_fees"]),
+        ("SELECT id FROM school_fees WHERE class_id = ?", ["school_fees"]),
+        ("SELECT id FROM timetable WHERE day = ? ORDER BY start_time", ["timetable"]),
+        ("SELECT id FROM timetable WHERE teacher_id = ?", ["timetable"]),
+        ("SELECT id FROM timetable WHERE room_id = ?", ["timetable"]),
+        ("SELECT id FROM timetable WHERE class_id = ?", ["timetable"]),
+        ("SELECT id FROM classes WHERE name = ? AND level = ?", ["classes"]),
+    ]),
+
+    Migration(3, "full-text search index", """
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_words USING fts5(
+            kind UNINDEXED, ref_id UNINDEXED, label, detail,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_trigrams USING fts5(
+            kind UNINDEXED, ref_id UNINDEXED, label, detail,
+            tokenize = 'trigram'
+        );
+    """ + search_sync_triggers(
+        "students", "student", 1, "{ref}.name", "{ref}.matricule"
+    ) + search_sync_triggers(
+        "teachers", "teacher", 2, "{ref}.first_name || ' ' || {ref}.last_name",
+        "COALESCE({ref}.profession, '')"
+    ) + search_sync_triggers(
+        "subjects", "subject", 3, "{ref}.name",
+        "COALESCE((SELECT name FROM classes WHERE id = {ref}.class_id), '')"
+    ) + SEARCH_REBUILD_SQL, [
+        ("""SELECT * FROM students WHERE id IN (
+                SELECT ref_id FROM search_words WHERE search_words MATCH ? AND kind = 'student')""",
+         ["students"]),
+    ]),
+
+    Migration(4, "materialized enrollment averages", """
+        CREATE TABLE IF NOT EXISTS enrollment_averages (
+            enrollment_id INTEGER NOT NULL,
+            semester INTEGER NOT NULL,
+            weighted_sum REAL NOT NULL DEFAULT 0,
+            coeff_sum REAL NOT NULL DEFAULT 0,
+            result_count INTEGER NOT NULL DEFAULT 0,
+            average REAL GENERATED ALWAYS AS (weighted_sum / NULLIF(coeff_sum, 0)) VIRTUAL,
+            PRIMARY KEY (enrollment_id, semester),
+            FOREIGN KEY(enrollment_id) REFERENCES enrollments(id)
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS results_averages_ai AFTER INSERT ON results
+        WHEN NEW.score IS NOT NULL BEGIN
+            INSERT INTO enrollment_averages (enrollment_id, semester, weighted_sum, coeff_sum, result_count)
+            SELECT NEW.enrollment_id, NEW.semester, NEW.score * coefficient, coefficient, 1
+            FROM subjects WHERE id = NEW.subject_id
+            ON CONFLICT (enrollment_id, semester) DO UPDATE SET
+                weighted_sum = weighted_sum + excluded.weighted_sum,
+                coeff_sum = coeff_sum + excluded.coeff_sum,
+                result_count = result_count + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS results_averages_ad AFTER DELETE ON results
+        WHEN OLD.score IS NOT NULL BEGIN
+            UPDATE enrollment_averages SET
+                weighted_sum = weighted_sum - OLD.score * (SELECT coefficient FROM subjects WHERE id = OLD.subject_id),
+                coeff_sum = coeff_sum - (SELECT coefficient FROM subjects WHERE id = OLD.subject_id),
+                result_count = result_count - 1
+            WHERE enrollment_id = OLD.enrollment_id AND semester = OLD.semester
+              AND EXISTS (SELECT 1 FROM subjects WHERE id = OLD.subject_id);
+            DELETE FROM enrollment_averages
+            WHERE enrollment_id = OLD.enrollment_id AND semester = OLD.semester AND result_count <= 0;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS results_averages_au AFTER UPDATE OF enrollment_id, subject_id, score, semester
+        ON results BEGIN
+            UPDATE enrollment_averages SET
+                weighted_sum = weighted_sum - OLD.score * (SELECT coefficient FROM subjects WHERE id = OLD.subject_id),
+                coeff_sum = coeff_sum - (SELECT coefficient FROM subjects WHERE id = OLD.subject_id),
+                result_count = result_count - 1
+            WHERE enrollment_id = OLD.enrollment_id AND semester = OLD.semester
+              AND OLD.score IS NOT NULL
+              AND EXISTS (SELECT 1 FROM subjects WHERE id = OLD.subject_id);
+            DELETE FROM enrollment_averages
+            WHERE enrollment_id = OLD.enrollment_id AND semester = OLD.semester AND result_count <= 0;
+            INSERT INTO enrollment_averages (enrollment_id, semester, weighted_sum, coeff_sum, result_count)
+            SELECT NEW.enrollment_id, NEW.semester, NEW.score * coefficient, coefficient, 1
+            FROM subjects WHERE id = NEW.subject_id AND NEW.score IS NOT NULL
+            ON CONFLICT (enrollment_id, semester) DO UPDATE SET
+                weighted_sum = weighted_sum + excluded.weighted_sum,
+                coeff_sum = coeff_sum + excluded.coeff_sum,
+                result_count = result_count + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS subjects_averages_au AFTER UPDATE OF coefficient ON subjects
+        WHEN NEW.coefficient IS NOT OLD.coefficient BEGIN
+            UPDATE enrollment_averages SET
+                weighted_sum = weighted_sum + (NEW.coefficient - OLD.coefficient) * (
+                    SELECT SUM(r.score) FROM results r
+                    WHERE r.subject_id = NEW.id AND r.score IS NOT NULL
+                      AND r.enrollment_id = enrollment_averages.enrollment_id
+                      AND r.semester = enrollment_averages.semester),
+                coeff_sum = coeff_sum + (NEW.coefficient - OLD.coefficient) * (
+                    SELECT COUNT(r.score) FROM results r
+                    WHERE r.subject_id = NEW.id
+                      AND r.enrollment_id = enrollment_averages.enrollment_id
+                      AND r.semester = enrollment_averages.semester)
+            WHERE (enrollment_id, semester) IN (
+                SELECT enrollment_id, semester FROM results
+                WHERE subject_id = NEW.id AND score IS NOT NULL);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS subjects_averages_ad AFTER DELETE ON subjects BEGIN
+            UPDATE enrollment_averages SET
+                weighted_sum = weighted_sum - OLD.coefficient * (
+                    SELECT SUM(r.score) FROM results r
+                    WHERE r.subject_id = OLD.id AND r.score IS NOT NULL
+                      AND r.enrollment_id = enrollment_averages.enrollment_id
+                      AND r.semester = enrollment_averages.semester),
+                coeff_sum = coeff_sum - OLD.coefficient * (
+                    SELECT COUNT(r.score) FROM results r
+                    WHERE r.subject_id = OLD.id
+                      AND r.enrollment_id = enrollment_averages.enrollment_id
+                      AND r.semester = enrollment_averages.semester),
+                result_count = result_count - (
+                    SELECT COUNT(r.score) FROM results r
+                    WHERE r.subject_id = OLD.id
+                      AND r.enrollment_id = enrollment_averages.enrollment_id
+                      AND r.semester = enrollment_averages.semester)
+            WHERE (enrollment_id, semester) IN (
+                SELECT enrollment_id, semester FROM results
+                WHERE subject_id = OLD.id AND score IS NOT NULL);
+            DELETE FROM enrollment_averages WHERE result_count <= 0;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS enrollments_averages_ad AFTER DELETE ON enrollments BEGIN
+            DELETE FROM enrollment_averages WHERE enrollment_id = OLD.id;
+        END;
+
+        DELETE FROM enrollment_averages;
+        INSERT INTO enrollment_averages (enrollment_id, semester, weighted_sum, coeff_sum, result_count)
+        SELECT r.enrollment_id, r.semester, SUM(r.score * sub.coefficient), SUM(sub.coefficient), COUNT(*)
+        FROM results r
+        JOIN subjects sub ON r.subject_id = sub.id
+        JOIN enrollments e ON r.enrollment_id = e.id
+        WHERE r.score IS NOT NULL
+        GROUP BY r.enrollment_id, r.semester;
+    """, [
+        ("SELECT average FROM enrollment_averages WHERE enrollment_id = ?", ["enrollment_averages"]),
+    ]),
+
+    Migration(5, "fee ledger and balances", """
+        CREATE TABLE IF NOT EXISTS fee_transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            class_id INTEGER NOT NULL,
+            kind TEXT NOT NULL CHECK (kind IN ('charge', 'payment', 'adjustment')),
+            amount REAL NOT NULL CHECK (kind = 'adjustment' OR amount > 0),
+            payment_mode TEXT,
+            note TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(student_id) REFERENCES students(id),
+            FOREIGN KEY(class_id) REFERENCES classes(id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_fee_transactions_student_class
+            ON fee_transactions(student_id, class_id);
+        CREATE INDEX IF NOT EXISTS idx_fee_transactions_class ON fee_transactions(class_id);
+
+        -- Une ligne de synthèse par (élève, classe), tenue à jour par trigger
+        CREATE TABLE IF NOT EXISTS fee_balances (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            class_id INTEGER NOT NULL,
+            total_due REAL NOT NULL DEFAULT 0,
+            total_paid REAL NOT NULL DEFAULT 0,
+            transaction_count INTEGER NOT NULL DEFAULT 0,
+            last_transaction_id INTEGER,
+            last_payment_mode TEXT,
+            balance REAL GENERATED ALWAYS AS (round(total_due - total_paid, 2)) STORED,
+            status TEXT GENERATED ALWAYS AS (
+                CASE WHEN total_paid >= total_due THEN 'Paid'
+                     WHEN total_paid = 0 THEN 'Unpaid'
+                     ELSE 'Partial' END) VIRTUAL,
+            UNIQUE (student_id, class_id),
+            FOREIGN KEY(student_id) REFERENCES students(id),
+            FOREIGN KEY(class_id) REFERENCES classes(id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_fee_balances_balance ON fee_balances(balance);
+        CREATE INDEX IF NOT EXISTS idx_fee_balances_class ON fee_balances(class_id);
+
+        CREATE TRIGGER IF NOT EXISTS fee_transactions_no_update BEFORE UPDATE ON fee_transactions BEGIN
+            SELECT RAISE(ABORT, 'fee_transactions is append-only');
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS fee_transactions_no_delete BEFORE DELETE ON fee_transactions BEGIN
+            SELECT RAISE(ABORT, 'fee_transactions is append-only');
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS fee_transactions_balances_ai AFTER INSERT ON fee_transactions BEGIN
+            INSERT INTO fee_balances (student_id, class_id, total_due, total_paid, transaction_count,
+                                      last_transaction_id, last_payment_mode)
+            VALUES (NEW.student_id, NEW.class_id,
+                    CASE WHEN NEW.kind = 'payment' THEN 0 ELSE NEW.amount END,
+                    CASE WHEN NEW.kind = 'payment' THEN NEW.amount ELSE 0 END,
+                    1, NEW.id,
+                    CASE WHEN NEW.kind = 'payment' THEN NEW.payment_mode END)
+            ON CONFLICT (student_id, class_id) DO UPDATE SET
+                total_due = total_due + excluded.total_due,
+                total_paid = total_paid + excluded.total_paid,
+                transaction_count = transaction_count + 1,
+                last_transaction_id = excluded.last_transaction_id,
+                last_payment_mode = COALESCE(excluded.last_payment_mode, last_payment_mode);
+        END;
+
+        -- Reprise de l'existant : chaque fiche fees / school_fees devient une facturation + un paiement
+        INSERT INTO fee_transactions (student_id, class_id, kind, amount, note)
+        SELECT student_id, class_id, 'charge', total_fee, 'fees #' || id FROM fees
+        WHERE total_fee > 0 ORDER BY id;
+        INSERT INTO fee_transactions (student_id, class_id, kind, amount, payment_mode, note)
+        SELECT student_id, class_id, 'payment', amount_paid, payment_mode, 'fees #' || id FROM fees
+        WHERE amount_paid > 0 ORDER BY id;
+        INSERT INTO fee_transactions (student_id, class_id, kind, amount, note)
+        SELECT student_id, class_id, 'charge', total_fee, 'school_fees #' || id FROM school_fees
+        WHERE student_id IS NOT NULL AND class_id IS NOT NULL AND total_fee > 0 ORDER BY id;
+        INSERT INTO fee_transactions (student_id, class_id, kind, amount, payment_mode, note)
+        SELECT student_id, class_id, 'payment', amount_paid, payment_method, 'school_fees #' || id FROM school_fees
+        WHERE student_id IS NOT NULL AND class_id IS NOT NULL AND amount_paid > 0 ORDER BY id;
+    """, [
+        ("SELECT COUNT(*) FROM fee_balances WHERE balance > 0", ["fee_balances"]),
+        ("SELECT balance FROM fee_balances WHERE student_id = ? AND class_id = ?", ["fee_balances"]),
+        ("SELECT id FROM fee_balances WHERE class_id = ?", ["fee_balances"]),
+        ("SELECT * FROM fee_transactions WHERE student_id = ? AND class_id = ? ORDER BY id",
+         ["fee_transactions"]),
+    ]),
+    Migration(6, "background jobs", """
+        -- File d'attente des traitements longs (jobs.py) ; horodatages en secondes Unix
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL DEFAULT '{}',
+            status TEXT NOT NULL DEFAULT 'queued'
+                CHECK (status IN ('queued', 'running', 'succeeded', 'failed', 'cancelled')),
+            priority INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            progress REAL NOT NULL DEFAULT 0,
+            message TEXT,
+            result TEXT,
+            error TEXT,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            created_by TEXT,
+            worker TEXT,
+            created_at REAL NOT NULL,
+            run_after REAL NOT NULL,
+            started_at REAL,
+            heartbeat_at REAL,
+            finished_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(status, priority DESC, id);
+        CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs(finished_at);
+    """, [
+        ("SELECT id FROM jobs WHERE status = 'queued' AND run_after <= ? ORDER BY priority DESC, id LIMIT 1",
+         ["jobs"]),
+        ("SELECT id FROM jobs WHERE status = 'running' AND heartbeat_at < ?", ["jobs"]),
+        ("SELECT id FROM jobs WHERE finished_at < ?", ["jobs"]),
+    ]),
+    # Archivage par année (archive.py) : sélection des inscriptions d'une année sans parcours complet
+    Migration(7, "academic year index", """
+        CREATE INDEX IF NOT EXISTS idx_enrollments_year ON enrollments(academic_year);
+    """, [
+        ("SELECT id FROM enrollments WHERE academic_year = ?", ["enrollments"]),
+        ("SELECT id FROM results WHERE enrollment_id IN (SELECT id FROM enrollments WHERE academic_year = ?)",
+         ["enrollments", "results"]),
+    ]),
+    # Renommage de classe : les matières indexées portaient l'ancien nom ; réindexation complète
+    Migration(8, "search index follows class renames", class_search_triggers() + SEARCH_REBUILD_SQL, [
+        ("SELECT id FROM subjects WHERE class_id = ?", ["subjects"]),
+    ]),
+    # Clés des caches de pages : versions partagées entre processus (cache.table_versions)
+    Migration(9, "shared table versions", """
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+    """ + table_version_triggers(VERSIONED_TABLES), [
+        ("SELECT name, version FROM table_versions WHERE name IN (?, ?)", ["table_versions"]),
+    ]),
+    # conflicts.find : les créneaux du jour d'un enseignant, d'une salle ou d'une classe
+    # se lisent par index, sans parcourir tous les créneaux du jour
+    Migration(10, "per-resource timetable indexes", """
+        CREATE INDEX IF NOT EXISTS idx_timetable_teacher_day ON timetable(teacher_id, day, start_time);
+        CREATE INDEX IF NOT EXISTS idx_timetable_room_day ON timetable(room_id, day, start_time);
+        CREATE INDEX IF NOT EXISTS idx_timetable_class_day ON timetable(class_id, day, start_time);
+        -- Préfixes des nouveaux index : redondants
+        DROP INDEX IF EXISTS idx_timetable_teacher;
+        DROP INDEX IF EXISTS idx_timetable_room;
+        DROP INDEX IF EXISTS idx_timetable_class;
+    """, [
+        ("SELECT id FROM timetable WHERE (teacher_id = ? AND day = ?) OR (room_id = ? AND day = ?) "
+         "OR (class_id = ? AND day = ?)", ["timetable"]),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+# --- Helpers ---
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def query_plan(conn, sql):
+    params = [None] * sql.count("?")
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def find_scans(conn, sql, tables):
+    """Retourne les lignes du plan qui parcourent entièrement une des tables."""
+    problems = []
+    for detail in query_plan(conn, sql):
+        words = detail.split()
+        if words[0] == "SCAN" and words[1] in tables:
+            problems.append(detail)
+        elif "USE TEMP B-TREE FOR ORDER BY" in detail:
+            problems.append(detail)
+    return problems
+
+
+def run_checks(conn, version):
+    failures = []
+    for migration in MIGRATIONS:
+        if migration.version > version:
+            break
+        for sql, tables in migration.checks:
+            for detail in find_scans(conn, sql, tables):
+                failures.append((migration.version, " ".join(sql.split()), detail))
+    return failures
+
+
+# --- Runner ---
+def migrate(path, target=None, verbose=False):
+    target = LATEST_VERSION if target is None else target
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        for migration in MIGRATIONS:
+            if migration.version > target:
+                break
+            # BEGIN IMMEDIATE : deux workers qui démarrent ensemble ne migrent pas deux fois
+            conn.execute("BEGIN IMMEDIATE")
+            if get_version(conn) >= migration.version:
+                conn.execute("ROLLBACK")
+                continue
+            try:
+                for statement in split_statements(migration.sql):
+                    conn.execute(statement)
+                failures = run_checks(conn, migration.version)
+                if failures:
+                    raise MigrationError(format_failures(failures))
+                conn.execute(f"PRAGMA user_version = {migration.version}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if verbose:
+                print(f"Applied migration {migration.version}: {migration.name}")
+        return get_version(conn)
+    finally:
+        conn.close()
+
+
+def split_statements(script):
+    statements, buffer = [], ""
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            if buffer.strip():
+                statements.append(buffer.strip())
+            buffer = ""
+    if buffer.strip():
+        statements.append(buffer.strip())
+    return statements
+
+
+def format_failures(failures):
+    lines = ["Query plan regression:"]
+    for version, sql, detail in failures:
+        lines.append(f"  [migration {version}] {sql}\n      -> {detail}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Schema migrations")
+    parser.add_argument("command", choices=["status", "upgrade", "check"])
+    parser.add_argument("--db", default=os.path.join(base_dir, "database.db"))
+    parser.add_argument("--target", type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == "upgrade":
+        version = migrate(args.db, args.target, verbose=True)
+        print(f"Database at version {version} (latest {LATEST_VERSION})")
+        return 0
+
+    conn = sqlite3.connect(args.db)
+    try:
+        version = get_version(conn)
+        if args.command == "status":
+            for migration in MIGRATIONS:
+                state = "applied" if migration.version <= version else "pending"
+                print(f"{migration.version:3d}  {state:8s} {migration.name}")
+            return 0
+        failures = run_checks(conn, version)
+        if failures:
+            print(format_failures(failures))
+            return 1
+        print(f"All query plan checks pass at version {version}")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,121 @@
+"""Room occupancy bitmaps.
+
+Each (room, day) is an int whose bit n is set when the room is booked during the
+n-th quarter hour of the day. "Is room R free Tuesday 10:00-12:00" is then one
+AND against a precomputed mask, and a free-room search is one AND per room of
+sufficient capacity — no JOIN over the timetable.
+
+The bitmaps are built once from the timetable and updated slot by slot on
+timetable inserts and deletes.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+SLOT_MINUTES = 15
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+# Plage horaire prise comme 100 % pour les taux d'occupation
+SCHOOL_DAY = ("08:00", "17:00")
+SCHOOL_DAYS = DAYS[:5]
+
+
+def to_minutes(value):
+    hours, minutes = str(value).split(":")[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def mask(start, end):
+    """Bits des quarts d'heure couverts par [start, end) ; un quart entamé compte."""
+    first = to_minutes(start) // SLOT_MINUTES
+    last = -(-to_minutes(end) // SLOT_MINUTES)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+class RoomOccupancy:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rooms = {}          # id -> {"id", "name", "capacity", "location"}
+        self._by_capacity = []   # (capacity, id), trié
+        self.bits = {}           # (room_id, day) -> int
+        self._slots = {}         # timetable id -> (room_id, day)
+        self._intervals = {}     # (room_id, day) -> {timetable id: (start, end)}
+        self.loaded_at = None
+
+    def load(self, conn):
+        rooms = {row[0]: {"id": row[0], "name": row[1], "capacity": row[2], "location": row[3]}
+                 for row in conn.execute("SELECT id, name, capacity, location FROM rooms")}
+        slots, intervals, bits = {}, {}, {}
+        for entry_id, room_id, day, start, end in conn.execute(
+                "SELECT id, room_id, day, start_time, end_time FROM timetable"):
+            slots[entry_id] = (room_id, day)
+            intervals.setdefault((room_id, day), {})[entry_id] = (start, end)
+            bits[(room_id, day)] = bits.get((room_id, day), 0) | mask(start, end)
+        with self._lock:
+            self.rooms = rooms
+            self._by_capacity = sorted((room["capacity"] or 0, room_id) for room_id, room in rooms.items())
+            self.bits = bits
+            self._slots = slots
+            self._intervals = intervals
+            self.loaded_at = time.monotonic()
+        return self
+
+    def invalidate(self):
+        with self._lock:
+            self.loaded_at = None
+
+    def is_stale(self, ttl):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > ttl
+
+    # --- Mises à jour incrémentales ---
+    def add(self, entry_id, room_id, day, start, end):
+        with self._lock:
+            self._slots[entry_id] = (room_id, day)
+            self._intervals.setdefault((room_id, day), {})[entry_id] = (start, end)
+            self.bits[(room_id, day)] = self.bits.get((room_id, day), 0) | mask(start, end)
+
+    def remove(self, entry_id):
+        with self._lock:
+            key = self._slots.pop(entry_id, None)
+            if key is None:
+                return
+            intervals = self._intervals[key]
+            del intervals[entry_id]
+            # Deux créneaux peuvent se chevaucher : on recalcule le bitmap de ce (salle, jour)
+            bits = 0
+            for start, end in intervals.values():
+                bits |= mask(start, end)
+            self.bits[key] = bits
+
+    # --- Requêtes ---
+    def is_free(self, room_id, day, start, end):
+        return not self.bits.get((room_id, day), 0) & mask(start, end)
+
+    def free_rooms(self, day, start, end, min_capacity=0):
+        wanted = mask(start, end)
+        first = bisect_left(self._by_capacity, (min_capacity, -1))
+        return [
+            self.rooms[room_id]
+            for _, room_id in self._by_capacity[first:]
+            if not self.bits.get((room_id, day), 0) & wanted
+        ]
+
+    def busy_minutes(self, room_id, day, window_mask):
+        return bin(self.bits.get((room_id, day), 0) & window_mask).count("1") * SLOT_MINUTES
+
+    def utilization(self, days=SCHOOL_DAYS, window=SCHOOL_DAY):
+        """Taux d'occupation par salle : par jour et sur la semaine, dans la plage horaire `window`."""
+        day_minutes = to_minutes(window[1]) - to_minutes(window[0])
+        window_mask = mask(*window)
+        report = []
+        for room_id, room in sorted(self.rooms.items(), key=lambda item: item[1]["name"]):
+            per_day = {day: self.busy_minutes(room_id, day, window_mask) for day in days}
+            busy = sum(per_day.values())
+            report.append({
+                **room,
+                "busy_minutes": busy,
+                "per_day": {day: round(minutes / day_minutes, 3) for day, minutes in per_day.items()},
+                "week": round(busy / (day_minutes * len(days)), 3) if days else 0,
+            })
+        return report
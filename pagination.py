@@ -0,0 +1,69 @@
+from collections import namedtuple
+
+from flask import request, url_for
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+Page = namedtuple("Page", "rows next_cursor prev_cursor limit")
+
+
+def page_args():
+    """Lit ?after=, ?before= et ?limit= (bornée à MAX_PAGE_SIZE)."""
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    return {
+        "after": request.args.get("after", type=int),
+        "before": request.args.get("before", type=int),
+        "limit": limit,
+    }
+
+
+def keyset_paginate(conn, select_sql, where=None, params=(), key="id", key_field="id",
+                    after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+    """Pagination par clé (seek) sur une colonne unique et croissante.
+
+    Au lieu d'un OFFSET, on repart de la dernière clé vue : le coût d'une page
+    ne dépend pas de sa position dans la table.
+    """
+    clauses = list(where or [])
+    params = list(params)
+    if after is not None:
+        clauses.append(f"{key} > ?")
+        params.append(after)
+    elif before is not None:
+        clauses.append(f"{key} < ?")
+        params.append(before)
+
+    sql = select_sql
+    if clauses:
+        sql += " WHERE " + " AND ".join(f"({c})" for c in clauses)
+    sql += f" ORDER BY {key} {'DESC' if before is not None else 'ASC'} LIMIT ?"
+    rows = conn.execute(sql, params + [limit + 1]).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+    if not rows:
+        return Page(rows, None, None, limit)
+
+    if before is not None:
+        next_cursor = rows[-1][key_field]
+        prev_cursor = rows[0][key_field] if has_more else None
+    else:
+        next_cursor = rows[-1][key_field] if has_more else None
+        prev_cursor = rows[0][key_field] if after is not None else None
+    return Page(rows, next_cursor, prev_cursor, limit)
+
+
+def page_url(after=None, before=None):
+    """URL de la vue courante avec les mêmes filtres et un nouveau curseur."""
+    args = request.args.to_dict()
+    args.pop("after", None)
+    args.pop("before", None)
+    if after is not None:
+        args["after"] = after
+    if before is not None:
+        args["before"] = before
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
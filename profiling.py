@@ -0,0 +1,345 @@
+"""Request timing and SQL profiling.
+
+Every request records its wall time and template render time per route. A
+sample of requests (PROFILE_SAMPLE_RATE) also records each SQL statement run on
+the pooled connection: time spent in execute and fetches, rows returned, and the
+EXPLAIN QUERY PLAN of each distinct statement (taken once, the first time it is
+seen). Durations are kept in bounded windows of the most recent values, from
+which p50/p95/p99 are computed on demand.
+
+Exposed at /debug/perf (HTML or ?format=json) and /metrics (Prometheus text).
+With a slow-query log (slowlog.py, only when SLOW_QUERY_MS is set), every
+request is timed query by query and the statements above its threshold are
+logged, sampled or not; their plans are taken by the log thread.
+"""
+import atexit
+import math
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from flask import g, request, before_render_template, template_rendered
+
+import slowlog
+
+QUANTILES = (0.5, 0.95, 0.99)
+OTHER_QUERIES = "(other)"
+
+# Requêtes SQL du thread courant : une liste pendant une requête échantillonnée, sinon None
+_local = threading.local()
+
+
+def normalize(sql):
+    return " ".join(sql.split())
+
+
+# --- Connexion instrumentée ---
+class ProfiledCursor(sqlite3.Cursor):
+    """Curseur qui ajoute le temps des fetch et le nombre de lignes à sa requête."""
+    entry = None
+
+    def _timed(self, fetch, *args):
+        started = time.perf_counter()
+        rows = fetch(*args)
+        self.entry[2] += time.perf_counter() - started
+        return rows
+
+    def execute(self, sql, parameters=()):
+        queries = getattr(_local, "queries", None)
+        self.entry = [sql, parameters, 0.0, 0]
+        self._timed(super().execute, sql, parameters)
+        if queries is not None:
+            queries.append(self.entry)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        queries = getattr(_local, "queries", None)
+        self.entry = [sql, None, 0.0, 0]
+        self._timed(super().executemany, sql, seq_of_parameters)
+        if queries is not None:
+            queries.append(self.entry)
+        return self
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is not None:
+            self.entry[3] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        self.entry[3] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self.entry[3] += len(rows)
+        return rows
+
+    def __next__(self):
+        row = self._timed(super().__next__)
+        self.entry[3] += 1
+        return row
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connexion du pool : hors échantillon, execute() reste celui de sqlite3."""
+
+    def execute(self, sql, parameters=()):
+        if getattr(_local, "queries", None) is None:
+            return super().execute(sql, parameters)
+        return self.cursor(ProfiledCursor).execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if getattr(_local, "queries", None) is None:
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor(ProfiledCursor).executemany(sql, seq_of_parameters)
+
+
+# --- Fenêtres de mesures ---
+class Window:
+    """Compteur, somme et maximum depuis le démarrage ; quantiles sur les `size` dernières valeurs."""
+
+    def __init__(self, size):
+        self.values = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.values.append(value)
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantiles(self, qs=QUANTILES):
+        values = sorted(self.values)
+        if not values:
+            return {q: None for q in qs}
+        return {q: values[max(math.ceil(q * len(values)) - 1, 0)] for q in qs}
+
+    def snapshot(self):
+        data = {"count": self.count, "total": round(self.total, 6), "max": round(self.max, 6),
+                "avg": round(self.total / self.count, 6) if self.count else None}
+        for q, value in self.quantiles().items():
+            data[f"p{round(q * 100)}"] = None if value is None else round(value, 6)
+        return data
+
+
+class Profiler:
+    def __init__(self, sample_rate=0.1, window=1024, max_queries=500, slow_log=None):
+        self.sample_rate = sample_rate
+        self.slow_log = slow_log
+        self.window = window
+        self.max_queries = max_queries
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.routes = {}   # endpoint -> {"wall", "template", "sampled", "queries", "query_time"}
+        self.queries = {}  # SQL normalisé -> {"time": Window, "rows", "endpoints", "plan"}
+
+    def _route(self, endpoint):
+        route = self.routes.get(endpoint)
+        if route is None:
+            route = self.routes[endpoint] = {"wall": Window(self.window), "template": Window(self.window),
+                                             "sampled": 0, "queries": 0, "query_time": 0.0, "errors": 0}
+        return route
+
+    # --- Cycle de vie d'une requête ---
+    def start(self):
+        g.profile_started = time.perf_counter()
+        g.profile_template = 0.0
+        g.profile_sampled = random.random() < self.sample_rate
+        # Le journal des requêtes lentes a besoin du temps de chaque requête SQL
+        _local.queries = [] if g.profile_sampled or self.slow_log is not None else None
+
+    def finish(self, endpoint, status, conn=None):
+        queries, _local.queries = getattr(_local, "queries", None), None
+        started = g.pop("profile_started", None)
+        if started is None:
+            return
+        wall = time.perf_counter() - started
+        if queries and self.slow_log is not None:
+            self._log_slow(endpoint, queries)
+        if not g.pop("profile_sampled", False):
+            queries = None
+        new_plans = []
+        with self._lock:
+            route = self._route(endpoint or "(unmatched)")
+            route["wall"].add(wall)
+            route["template"].add(g.pop("profile_template", 0.0))
+            if status is None or status >= 500:
+                route["errors"] += 1
+            if queries is None:
+                return
+            route["sampled"] += 1
+            route["queries"] += len(queries)
+            for sql, params, elapsed, rows in queries:
+                route["query_time"] += elapsed
+                key = normalize(sql)
+                stats = self.queries.get(key)
+                if stats is None:
+                    if len(self.queries) >= self.max_queries:
+                        key, params = OTHER_QUERIES, None
+                        stats = self.queries.get(key)
+                    if stats is None:
+                        stats = self.queries[key] = {"time": Window(self.window), "rows": 0,
+                                                     "endpoints": set(), "plan": None}
+                        new_plans.append((key, sql, params))
+                stats["time"].add(elapsed)
+                stats["rows"] += rows
+                stats["endpoints"].add(endpoint)
+        # Plans hors verrou : EXPLAIN une seule fois par requête SQL distincte
+        if conn is not None:
+            for key, sql, params in new_plans:
+                if key != OTHER_QUERIES:
+                    self.queries[key]["plan"] = explain(conn, sql, params)
+
+    def _log_slow(self, endpoint, queries):
+        threshold = self.slow_log.threshold
+        for sql, params, elapsed, rows in queries:
+            if elapsed >= threshold:
+                self.slow_log.record(endpoint, sql, params, elapsed, rows)
+
+    def template_started(self, *args, **extra):
+        g.profile_render_started = time.perf_counter()
+
+    def template_finished(self, *args, **extra):
+        started = g.pop("profile_render_started", None)
+        if started is not None and "profile_template" in g:
+            g.profile_template += time.perf_counter() - started
+
+    # --- Rapports ---
+    def snapshot(self, top=50):
+        with self._lock:
+            routes = []
+            for endpoint, route in self.routes.items():
+                sampled = route["sampled"]
+                routes.append({
+                    "endpoint": endpoint,
+                    "wall": route["wall"].snapshot(),
+                    "template": route["template"].snapshot(),
+                    "errors": route["errors"],
+                    "sampled": sampled,
+                    "queries_per_request": round(route["queries"] / sampled, 2) if sampled else None,
+                    "query_time_per_request": round(route["query_time"] / sampled, 6) if sampled else None,
+                })
+            queries = [{"sql": sql, "time": stats["time"].snapshot(), "rows": stats["rows"],
+                        "endpoints": sorted(e or "(unmatched)" for e in stats["endpoints"]),
+                        "plan": stats["plan"]}
+                       for sql, stats in self.queries.items()]
+        routes.sort(key=lambda r: r["wall"]["total"], reverse=True)
+        queries.sort(key=lambda q: q["time"]["total"], reverse=True)
+        return {"sample_rate": self.sample_rate, "window": self.window,
+                "slow_query_ms": None if self.slow_log is None else self.slow_log.threshold * 1000,
+                "slow_queries_logged": None if self.slow_log is None else self.slow_log.logged,
+                "uptime": round(time.time() - self.started_at, 1),
+                "routes": routes, "queries": queries[:top]}
+
+    def metrics(self):
+        """Temps par route au format texte Prometheus (summary avec quantiles)."""
+        lines = []
+        with self._lock:
+            routes = sorted(self.routes.items())
+            for name, field, help_text in (
+                    ("http_request_duration_seconds", "wall", "Request wall time"),
+                    ("http_template_render_seconds", "template", "Template render time")):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} summary")
+                for endpoint, route in routes:
+                    window = route[field]
+                    label = f'endpoint="{endpoint}"'
+                    for q, value in window.quantiles().items():
+                        if value is not None:
+                            lines.append(f'{name}{{{label},quantile="{q}"}} {value:.6f}')
+                    lines.append(f"{name}_sum{{{label}}} {window.total:.6f}")
+                    lines.append(f"{name}_count{{{label}}} {window.count}")
+            lines.append("# TYPE http_request_errors counter")
+            for endpoint, route in routes:
+                lines.append(f'http_request_errors_total{{endpoint="{endpoint}"}} {route["errors"]}')
+            lines.append("# TYPE db_sampled_requests counter")
+            lines.append("# TYPE db_sampled_queries counter")
+            lines.append("# TYPE db_sampled_query_seconds counter")
+            for endpoint, route in routes:
+                label = f'endpoint="{endpoint}"'
+                lines.append(f"db_sampled_requests_total{{{label}}} {route['sampled']}")
+                lines.append(f"db_sampled_queries_total{{{label}}} {route['queries']}")
+                lines.append(f"db_sampled_query_seconds_total{{{label}}} {route['query_time']:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+def explain(conn, sql, params):
+    """Plan d'exécution d'une lecture, sous forme de lignes indentées."""
+    if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    try:
+        rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params or ()).fetchall()
+    except sqlite3.Error as e:
+        return [f"(no plan: {e})"]
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return lines
+
+
+def plan_reader(db_path):
+    """explain() sur une connexion en lecture seule, ouverte par le thread qui l'appelle
+    (celui du journal des requêtes lentes). Les tables et vues TEMP d'une connexion du
+    pool n'y sont pas visibles : leur plan est remplacé par le message d'erreur."""
+    conn = None
+
+    def read(sql, params):
+        nonlocal conn
+        if conn is None:
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        return explain(conn, sql, params)
+    return read
+
+
+# --- Flask Integration ---
+_profiler = None
+
+
+def init_app(app):
+    global _profiler
+    slow_log = None
+    if app.config.get("SLOW_QUERY_MS"):
+        slow_log = slowlog.SlowQueryLog(
+            app.config["SLOW_QUERY_LOG"],
+            threshold=app.config["SLOW_QUERY_MS"] / 1000,
+            max_bytes=app.config.get("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024),
+            backups=app.config.get("SLOW_QUERY_LOG_BACKUPS", 5),
+            explain=plan_reader(app.config["DB_PATH"]),
+        )
+        atexit.register(slow_log.close)
+    _profiler = Profiler(
+        sample_rate=app.config.get("PROFILE_SAMPLE_RATE", 0.1),
+        window=app.config.get("PROFILE_WINDOW", 1024),
+        max_queries=app.config.get("PROFILE_MAX_QUERIES", 500),
+        slow_log=slow_log,
+    )
+
+    @app.before_request
+    def _start_profile():
+        _profiler.start()
+
+    @app.after_request
+    def _profile_status(response):
+        g.profile_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_profile(exc=None):
+        _profiler.finish(request.endpoint, g.pop("profile_status", None), g.get("db"))
+
+    before_render_template.connect(_profiler.template_started, app)
+    template_rendered.connect(_profiler.template_finished, app)
+    return _profiler
+
+
+def get_profiler():
+    return _profiler
@@ -0,0 +1,72 @@
+"""Reference data for dropdowns: classes, teachers, subjects, rooms, students.
+
+Each lookup set is loaded once into a tuple of namedtuples and served from memory
+until a write bumps the version of one of its tables (cache.invalidate_tables),
+or its TTL expires (writes made by another process). The student list is only
+kept up to a limit; above it the forms search students through /api/search.
+"""
+from collections import namedtuple
+
+from cache import TTLCache, table_versions
+
+Lookup = namedtuple("Lookup", "sql fields tables")
+
+LOOKUPS = {
+    "classes": Lookup("SELECT id, name, level FROM classes ORDER BY name, level",
+                      "id name level", ("classes",)),
+    "teachers": Lookup("SELECT id, first_name, last_name, profession FROM teachers ORDER BY first_name, last_name",
+                       "id first_name last_name profession", ("teachers",)),
+    "subjects": Lookup("SELECT id, name, coefficient, class_id, teacher_id FROM subjects ORDER BY name",
+                       "id name coefficient class_id teacher_id", ("subjects",)),
+    "rooms": Lookup("SELECT id, name, capacity, location FROM rooms ORDER BY name",
+                    "id name capacity location", ("rooms",)),
+    # Classe de la dernière inscription, pour présélectionner la classe dans les formulaires
+    "students": Lookup("""
+        SELECT s.id, s.name, s.matricule,
+               (SELECT e.class_id FROM enrollments e WHERE e.student_id = s.id
+                ORDER BY e.id DESC LIMIT 1) AS class_id
+        FROM students s ORDER BY s.name LIMIT ?
+    """, "id name matricule class_id", ("students", "enrollments")),
+    # Montant moyen facturé par classe, proposé par défaut dans le formulaire de frais
+    "class_fees": Lookup("""
+        SELECT c.id, c.name, c.level, f.fee
+        FROM classes c
+        LEFT JOIN (
+            SELECT class_id, AVG(total_due) AS fee FROM fee_balances GROUP BY class_id
+        ) f ON c.id = f.class_id
+        ORDER BY c.name
+    """, "id name level fee", ("classes", "fee_balances")),
+}
+
+
+class ReferenceData:
+    def __init__(self, ttl=300.0, student_limit=500):
+        self.student_limit = student_limit
+        self._caches = {
+            name: TTLCache(f"reference:{name}", ttl=ttl, tables=lookup.tables)
+            for name, lookup in LOOKUPS.items()
+        }
+        self._types = {
+            name: namedtuple(name.title().replace("_", ""), lookup.fields)
+            for name, lookup in LOOKUPS.items()
+        }
+
+    def get(self, conn, name):
+        """Tuple de lignes ; la clé inclut les versions des tables, donc un chargement
+        concurrent d'une écriture ne peut pas masquer la nouvelle version."""
+        lookup = LOOKUPS[name]
+        return self._caches[name].get_or_set(table_versions(lookup.tables, conn),
+                                             lambda: self._load(conn, name))
+
+    def _load(self, conn, name):
+        params = (self.student_limit + 1,) if name == "students" else ()
+        make = self._types[name]._make
+        return tuple(make(row) for row in conn.execute(LOOKUPS[name].sql, params))
+
+    def students(self, conn):
+        """Liste complète des élèves, ou None au-delà de student_limit (recherche à la place)."""
+        rows = self.get(conn, "students")
+        return None if len(rows) > self.student_limit else rows
+
+    def subjects_of(self, conn, class_id=None):
+        return tuple(s for s in self.get(conn, "subjects") if class_id is None or s.class_id == class_id)
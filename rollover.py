@@ -0,0 +1,244 @@
+"""Year-end roll-over: re-enroll a whole academic year into the next one.
+
+Each source class is mapped to a target class (unmapped classes are left out).
+The candidates are selected by one query, then written set-based in a single
+transaction: INSERT ... SELECT into enrollments and, when a student changes
+class, the outstanding fee balance is moved with two ledger rows (an
+adjustment closing the old class, a charge opening the new one). Students
+already enrolled in the target year, or in several mapped classes of the
+source year, are reported and skipped.
+
+    python rollover.py --from 2024-2025 --to 2025-2026 --map 1:2 --map 2:3 --dry-run
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+from db import write_transaction
+from ledger import TOLERANCE
+
+MAX_REPORTED_CONFLICTS = 100
+
+# Paramètres : couples (source, cible) du mapping, année cible, seuil de solde, année source
+CANDIDATES_SQL = """
+    WITH map (source_class_id, target_class_id) AS (VALUES {values})
+    SELECT e.student_id, s.name AS student_name, e.class_id AS source_class_id, m.target_class_id,
+           CASE WHEN COUNT(*) OVER (PARTITION BY e.student_id) > 1
+                    THEN 'enrolled in several source classes'
+                WHEN EXISTS (SELECT 1 FROM enrollments t
+                             WHERE t.student_id = e.student_id AND t.academic_year = ?)
+                    THEN 'already enrolled in the target year'
+           END AS conflict,
+           CASE WHEN m.target_class_id != e.class_id AND b.balance > ? THEN b.balance ELSE 0 END AS carried
+    FROM enrollments e
+    JOIN map m ON m.source_class_id = e.class_id
+    JOIN students s ON s.id = e.student_id
+    LEFT JOIN fee_balances b ON b.student_id = e.student_id AND b.class_id = e.class_id
+    WHERE e.academic_year = ?
+"""
+
+SUMMARY_SQL = """
+    SELECT c.source_class_id, sc.name, c.target_class_id, tc.name,
+           COUNT(*), SUM(c.conflict IS NULL),
+           SUM(c.conflict IS NULL AND c.carried > 0), TOTAL(CASE WHEN c.conflict IS NULL THEN c.carried END)
+    FROM {source} c
+    JOIN classes sc ON sc.id = c.source_class_id
+    JOIN classes tc ON tc.id = c.target_class_id
+    GROUP BY c.source_class_id, c.target_class_id
+    ORDER BY sc.name
+"""
+
+CONFLICTS_SQL = """
+    SELECT c.student_id, c.student_name, sc.name, c.conflict
+    FROM {source} c
+    JOIN classes sc ON sc.id = c.source_class_id
+    WHERE c.conflict IS NOT NULL
+    ORDER BY c.student_name
+"""
+
+
+class RolloverError(Exception):
+    pass
+
+
+class RolloverReport:
+    def __init__(self, source_year, target_year, dry_run):
+        self.source_year = source_year
+        self.target_year = target_year
+        self.dry_run = dry_run
+        self.classes = []
+        self.conflicts = []
+        self.conflict_count = 0
+        self.enrolled = 0
+        self.balances_carried = 0
+        self.amount_carried = 0.0
+        self.timings = {}
+        self.started = time.perf_counter()
+
+    def step(self, name, since):
+        now = time.perf_counter()
+        self.timings[name] = now - since
+        return now
+
+    def finish(self):
+        self.timings["total"] = time.perf_counter() - self.started
+        return self
+
+    def as_dict(self):
+        return {
+            "source_year": self.source_year,
+            "target_year": self.target_year,
+            "dry_run": self.dry_run,
+            "classes": self.classes,
+            "enrolled": self.enrolled,
+            "balances_carried": self.balances_carried,
+            "amount_carried": round(self.amount_carried, 2),
+            "conflict_count": self.conflict_count,
+            "conflicts": self.conflicts,
+            "timings": {name: round(value, 4) for name, value in self.timings.items()},
+        }
+
+
+def years(conn):
+    return [row[0] for row in conn.execute(
+        "SELECT DISTINCT academic_year FROM enrollments WHERE academic_year IS NOT NULL ORDER BY academic_year DESC")]
+
+
+def next_year(year):
+    """'2024-2025' -> '2025-2026' ; None si le format n'est pas reconnu."""
+    try:
+        start, end = (int(part) for part in year.split("-"))
+    except (AttributeError, ValueError):
+        return None
+    return f"{start + 1}-{end + 1}"
+
+
+def _check(conn, source_year, target_year, mapping):
+    if not source_year or not target_year:
+        raise RolloverError("Choose a source and a target academic year")
+    if source_year == target_year:
+        raise RolloverError("The target year must differ from the source year")
+    if not mapping:
+        raise RolloverError("Map at least one class")
+    wanted = set(mapping) | set(mapping.values())
+    known = {row[0] for row in conn.execute(
+        f"SELECT id FROM classes WHERE id IN ({', '.join('?' * len(wanted))})", list(wanted))}
+    if wanted - known:
+        raise RolloverError(f"Unknown class ids: {', '.join(map(str, sorted(wanted - known)))}")
+
+
+def _candidates(mapping, source_year, target_year, carry_fees):
+    pairs = sorted(mapping.items())
+    sql = CANDIDATES_SQL.format(values=", ".join("(?, ?)" for _ in pairs))
+    # Seuil NULL : "balance > NULL" n'est jamais vrai, aucun solde n'est reporté
+    threshold = TOLERANCE if carry_fees else None
+    params = [value for pair in pairs for value in pair] + [target_year, threshold, source_year]
+    return sql, params
+
+
+def _summarize(conn, report, source, params=()):
+    report.classes, report.conflicts, report.conflict_count = [], [], 0
+    report.enrolled, report.balances_carried, report.amount_carried = 0, 0, 0.0
+    for row in conn.execute(SUMMARY_SQL.format(source=source), params):
+        report.classes.append({
+            "source_class_id": row[0], "source_class": row[1], "target_class_id": row[2], "target_class": row[3],
+            "students": row[4], "enrolled": row[5], "balances_carried": row[6], "amount_carried": round(row[7], 2),
+        })
+        report.enrolled += row[5]
+        report.balances_carried += row[6]
+        report.amount_carried += row[7]
+    for row in conn.execute(CONFLICTS_SQL.format(source=source), params):
+        report.conflict_count += 1
+        if len(report.conflicts) < MAX_REPORTED_CONFLICTS:
+            report.conflicts.append({"student_id": row[0], "student": row[1], "class": row[2], "reason": row[3]})
+
+
+def rollover(conn, source_year, target_year, mapping, carry_fees=True, dry_run=False):
+    """mapping : {classe source: classe cible}. Tout ou rien ; dry_run n'écrit rien."""
+    mapping = {int(source): int(target) for source, target in mapping.items() if target}
+    _check(conn, source_year, target_year, mapping)
+    report = RolloverReport(source_year, target_year, dry_run)
+    sql, params = _candidates(mapping, source_year, target_year, carry_fees)
+
+    if dry_run:
+        _summarize(conn, report, f"({sql})", params)
+        report.step("plan", report.started)
+        return report.finish()
+
+    def work(c):
+        # Candidats figés dans une table temporaire : les écritures qui suivent
+        # modifient enrollments et fee_balances, que la requête de sélection lit
+        c.execute("DROP TABLE IF EXISTS temp.rollover_candidates")
+        c.execute(f"CREATE TEMP TABLE rollover_candidates AS {sql}", params)
+        since = report.step("plan", report.started)
+        c.execute("""
+            INSERT INTO fee_transactions (student_id, class_id, kind, amount, note)
+            SELECT r.student_id, r.target_class_id, 'charge', r.carried,
+                   'Balance carried forward from ' || sc.name || ' (' || ? || ')'
+            FROM rollover_candidates r JOIN classes sc ON sc.id = r.source_class_id
+            WHERE r.conflict IS NULL AND r.carried > 0
+            ORDER BY r.student_id
+        """, (source_year,))
+        c.execute("""
+            INSERT INTO fee_transactions (student_id, class_id, kind, amount, note)
+            SELECT r.student_id, r.source_class_id, 'adjustment', -r.carried,
+                   'Balance carried forward to ' || tc.name || ' (' || ? || ')'
+            FROM rollover_candidates r JOIN classes tc ON tc.id = r.target_class_id
+            WHERE r.conflict IS NULL AND r.carried > 0
+            ORDER BY r.student_id
+        """, (target_year,))
+        since = report.step("fees", since)
+        c.execute("""
+            INSERT INTO enrollments (student_id, class_id, academic_year)
+            SELECT student_id, target_class_id, ? FROM rollover_candidates
+            WHERE conflict IS NULL
+            ORDER BY target_class_id, student_name
+        """, (target_year,))
+        since = report.step("enrollments", since)
+        _summarize(c, report, "temp.rollover_candidates")
+        c.execute("DROP TABLE temp.rollover_candidates")
+
+    write_transaction(conn, work)
+    return report.finish()
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Roll enrollments over to the next academic year")
+    parser.add_argument("--db", default=os.environ.get("DB_PATH", os.path.join(base_dir, "database.db")))
+    parser.add_argument("--from", dest="source_year", required=True)
+    parser.add_argument("--to", dest="target_year")
+    parser.add_argument("--map", action="append", default=[], metavar="SOURCE:TARGET",
+                        help="class id mapping, repeatable")
+    parser.add_argument("--no-fees", action="store_true", help="do not carry fee balances forward")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    try:
+        mapping = dict(tuple(int(part) for part in pair.split(":")) for pair in args.map)
+    except ValueError:
+        parser.error("--map expects SOURCE:TARGET class ids")
+    conn = sqlite3.connect(args.db)
+    try:
+        report = rollover(conn, args.source_year, args.target_year or next_year(args.source_year), mapping,
+                          carry_fees=not args.no_fees, dry_run=args.dry_run)
+    except RolloverError as e:
+        print(e)
+        return 1
+    finally:
+        conn.close()
+    for line in report.classes:
+        print(f"{line['source_class']:>20s} -> {line['target_class']:<20s} {line['enrolled']:6d} / "
+              f"{line['students']:<6d} balances {line['balances_carried']:5d} ({line['amount_carried']:.2f})")
+    for conflict in report.conflicts:
+        print(f"  skipped {conflict['student']} ({conflict['class']}): {conflict['reason']}")
+    verb = "would be enrolled" if args.dry_run else "enrolled"
+    print(f"{report.enrolled} students {verb} in {report.target_year}, {report.conflict_count} skipped, "
+          f"{report.balances_carried} balances carried ({report.amount_carried:.2f})")
+    print("  ".join(f"{name} {value * 1000:.1f} ms" for name, value in report.timings.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,347 @@
+"""Automatic weekly timetable generation.
+
+Each subject with a class and a teacher gets `coefficient * hours_per_coefficient`
+one-hour lessons a week. Lessons are placed on a (day, period) grid in a room
+large enough for the class (enrollment count), with no teacher, class or room
+booked twice at the same time.
+
+The solver places the most constrained lessons first (greedy with forward
+checking), then repairs the remaining conflicts with min-conflicts local search
+and spends the rest of the time budget spreading each subject over the week.
+Independent restarts run in a process pool; the best schedule wins.
+
+    python scheduler.py solve --budget 10 --workers 4
+    python scheduler.py solve --year 2024-2025 --apply
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from db import write_transaction
+
+DEFAULT_DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday")
+DEFAULT_PERIODS = ("08:00", "09:00", "10:00", "11:00", "13:00", "14:00", "15:00", "16:00")
+LESSON_MINUTES = 60
+HARD = 1000  # poids d'un conflit dur face à une pénalité de répartition
+
+Lesson = namedtuple("Lesson", "subject_id class_id teacher_id size per_day")
+Problem = namedtuple("Problem", "lessons rooms days periods warnings")
+Solution = namedtuple("Solution", "placements hard soft conflicts seed iterations")
+
+
+class SchedulerError(Exception):
+    pass
+
+
+def _end_time(start):
+    hours, minutes = map(int, start.split(":"))
+    total = hours * 60 + minutes + LESSON_MINUTES
+    return f"{total // 60:02d}:{total % 60:02d}"
+
+
+def load_problem(conn, academic_year=None, hours_per_coefficient=1,
+                 days=DEFAULT_DAYS, periods=DEFAULT_PERIODS):
+    """Construit les leçons à placer depuis classes / subjects / rooms / enrollments."""
+    if academic_year is None:
+        academic_year = conn.execute("SELECT MAX(academic_year) FROM enrollments").fetchone()[0]
+    sizes = dict(conn.execute("""
+        SELECT class_id, COUNT(*) FROM enrollments
+        WHERE academic_year IS ? GROUP BY class_id
+    """, (academic_year,)).fetchall())
+    rooms = [(row[0], row[1]) for row in conn.execute(
+        "SELECT id, capacity FROM rooms ORDER BY COALESCE(capacity, 1e9), id")]
+    if not rooms:
+        raise SchedulerError("No rooms defined")
+
+    lessons, warnings = [], []
+    largest = max((capacity or 0) for _, capacity in rooms)
+    for subject_id, name, class_id, teacher_id, coefficient in conn.execute("""
+        SELECT id, name, class_id, teacher_id, coefficient FROM subjects
+        WHERE class_id IS NOT NULL AND teacher_id IS NOT NULL AND coefficient > 0
+        ORDER BY class_id, id
+    """):
+        size = sizes.get(class_id, 0)
+        if size > largest and all(capacity is not None for _, capacity in rooms):
+            warnings.append(f"class {class_id} ({size} students) does not fit in any room")
+        if not isinstance(coefficient, (int, float)):
+            raise SchedulerError(f"Subject {name!r} has a non-numeric coefficient {coefficient!r}")
+        # Coefficient décimal (1.5) : on arrondit au nombre d'heures entier le plus proche
+        hours = round(coefficient * hours_per_coefficient)
+        per_day = -(-hours // len(days))  # répartition idéale : au plus ceil(h / jours) par jour
+        lessons.extend(Lesson(subject_id, class_id, teacher_id, size, per_day) for _ in range(hours))
+
+    slots = len(days) * len(periods)
+    for key, label in (("class_id", "class"), ("teacher_id", "teacher")):
+        load = defaultdict(int)
+        for lesson in lessons:
+            load[getattr(lesson, key)] += 1
+        for owner, hours in load.items():
+            if hours > slots:
+                warnings.append(f"{label} {owner} needs {hours} hours but the week has {slots} slots")
+    return Problem(lessons, rooms, tuple(days), tuple(periods), warnings)
+
+
+class _State:
+    """Placement courant et compteurs d'occupation (mises à jour en O(1))."""
+
+    def __init__(self, problem, rng):
+        self.problem = problem
+        self.rng = rng
+        self.n_slots = len(problem.days) * len(problem.periods)
+        self.n_periods = len(problem.periods)
+        self.teacher = defaultdict(int)  # (teacher_id, slot) -> nb de leçons
+        self.klass = defaultdict(int)
+        self.room = defaultdict(int)
+        self.subject_day = defaultdict(int)
+        self.placements = [None] * len(problem.lessons)
+        self.per_day = {lesson.subject_id: lesson.per_day for lesson in problem.lessons}
+        # Salles assez grandes pour chaque classe, plus petite d'abord
+        self.room_options = {}
+        for lesson in problem.lessons:
+            if lesson.size not in self.room_options:
+                fitting = [r for r, capacity in problem.rooms if capacity is None or capacity >= lesson.size]
+                self.room_options[lesson.size] = fitting or [problem.rooms[-1][0]]
+
+    def _place(self, i, slot, room, delta):
+        lesson = self.problem.lessons[i]
+        self.teacher[(lesson.teacher_id, slot)] += delta
+        self.klass[(lesson.class_id, slot)] += delta
+        self.room[(room, slot)] += delta
+        self.subject_day[(lesson.subject_id, slot // self.n_periods)] += delta
+
+    def assign(self, i, slot, room):
+        if self.placements[i] is not None:
+            self._place(i, *self.placements[i], -1)
+        self.placements[i] = (slot, room)
+        self._place(i, slot, room, 1)
+
+    def best_room(self, lesson, slot):
+        options = self.room_options[lesson.size]
+        best, best_count = options[0], None
+        for room in options:
+            count = self.room[(room, slot)]
+            if count == 0:
+                return room, 0
+            if best_count is None or count < best_count:
+                best, best_count = room, count
+        return best, best_count
+
+    def cost_at(self, i, slot):
+        """(coût, salle) si la leçon i était placée sur slot, elle-même exclue."""
+        lesson = self.problem.lessons[i]
+        current = self.placements[i]
+        same = current is not None and current[0] == slot
+        hard = self.teacher[(lesson.teacher_id, slot)] + self.klass[(lesson.class_id, slot)]
+        if same:
+            room, room_count = current[1], self.room[(current[1], slot)] - 1
+            hard -= 2
+        else:
+            room, room_count = self.best_room(lesson, slot)
+        day_count = self.subject_day[(lesson.subject_id, slot // self.n_periods)]
+        if current is not None and current[0] // self.n_periods == slot // self.n_periods:
+            day_count -= 1
+        soft = max(0, day_count + 1 - lesson.per_day)
+        return (hard + room_count) * HARD + soft, room
+
+    def best_move(self, i, tabu=None):
+        best_cost, candidates = None, []
+        for slot in range(self.n_slots):
+            if slot == tabu:
+                continue
+            cost, room = self.cost_at(i, slot)
+            if best_cost is None or cost < best_cost:
+                best_cost, candidates = cost, [(slot, room)]
+            elif cost == best_cost:
+                candidates.append((slot, room))
+        return best_cost, self.rng.choice(candidates)
+
+    def lesson_cost(self, i):
+        slot, _ = self.placements[i]
+        return self.cost_at(i, slot)[0]
+
+    def totals(self):
+        conflicts = {"teacher": 0, "class": 0, "room": 0}
+        for name, counter in (("teacher", self.teacher), ("class", self.klass), ("room", self.room)):
+            conflicts[name] = sum(count - 1 for count in counter.values() if count > 1)
+        soft = sum(max(0, count - self.per_day[subject_id])
+                   for (subject_id, _), count in self.subject_day.items())
+        return sum(conflicts.values()), soft, conflicts
+
+
+def solve_once(problem, seed, budget):
+    """Une exécution complète (glouton + recherche locale) avec un budget en secondes."""
+    rng = random.Random(seed)
+    deadline = time.monotonic() + budget
+    state = _State(problem, rng)
+    lessons = problem.lessons
+    if not lessons:
+        return Solution([], 0, 0, {"teacher": 0, "class": 0, "room": 0}, seed, 0)
+
+    # 1. Glouton : leçons les plus contraintes d'abord (charge enseignant + classe, peu de salles)
+    teacher_load, class_load = defaultdict(int), defaultdict(int)
+    for lesson in lessons:
+        teacher_load[lesson.teacher_id] += 1
+        class_load[lesson.class_id] += 1
+    order = list(range(len(lessons)))
+    rng.shuffle(order)
+    order.sort(key=lambda i: (-(teacher_load[lessons[i].teacher_id] + class_load[lessons[i].class_id]),
+                              len(state.room_options[lessons[i].size])))
+    for i in order:
+        _, (slot, room) = state.best_move(i)
+        state.assign(i, slot, room)
+
+    # 2. Min-conflicts : déplace une leçon en conflit vers son meilleur créneau
+    iterations = 0
+    last_moved = {}
+    best = None
+    while True:
+        hard, soft, conflicts = state.totals()
+        if best is None or (hard, soft) < best[:2]:
+            best = (hard, soft, conflicts, list(state.placements))
+        if time.monotonic() >= deadline:
+            break
+        costs = [(state.lesson_cost(i), i) for i in range(len(lessons))]
+        hard_lessons = [i for cost, i in costs if cost >= HARD]
+        targets = hard_lessons or [i for cost, i in costs if cost > 0]
+        if not targets:
+            break
+        for _ in range(min(len(targets), 200)):
+            i = rng.choice(targets)
+            current_cost = state.lesson_cost(i)
+            if current_cost == 0:
+                continue
+            cost, (slot, room) = state.best_move(i, tabu=last_moved.get(i))
+            # Bruit : accepte parfois un mouvement neutre ou pire pour sortir d'un minimum local
+            if cost <= current_cost or (hard_lessons and rng.random() < 0.05):
+                last_moved[i] = state.placements[i][0]
+                state.assign(i, slot, room)
+            iterations += 1
+            if time.monotonic() >= deadline:
+                break
+        if not hard_lessons and iterations > 50 * len(lessons):
+            break
+
+    hard, soft, conflicts, placements = best
+    return Solution(placements, hard, soft, conflicts, seed, iterations)
+
+
+def solve(problem, budget=10.0, workers=None, restarts=None, seed=0):
+    """Lance `restarts` exécutions indépendantes (une par processus) et garde la meilleure.
+
+    workers=0 : tout dans le processus courant (serveur web, threads de jobs : pas de fork).
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    restarts = restarts or max(workers, 1)
+    seeds = [seed + n for n in range(restarts)]
+    if workers <= 1 or restarts == 1:
+        solutions = [solve_once(problem, s, budget / restarts) for s in seeds]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            solutions = list(pool.map(solve_once, [problem] * restarts, seeds, [budget] * restarts))
+    return min(solutions, key=lambda s: (s.hard, s.soft)), solutions
+
+
+def to_rows(problem, solution):
+    """Lignes prêtes pour la table timetable."""
+    n_periods = len(problem.periods)
+    rows = []
+    for lesson, (slot, room) in zip(problem.lessons, solution.placements):
+        start = problem.periods[slot % n_periods]
+        rows.append((lesson.class_id, lesson.subject_id, lesson.teacher_id, room,
+                     problem.days[slot // n_periods], start, _end_time(start)))
+    return rows
+
+
+def report(problem, solution, solutions, elapsed):
+    slots = len(problem.days) * len(problem.periods)
+    used_rooms = {room for _, room in solution.placements}
+    return {
+        "lessons": len(problem.lessons),
+        "classes": len({lesson.class_id for lesson in problem.lessons}),
+        "teachers": len({lesson.teacher_id for lesson in problem.lessons}),
+        "rooms": len(problem.rooms),
+        "slots_per_week": slots,
+        "hard_conflicts": solution.hard,
+        "conflicts": solution.conflicts,
+        "spread_penalty": solution.soft,
+        "room_usage": round(len(problem.lessons) / (slots * len(problem.rooms)), 3) if problem.rooms else 0,
+        "rooms_used": len(used_rooms),
+        "restarts": len(solutions),
+        "restart_scores": [(s.seed, s.hard, s.soft) for s in solutions],
+        "iterations": solution.iterations,
+        "elapsed": round(elapsed, 2),
+        "warnings": problem.warnings,
+    }
+
+
+def apply(conn, problem, solution):
+    """Remplace tout l'emploi du temps par la solution, en une transaction."""
+    rows = to_rows(problem, solution)
+
+    def work(c):
+        c.execute("DELETE FROM timetable")
+        c.executemany("""
+            INSERT INTO timetable (class_id, subject_id, teacher_id, room_id, day, start_time, end_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+    write_transaction(conn, work)
+    return len(rows)
+
+
+def generate(conn, academic_year=None, budget=10.0, workers=None, hours_per_coefficient=1,
+             days=DEFAULT_DAYS, write=False):
+    started = time.perf_counter()
+    problem = load_problem(conn, academic_year, hours_per_coefficient, days)
+    solution, solutions = solve(problem, budget, workers)
+    result = report(problem, solution, solutions, time.perf_counter() - started)
+    if write:
+        if solution.hard:
+            raise SchedulerError(f"Schedule still has {solution.hard} conflicts; not applied")
+        result["written"] = apply(conn, problem, solution)
+    return result
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Timetable generator")
+    parser.add_argument("command", choices=["solve"])
+    parser.add_argument("--db", default=os.path.join(base_dir, "database.db"))
+    parser.add_argument("--year", help="academic year used for class sizes (default: latest)")
+    parser.add_argument("--budget", type=float, default=10.0, help="seconds")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--hours-per-coefficient", type=int, default=1)
+    parser.add_argument("--saturday", action="store_true", help="schedule on Saturdays too")
+    parser.add_argument("--apply", action="store_true", help="replace the timetable table")
+    args = parser.parse_args(argv)
+
+    days = DEFAULT_DAYS + (("Saturday",) if args.saturday else ())
+    conn = sqlite3.connect(args.db)
+    try:
+        result = generate(conn, args.year, args.budget, args.workers,
+                          args.hours_per_coefficient, days, write=args.apply)
+    except SchedulerError as e:
+        print(e)
+        return 2
+    finally:
+        conn.close()
+
+    for warning in result["warnings"]:
+        print(f"warning: {warning}")
+    print(f"{result['lessons']} lessons, {result['classes']} classes, {result['teachers']} teachers, "
+          f"{result['rooms']} rooms, {result['slots_per_week']} slots/week")
+    print(f"hard conflicts: {result['hard_conflicts']} {result['conflicts']}")
+    print(f"spread penalty: {result['spread_penalty']}, room usage {result['room_usage']:.0%}")
+    print(f"{result['restarts']} restarts {result['restart_scores']}, {result['elapsed']}s")
+    if "written" in result:
+        print(f"wrote {result['written']} timetable rows")
+    return 1 if result["hard_conflicts"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
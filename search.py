@@ -0,0 +1,133 @@
+"""Full-text search over students, teachers and subjects.
+
+search_words (unicode61, prefix indexes) answers "starts with" queries;
+search_trigrams (trigram tokenizer) is the typo-tolerant fallback. Both are kept
+in sync by the triggers of migrations 3 (students, teachers, subjects) and 8
+(class renames).
+
+    python search.py rebuild
+    python search.py query "dupon"
+"""
+import argparse
+import difflib
+import os
+import re
+import sqlite3
+import time
+
+from migrations import SEARCH_REBUILD_SQL, split_statements
+
+KINDS = {"student": 1, "teacher": 2, "subject": 3}
+MIN_FUZZY_SCORE = 0.6
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def prefix_query(text):
+    """'jean dup' -> '"jean"* AND "dup"*'"""
+    return " AND ".join(f'"{token}"*' for token in _tokens(text))
+
+
+def trigram_query(text):
+    grams = set()
+    for token in _tokens(text):
+        grams.update(token[i:i + 3] for i in range(len(token) - 2))
+    return " OR ".join(f'"{gram}"' for gram in sorted(grams))
+
+
+def _similarity(query, label, detail):
+    query = query.lower()
+    best = 0.0
+    for candidate in [label.lower(), detail.lower()] + _tokens(label) + _tokens(detail):
+        best = max(best, difflib.SequenceMatcher(None, query, candidate).ratio())
+    return best
+
+
+def _fetch(conn, index, match, kind, limit, ranked):
+    sql = f"SELECT kind, ref_id, label, detail FROM {index} WHERE {index} MATCH ?"
+    params = [match]
+    if kind:
+        sql += " AND kind = ?"
+        params.append(kind)
+    # Sans ORDER BY rank, FTS5 s'arrête dès que LIMIT lignes sont trouvées
+    sql += " ORDER BY rank LIMIT ?" if ranked else " LIMIT ?"
+    params.append(limit)
+    return conn.execute(sql, params).fetchall()
+
+
+def search(conn, text, kind=None, limit=10):
+    """Top `limit` résultats : préfixes d'abord, puis correspondances approchées."""
+    match = prefix_query(text)
+    if not match:
+        return []
+    results = [
+        {"type": row[0], "id": row[1], "label": row[2], "detail": row[3], "score": 1.0}
+        for row in _fetch(conn, "search_words", match, kind, limit, ranked=False)
+    ]
+
+    fuzzy = trigram_query(text)
+    if len(results) < limit and fuzzy:
+        seen = {(r["type"], r["id"]) for r in results}
+        candidates = []
+        for row in _fetch(conn, "search_trigrams", fuzzy, kind, limit * 5, ranked=True):
+            if (row[0], row[1]) in seen:
+                continue
+            score = _similarity(text, row[2], row[3])
+            if score >= MIN_FUZZY_SCORE:
+                candidates.append({"type": row[0], "id": row[1], "label": row[2],
+                                   "detail": row[3], "score": round(score, 3)})
+        candidates.sort(key=lambda r: r["score"], reverse=True)
+        results.extend(candidates[:limit - len(results)])
+    return results
+
+
+def matching_ids(text, kind):
+    """Sous-requête SQL (et paramètres) des ids correspondant à un préfixe."""
+    match = prefix_query(text)
+    if not match:
+        return "SELECT NULL WHERE 0", []
+    return ("SELECT ref_id FROM search_words WHERE search_words MATCH ? AND kind = ?",
+            [match, kind])
+
+
+def rebuild(conn):
+    """Reconstruit les deux index à partir des tables sources."""
+    with conn:
+        for statement in split_statements(SEARCH_REBUILD_SQL):
+            conn.execute(statement)
+        conn.execute("INSERT INTO search_words (search_words) VALUES ('optimize')")
+        conn.execute("INSERT INTO search_trigrams (search_trigrams) VALUES ('optimize')")
+    return conn.execute("SELECT COUNT(*) FROM search_words").fetchone()[0]
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Search index maintenance")
+    parser.add_argument("command", choices=["rebuild", "query"])
+    parser.add_argument("text", nargs="?", default="")
+    parser.add_argument("--db", default=os.path.join(base_dir, "database.db"))
+    parser.add_argument("--type", choices=sorted(KINDS))
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        started = time.perf_counter()
+        if args.command == "rebuild":
+            count = rebuild(conn)
+            print(f"Indexed {count} rows in {time.perf_counter() - started:.2f}s")
+        else:
+            for row in search(conn, args.text, args.type, args.limit):
+                print(f"{row['score']:.2f}  {row['type']:8s} {row['id']:6d}  {row['label']}  ({row['detail']})")
+            print(f"{(time.perf_counter() - started) * 1000:.1f} ms")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,161 @@
+"""Slow-query log.
+
+Queries slower than SLOW_QUERY_MS (execute + fetches, measured by the profiled
+connection) are written as JSON lines with their SQL text, the shape of their
+bound parameters (types only, never the values), duration, rows returned and
+EXPLAIN QUERY PLAN. The request thread only puts the record on a queue; a
+listener thread takes the plan (once per distinct statement, on its own
+read-only connection) and writes the line to a size-rotated file.
+
+    python slowlog.py --top 20
+    python slowlog.py --log logs/slow_queries.log --sort max
+"""
+import argparse
+import glob
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+
+LOGGER_NAME = "slow_queries"
+MAX_PLANS = 1000
+
+
+def param_shape(params):
+    """Types des paramètres liés : ["int", "str"] ou {"name": "str"}."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+
+class PlanHandler(logging.handlers.RotatingFileHandler):
+    """Complète chaque enregistrement avec son plan, sur le thread du listener."""
+
+    def __init__(self, path, max_bytes, backups, explain=None):
+        super().__init__(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+        self.explain = explain
+        self.plans = {}  # SQL normalisé -> plan, pris une seule fois
+
+    def emit(self, record):
+        if isinstance(record.msg, dict):
+            entry, params = record.msg, record.args
+            if self.explain is not None and entry["sql"] not in self.plans:
+                if len(self.plans) >= MAX_PLANS:
+                    self.plans.clear()
+                self.plans[entry["sql"]] = self.explain(entry["sql"], params)
+            entry["plan"] = self.plans.get(entry["sql"])
+            record.msg, record.args = json.dumps(entry, ensure_ascii=False), None
+        super().emit(record)
+
+
+class SlowQueryLog:
+    def __init__(self, path, threshold=0.1, max_bytes=10 * 1024 * 1024, backups=5, explain=None):
+        """explain(sql, params) : plan d'exécution, appelé sur le thread du listener."""
+        self.path = path
+        self.threshold = threshold
+        self.logged = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = PlanHandler(path, max_bytes, backups, explain)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        # File non bornée : un enregistrement ne doit jamais bloquer la requête ; les
+        # enregistrements y sont posés tels quels (SQL et paramètres), sans passer par un logger
+        self._queue = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(self._queue, handler)
+        self._listener.start()
+
+    def record(self, endpoint, sql, params, elapsed, rows):
+        self.logged += 1
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "endpoint": endpoint,
+            "ms": round(elapsed * 1000, 3),
+            "rows": rows,
+            "sql": " ".join(sql.split()),
+            "params": param_shape(params),
+        }
+        self._queue.put(logging.makeLogRecord({"name": LOGGER_NAME, "levelno": logging.WARNING,
+                                               "levelname": "WARNING", "msg": entry, "args": params}))
+
+    def close(self):
+        self._listener.stop()
+
+
+# --- Résumé (CLI) ---
+def read_entries(path):
+    """Fichier courant et fichiers tournés (path.1, path.2...), du plus ancien au plus récent."""
+    rotated = [name for name in glob.glob(glob.escape(path) + ".*") if name.rsplit(".", 1)[1].isdigit()]
+    files = sorted(rotated, key=lambda name: -int(name.rsplit(".", 1)[1]))
+    for name in files + [path]:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def full_scans(plan):
+    """Tables (ou alias) lues en entier, SCAN sans index : les candidates à un index."""
+    tables = []
+    for line in plan or ():
+        detail = line.strip()
+        if detail.startswith("SCAN ") and " INDEX " not in detail and "(subquery" not in detail:
+            tables.append(detail.split()[1])
+    return tables
+
+
+def summarize(entries):
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry["sql"], {"sql": entry["sql"], "count": 0, "total_ms": 0.0,
+                                                 "max_ms": 0.0, "rows": 0, "endpoints": set()})
+        group["count"] += 1
+        group["total_ms"] += entry["ms"]
+        group["max_ms"] = max(group["max_ms"], entry["ms"])
+        group["rows"] += entry.get("rows") or 0
+        group["endpoints"].add(entry.get("endpoint") or "-")
+        group["plan"] = entry.get("plan")  # le plus récent
+        group["last_seen"] = entry.get("ts")
+    for group in groups.values():
+        group["avg_ms"] = group["total_ms"] / group["count"]
+        group["full_scans"] = full_scans(group["plan"])
+    return list(groups.values())
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Summarize the slow-query log")
+    parser.add_argument("--log", default=os.environ.get("SLOW_QUERY_LOG",
+                                                       os.path.join(base_dir, "logs", "slow_queries.log")))
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--sort", choices=["total", "count", "max", "avg"], default="total")
+    parser.add_argument("--plans", action="store_true", help="print the latest query plan of each query")
+    args = parser.parse_args(argv)
+
+    groups = summarize(read_entries(args.log))
+    if not groups:
+        print(f"No slow queries in {args.log}")
+        return 0
+    key = {"total": "total_ms", "count": "count", "max": "max_ms", "avg": "avg_ms"}[args.sort]
+    groups.sort(key=lambda group: group[key], reverse=True)
+    print(f"{'total ms':>10s} {'count':>6s} {'avg ms':>8s} {'max ms':>8s} {'rows':>8s}  query")
+    for group in groups[:args.top]:
+        print(f"{group['total_ms']:10.1f} {group['count']:6d} {group['avg_ms']:8.1f} {group['max_ms']:8.1f} "
+              f"{group['rows']:8d}  {group['sql'][:120]}")
+        print(f"{'':46s}endpoints: {', '.join(sorted(group['endpoints']))}")
+        if group["full_scans"]:
+            print(f"{'':46s}full scans: {', '.join(group['full_scans'])}")
+        if args.plans and group["plan"]:
+            for line in group["plan"]:
+                print(f"{'':46s}  {line}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())